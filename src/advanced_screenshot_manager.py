@@ -11,17 +11,29 @@ import asyncio
 import hashlib
 import numpy as np
 from PIL import Image
-import pyautogui
-from queue import Queue, Empty
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from typing import Optional, Tuple, Callable, List
+from queue import Empty
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError, as_completed
+from typing import Optional, Tuple, Callable, List, Union
 import psutil
 import os
+import sys
 from dataclasses import dataclass
 from collections import deque
 import weakref
 import cv2
 
+from capture_backends import CaptureBackend, get_capture_backend
+from long_image_stitcher import LongImageStitcher
+from image_hashing import compute_hashes, hamming_distance
+from frame import Frame
+from frame_features import FrameFeatures, extract_features
+from ssim import SSIMResult, ssim_from_gray
+from system_metrics import get_system_metrics
+from encoder_pool import EncoderPool, default_worker_count
+from image_codecs import ImageCodec, get_codec
+from frame_archive import FrameArchive
+from flow_control import ByteBudgetQueue, CreditGate, ReorderBuffer, StageGauge
+
 
 @dataclass
 class ScreenshotTask:
@@ -39,71 +51,158 @@ class PerformanceMetrics:
     avg_similarity_time: float = 0.0
     avg_save_time: float = 0.0
     memory_usage_mb: float = 0.0
-    cache_hit_rate: float = 0.0
     throughput_fps: float = 0.0
 
 
-class SmartCache:
-    """智能缓存管理器"""
-    
-    def __init__(self, max_size: int = 100):
-        self.max_size = max_size
-        self.cache = {}
-        self.access_order = deque()
-        self.hit_count = 0
-        self.miss_count = 0
-    
-    def get(self, key):
-        """获取缓存项"""
-        if key in self.cache:
-            self.hit_count += 1
-            # 更新访问顺序
-            self.access_order.remove(key)
-            self.access_order.append(key)
-            return self.cache[key]
+def estimate_nbytes(value) -> int:
+    """估算帧数据占用的字节数（用于管道队列的字节预算）"""
+    if isinstance(value, Frame):
+        return value.nbytes
+    if isinstance(value, Image.Image):
+        return value.width * value.height * len(value.getbands())
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return len(value)
+    return sys.getsizeof(value)
+
+
+@dataclass
+class PacingPlan:
+    """下一次滚动的节奏安排"""
+    max_wait: float             # 稳定检测的最长等待（秒）
+    stable_probes: int          # 判定稳定需要的连续无变化探针数
+    settle_delay: float = 0.0   # 判定稳定后额外停留的时间（秒）
+    estimated_latency: Optional[float] = None  # 当前学到的渲染延迟估计
+
+
+class LatencyTracker:
+    """渲染延迟跟踪器：EWMA 均值/方差 + 最近样本分位数"""
+    
+    def __init__(self, alpha: float = 0.2, window: int = 50):
+        self.alpha = alpha
+        self.samples = deque(maxlen=window)
+        self.mean: Optional[float] = None
+        self.var = 0.0
+        self.timeouts = 0
+    
+    def add(self, latency: float, settled: bool = True):
+        """加入一次观测；超时样本是被截断的下界，按 1.5 倍计入"""
+        if not settled:
+            self.timeouts += 1
+            latency *= 1.5
+        
+        self.samples.append(latency)
+        if self.mean is None:
+            self.mean = latency
         else:
-            self.miss_count += 1
+            delta = latency - self.mean
+            self.mean += self.alpha * delta
+            self.var = (1 - self.alpha) * (self.var + self.alpha * delta * delta)
+    
+    def percentile(self, q: float) -> Optional[float]:
+        if not self.samples:
             return None
+        return float(np.percentile(self.samples, q))
     
-    def put(self, key, value):
-        """添加缓存项"""
-        if key in self.cache:
-            # 更新现有项
-            self.access_order.remove(key)
-        elif len(self.cache) >= self.max_size:
-            # 删除最久未使用的项
-            oldest_key = self.access_order.popleft()
-            del self.cache[oldest_key]
-        
-        self.cache[key] = value
-        self.access_order.append(key)
-    
-    def get_hit_rate(self) -> float:
-        """获取缓存命中率"""
-        total = self.hit_count + self.miss_count
-        return self.hit_count / total if total > 0 else 0.0
-    
-    def clear(self):
-        """清空缓存"""
-        self.cache.clear()
-        self.access_order.clear()
-        self.hit_count = 0
-        self.miss_count = 0
+    @property
+    def std(self) -> float:
+        return self.var ** 0.5
+    
+    def __len__(self) -> int:
+        return len(self.samples)
 
 
 class AdaptiveWaitManager:
-    """自适应等待管理器"""
+    """自适应等待管理器 - 按窗口学习渲染延迟，决定滚动/截图节奏"""
+    
+    MODE_MAX_THROUGHPUT = "max_throughput"
+    MODE_SAFE = "safe"
     
-    def __init__(self):
+    def __init__(self, mode: str = MODE_SAFE, min_samples: int = 3):
         self.wait_times = deque(maxlen=10)  # 保留最近10次的等待时间
         self.base_wait = 0.3
         self.min_wait = 0.1
         self.max_wait = 2.0
+        self.mode = mode
+        self.min_samples = min_samples
+        
+        # 窗口标识 -> 延迟跟踪器
+        self.trackers = {}
+        self._lock = threading.Lock()
+        
+        # CPU 负载由共享的后台采样器提供
+        self.system_metrics = get_system_metrics()
+    
+    def set_mode(self, mode: str):
+        """设置节奏模式"""
+        if mode not in (self.MODE_MAX_THROUGHPUT, self.MODE_SAFE):
+            raise ValueError(f"未知的节奏模式: {mode}")
+        self.mode = mode
+    
+    def get_system_load(self) -> float:
+        """最近的 CPU 占用率（EWMA 平滑，读取共享快照，不阻塞）"""
+        return self.system_metrics.latest.cpu_percent_smoothed
     
-    def calculate_wait_time(self, scroll_mode: str, system_load: float) -> float:
-        """计算自适应等待时间"""
-        # 基础等待时间
-        if scroll_mode == "page":
+    def _tracker(self, window_key) -> LatencyTracker:
+        tracker = self.trackers.get(window_key)
+        if tracker is None:
+            tracker = self.trackers[window_key] = LatencyTracker()
+        return tracker
+    
+    def record_settle(self, window_key, latency: float, settled: bool = True):
+        """记录一次实测的滚动稳定延迟"""
+        with self._lock:
+            self._tracker(window_key).add(latency, settled)
+    
+    def estimate_latency(self, window_key) -> Optional[float]:
+        """当前模式下的渲染延迟估计：最快模式取 EWMA+2σ，安全模式取 P95"""
+        with self._lock:
+            tracker = self.trackers.get(window_key)
+            if tracker is None or len(tracker) < self.min_samples:
+                return None
+            if self.mode == self.MODE_MAX_THROUGHPUT:
+                return tracker.mean + 2 * tracker.std
+            return tracker.percentile(95)
+    
+    def plan(self, window_key, scroll_mode: str, max_wait: float) -> PacingPlan:
+        """
+        安排下一次滚动的等待
+        
+        Args:
+            window_key: 窗口标识（同一窗口共享延迟统计）
+            scroll_mode: 'page' / 'mouse'
+            max_wait: 用户设置的最长等待时间（秒）
+        """
+        load_factor = 1.0 + (self.get_system_load() / 100.0) * 0.5
+        estimate = self.estimate_latency(window_key)
+        
+        if self.mode == self.MODE_MAX_THROUGHPUT:
+            # 学到延迟后把超时收紧到估计值附近；超时样本会反过来抬高估计
+            if estimate is None:
+                wait_cap = max_wait
+            else:
+                wait_cap = max(self.min_wait, min(max_wait, estimate * 1.5 * load_factor + 0.05))
+            return PacingPlan(wait_cap, stable_probes=1, estimated_latency=estimate)
+        
+        # 安全模式：不缩短用户上限，稳定后再按估计延迟的一部分停留
+        base = 0.5 if scroll_mode == "page" else 0.3
+        delay = base * 0.2 if estimate is None else estimate * 0.25
+        delay = min(0.5, max(0.05, delay * load_factor))
+        return PacingPlan(max_wait, stable_probes=3, settle_delay=delay,
+                          estimated_latency=estimate)
+    
+    def calculate_wait_time(self, scroll_mode: str, system_load: Optional[float] = None,
+                            window_key=None) -> float:
+        """计算自适应的固定等待时间（不使用稳定检测时）"""
+        if system_load is None:
+            system_load = self.get_system_load()
+        
+        # 基础等待时间：已学到该窗口的延迟时直接使用
+        estimate = self.estimate_latency(window_key) if window_key is not None else None
+        if estimate is not None:
+            base = estimate
+        elif scroll_mode == "page":
             base = 0.5
         else:  # mouse
             base = 0.3
@@ -111,47 +210,88 @@ class AdaptiveWaitManager:
         # 根据系统负载调整
         load_factor = 1.0 + (system_load / 100.0) * 0.5
         
-        # 根据历史性能调整
-        if len(self.wait_times) >= 3:
-            avg_wait = sum(self.wait_times) / len(self.wait_times)
-            # 如果平均等待时间过长，适当减少
-            if avg_wait > base * 1.5:
-                base *= 0.9
-            elif avg_wait < base * 0.5:
-                base *= 1.1
-        
         wait_time = base * load_factor
         wait_time = max(self.min_wait, min(self.max_wait, wait_time))
         
         self.wait_times.append(wait_time)
         return wait_time
+    
+    def get_stats(self) -> dict:
+        """各窗口的延迟统计（毫秒）"""
+        with self._lock:
+            windows = {
+                str(key): {
+                    'samples': len(tracker),
+                    'ewma_ms': (tracker.mean or 0.0) * 1000,
+                    'std_ms': tracker.std * 1000,
+                    'p50_ms': (tracker.percentile(50) or 0.0) * 1000,
+                    'p95_ms': (tracker.percentile(95) or 0.0) * 1000,
+                    'timeouts': tracker.timeouts
+                }
+                for key, tracker in self.trackers.items()
+            }
+        return {'mode': self.mode, 'cpu_load': self.get_system_load(), 'windows': windows}
 
 
 class AdvancedScreenshotManager:
     """高级截图管理器 - 实现异步管道和智能优化"""
     
-    def __init__(self, max_workers: int = 4):
+    def __init__(self, max_workers: int = 4, capture_backend: Optional[CaptureBackend] = None,
+                 image_codec: Union[str, ImageCodec, None] = None):
+        """
+        Args:
+            image_codec: 截图编码器或预设名（如 image_codecs.codec_from_settings 按用户配置
+                         选出的编码器），为 None 时使用自动配置的预设
+        """
         self.max_workers = max_workers
+        self._capture_backend = capture_backend
         
-        # 任务队列
-        self.capture_queue = Queue(maxsize=20)
-        self.similarity_queue = Queue(maxsize=10)
-        self.save_queue = Queue(maxsize=50)
+        # 性能配置
+        self.performance_config = self._auto_configure_performance()
+        if isinstance(image_codec, str):
+            self.performance_config['codec_preset'] = image_codec
+        
+        # 任务队列（条数 + 字节双重限额，超限时生产者阻塞）
+        budget = self.performance_config['pipeline_memory_mb'] * 1024 * 1024
+        # 截图线程并行完成的帧按 task_id 重排后再做相似度检测，保证与真正的前一帧比较
+        self.similarity_queue = ReorderBuffer(
+            'similarity',
+            window=self.performance_config['max_inflight_frames'] * 2,
+            timeout=self.performance_config['reorder_timeout']
+        )
+        self.save_queue = ByteBudgetQueue('save', max_items=50, max_bytes=budget // 2)
+        self.stitch_queue = ByteBudgetQueue('stitch', max_items=20, max_bytes=budget // 4)
+        
+        # 管道准入额度：每帧从提交截图起占用，重复/保存完成/失败时归还
+        self.admission = CreditGate(self.performance_config['max_inflight_frames'])
+        self.capture_gauge = StageGauge('capture')
+        self.save_gauge = StageGauge('save_io')
         
         # 线程池
-        self.capture_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="capture")
+        self.capture_executor = ThreadPoolExecutor(
+            max_workers=self.performance_config['capture_workers'], thread_name_prefix="capture")
         self.similarity_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="similarity")
         self.save_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="save")
         
-        # 智能缓存
-        self.image_cache = SmartCache(max_size=50)
-        self.hash_cache = SmartCache(max_size=100)
+        # 系统指标（后台线程采样，读取不阻塞截图线程）
+        self.system_metrics = get_system_metrics()
+        
+        # 截图编码器与编码进程池（进程池在首次保存时创建）
+        self.image_codec: ImageCodec = get_codec(image_codec or self.performance_config['codec_preset'])
+        self.encoder_pool: Optional[EncoderPool] = None
+        
+        # 去重帧归档（启用后截图按小块去重写入归档，替代逐帧图片文件）
+        self.frame_archive: Optional[FrameArchive] = None
         
         # 自适应管理器
         self.wait_manager = AdaptiveWaitManager()
         
-        # 性能配置
-        self.performance_config = self._auto_configure_performance()
+        # 长图拼接（可选阶段，位于相似度检测之后）
+        self.stitcher: Optional[LongImageStitcher] = None
+        self._stitch_done = threading.Event()
+        self._stitch_lock = threading.Lock()
+        self._stitch_finishing = False
+        self._stitch_results: List[str] = []
         
         # 统计信息
         self.metrics = PerformanceMetrics()
@@ -160,18 +300,27 @@ class AdvancedScreenshotManager:
             'duplicates_detected': 0,
             'total_processing_time': 0,
             'memory_usage': 0,
-            'cache_hits': 0,
-            'cache_misses': 0
+            'admission_rejected': 0,
+            'late_frames': 0,
+            'throttle_time': 0.0
         }
         
         # 运行状态
         self.is_running = False
         self.task_counter = 0
+        self._task_lock = threading.Lock()
         self.save_directory = "screenshots"  # 默认保存目录
         
         # 启动后台处理线程
         self._start_background_processors()
     
+    @property
+    def capture_backend(self) -> CaptureBackend:
+        """截图后端（未显式指定时使用进程共享的自动选择后端）"""
+        if self._capture_backend is None:
+            self._capture_backend = get_capture_backend()
+        return self._capture_backend
+    
     def set_save_directory(self, path: str):
         """设置截图保存目录"""
         self.save_directory = path
@@ -184,20 +333,35 @@ class AdvancedScreenshotManager:
         
         config = {
             'use_advanced_similarity': memory_gb >= 8,
-            'compression_level': 6 if memory_gb >= 8 else 9,
-            'max_cache_size': min(100, int(memory_gb * 10)),
+            'compression_level': 6 if memory_gb >= 8 else 9,  # 长图拼接的 PNG 压缩级别
+            'codec_preset': 'balanced',  # 截图编码预设，见 image_codecs.CODEC_PRESETS
             'similarity_threshold': 0.95,
+            'ssim_scale': 0.25,
+            'ssim_window': 7,
+            'ssim_bands': 8,
             'hash_similarity_threshold': 0.001,
             'enable_parallel_processing': cpu_count >= 4,
             'batch_save_size': min(10, max(3, cpu_count)),
             'adaptive_quality': True,
-            'memory_limit_mb': int(memory_gb * 1024 * 0.3)  # 使用30%内存
+            'memory_limit_mb': int(memory_gb * 1024 * 0.3),  # 使用30%内存
+            # 管道队列的字节预算（内存限制的1/4）
+            'pipeline_memory_mb': int(memory_gb * 1024 * 0.3) // 4,
+            'admission_timeout': 30.0,  # 准入等待上限（秒）
+            # 截图线程数：结果经重排缓冲区按序交付，可以安全地并行截图
+            'capture_workers': min(4, max(2, cpu_count)),
+            'reorder_timeout': 3.0,  # 等待缺失帧的最长时间（秒）
+            # PNG 编码进程数（单核时进程池没有意义，仍用线程池保存）
+            'encoder_workers': default_worker_count() if cpu_count >= 2 else 0
         }
+        # 在途帧额度：留出几个批次的余量，保存线程凑批时不会卡住准入
+        config['max_inflight_frames'] = min(64, config['batch_save_size'] * 4)
         
         print(f"🔧 高级性能配置: CPU={cpu_count}核, RAM={memory_gb:.1f}GB")
         print(f"   - 高级相似度: {'启用' if config['use_advanced_similarity'] else '禁用'}")
         print(f"   - 批量保存: {config['batch_save_size']}张/批")
-        print(f"   - 内存限制: {config['memory_limit_mb']}MB")
+        print(f"   - 内存限制: {config['memory_limit_mb']}MB (管道队列 {config['pipeline_memory_mb']}MB, "
+              f"在途 {config['max_inflight_frames']} 帧)")
+        print(f"   - 编码进程: {config['encoder_workers'] or '禁用'}")
         
         return config
     
@@ -215,10 +379,17 @@ class AdvancedScreenshotManager:
         threading.Thread(target=self._performance_monitor, daemon=True, name="performance_monitor").start()
     
     def capture_screenshot_async(self, region: Tuple[int, int, int, int], 
-                                callback: Optional[Callable] = None) -> int:
-        """异步截图捕获"""
-        task_id = self.task_counter
-        self.task_counter += 1
+                                callback: Optional[Callable] = None,
+                                timeout: Optional[float] = None) -> int:
+        """
+        异步截图捕获
+        
+        在途帧达到额度上限时阻塞等待（保存跟不上时由此拖慢调用方的滚动循环），
+        超过 timeout（默认 admission_timeout）仍无额度则以"管道繁忙"回调失败。
+        """
+        with self._task_lock:
+            task_id = self.task_counter
+            self.task_counter += 1
         
         task = ScreenshotTask(
             region=region,
@@ -226,30 +397,55 @@ class AdvancedScreenshotManager:
             task_id=task_id
         )
         
-        # 提交到捕获队列
-        future = self.capture_executor.submit(self._capture_task, task, callback)
+        # 准入：按区域估算在途字节（RGB 像素 + 灰度特征），截图后按实际大小修正
+        estimate = region[2] * region[3] * 4
+        if timeout is None:
+            timeout = self.performance_config['admission_timeout']
+        if not self.admission.acquire(task_id, nbytes=estimate, timeout=timeout):
+            self.stats['admission_rejected'] += 1
+            self.similarity_queue.skip(task_id)
+            if callback:
+                callback(None, task, False, "管道繁忙")
+            return task_id
+        
+        # 提交到截图线程池
+        submitted_at = self.capture_gauge.enter()
+        self.capture_executor.submit(self._capture_task, task, callback, submitted_at)
         return task_id
     
-    def _capture_task(self, task: ScreenshotTask, callback: Optional[Callable] = None):
+    def wait_for_capacity(self, timeout: Optional[float] = None) -> bool:
+        """等待管道出现空闲额度（滚动前调用，保存积压时暂停滚动）"""
+        start = time.monotonic()
+        available = self.admission.wait_available(timeout)
+        waited = time.monotonic() - start
+        if waited > 0.001:
+            self.stats['throttle_time'] += waited
+        return available
+    
+    def _release_task(self, task: ScreenshotTask):
+        """帧到达终点（重复/保存完成/失败），归还准入额度"""
+        self.admission.release(task.task_id)
+    
+    def _abandon_capture(self, task: ScreenshotTask):
+        """截图失败：归还额度，并通知重排缓冲区不再等待该序号"""
+        self._release_task(task)
+        self.similarity_queue.skip(task.task_id)
+    
+    def _capture_task(self, task: ScreenshotTask, callback: Optional[Callable] = None,
+                      submitted_at: Optional[float] = None):
         """执行截图任务"""
         start_time = time.time()
+        if submitted_at is not None:
+            self.capture_gauge.exit(submitted_at)
         
         try:
-            # 检查缓存
-            cache_key = f"{task.region}_{int(task.timestamp)}"
-            cached_screenshot = self.image_cache.get(cache_key)
-            
-            if cached_screenshot:
-                screenshot = cached_screenshot
-                self.stats['cache_hits'] += 1
-            else:
-                # 执行截图
-                screenshot = self._capture_with_adaptive_retry(task.region)
-                if screenshot:
-                    self.image_cache.put(cache_key, screenshot)
-                    self.stats['cache_misses'] += 1
+            # 执行截图（每个任务都是滚动后的新画面，不经缓存）
+            screenshot = self._capture_with_adaptive_retry(task.region, task=task)
             
             if screenshot:
+                # 计算帧特征（哈希、灰度缩略图、行签名），随帧经各队列传递到拼接和归档
+                features = extract_features(screenshot)
+                
                 self.stats['screenshots_taken'] += 1
                 processing_time = time.time() - start_time
                 self.stats['total_processing_time'] += processing_time
@@ -259,34 +455,50 @@ class AdvancedScreenshotManager:
                     self.metrics.avg_capture_time * 0.9 + processing_time * 0.1
                 )
                 
-                # 提交到相似度检测队列
-                self.similarity_queue.put((screenshot, task, callback))
+                self.capture_gauge.record_service(processing_time)
+                
+                # 按 task_id 顺序提交到相似度检测
+                nbytes = estimate_nbytes(screenshot) + features.nbytes
+                self.admission.update(task.task_id, nbytes)
+                if not self.similarity_queue.put(task.task_id, (screenshot, task, callback, features),
+                                                 nbytes=nbytes):
+                    # 等待超时后才到达：前一帧已不确定，跳过比较直接保存，不丢证据帧
+                    self.stats['late_frames'] += 1
+                    print(f"⚠️ 截图 {task.task_id} 超过重排等待时间，跳过相似度检测直接保存")
+                    self.save_queue.put((screenshot, task, callback, features), nbytes=nbytes)
                 
                 return screenshot
             
+            self._abandon_capture(task)
+            if callback:
+                callback(None, task, False, "截图失败")
+            
         except Exception as e:
             print(f"❌ 截图任务失败 {task.task_id}: {e}")
+            self._abandon_capture(task)
             if callback:
                 callback(None, task, False, str(e))
         
         return None
     
     def _capture_with_adaptive_retry(self, region: Tuple[int, int, int, int], 
-                                   max_retries: int = 3) -> Optional[Image.Image]:
-        """自适应重试截图"""
+                                   max_retries: int = 3,
+                                   task: Optional[ScreenshotTask] = None) -> Optional[Frame]:
+        """自适应重试截图（返回 Frame，后续哈希/相似度/编码共享同一块像素缓冲区）"""
+        meta = {'task_id': task.task_id, 'timestamp': task.timestamp} if task else {}
         for attempt in range(max_retries):
             try:
                 # 根据系统负载调整截图质量
                 if self.performance_config['adaptive_quality']:
-                    cpu_percent = psutil.cpu_percent(interval=0.1)
+                    cpu_percent = self.system_metrics.cpu_percent
                     if cpu_percent > 80:
                         # 高负载时使用较低质量
-                        screenshot = pyautogui.screenshot(region=region)
+                        screenshot = self.capture_backend.grab_frame(region, **meta)
                         # 可以在这里添加图像压缩逻辑
                     else:
-                        screenshot = pyautogui.screenshot(region=region)
+                        screenshot = self.capture_backend.grab_frame(region, **meta)
                 else:
-                    screenshot = pyautogui.screenshot(region=region)
+                    screenshot = self.capture_backend.grab_frame(region, **meta)
                 
                 return screenshot
                 
@@ -302,22 +514,24 @@ class AdvancedScreenshotManager:
     
     def _similarity_processor(self):
         """相似度检测处理器"""
-        last_screenshot = None
+        last_features = None
         
         while self.is_running:
+            item = None
+            handed_off = False  # 帧已交给保存阶段或已作为重复帧结束，额度由那一侧归还
             try:
                 # 从队列获取任务
                 item = self.similarity_queue.get(timeout=1.0)
                 if item is None:
                     continue
                 
-                screenshot, task, callback = item
+                screenshot, task, callback, features = item
                 start_time = time.time()
                 
-                # 执行相似度检测
+                # 执行相似度检测（上一帧的特征直接复用）
                 is_duplicate = False
-                if last_screenshot:
-                    is_duplicate = self._advanced_similarity_check(screenshot, last_screenshot)
+                if last_features is not None:
+                    is_duplicate = self._advanced_similarity_check(features, last_features)
                 
                 if is_duplicate:
                     self.stats['duplicates_detected'] += 1
@@ -330,126 +544,101 @@ class AdvancedScreenshotManager:
                 
                 # 提交到保存队列
                 if not is_duplicate:
-                    self.save_queue.put((screenshot, task, callback))
-                    last_screenshot = screenshot
-                elif callback:
-                    callback(screenshot, task, False, "重复内容")
+                    nbytes = estimate_nbytes(screenshot) + features.nbytes
+                    self.save_queue.put((screenshot, task, callback, features), nbytes=nbytes)
+                    handed_off = True
+                    if self.stitcher is not None:
+                        self.stitch_queue.put((screenshot, features), nbytes=nbytes)
+                    last_features = features
+                else:
+                    handed_off = True
+                    self._release_task(task)
+                    if callback:
+                        callback(screenshot, task, False, "重复内容")
                 
             except Empty:
                 continue
             except Exception as e:
                 print(f"⚠️ 相似度检测错误: {e}")
+                if item is not None and not handed_off:
+                    # 帧在本阶段失败：归还额度并通知调用方，否则准入额度永久泄漏
+                    screenshot, task, callback, _ = item
+                    self._release_task(task)
+                    if callback:
+                        try:
+                            callback(screenshot, task, False, f"相似度检测失败: {e}")
+                        except Exception as callback_error:
+                            print(f"⚠️ 截图回调错误: {callback_error}")
     
-    def _advanced_similarity_check(self, img1: Image.Image, img2: Image.Image) -> bool:
-        """高级相似度检测"""
+    def _advanced_similarity_check(self, features1: FrameFeatures,
+                                   features2: FrameFeatures) -> bool:
+        """高级相似度检测（基于捕获时计算好的帧特征）"""
         try:
             # 多级检测策略
+            if features1.size != features2.size:
+                return False
             
             # 1. 快速哈希检测
-            hash1 = self._get_fast_hash(img1)
-            hash2 = self._get_fast_hash(img2)
+            hashes1 = features1.hashes
+            hashes2 = features2.hashes
             
-            if hash1 == hash2:
+            if hashes1.ahash == hashes2.ahash:
                 return True
             
             # 2. 感知哈希检测
             if self.performance_config['use_advanced_similarity']:
-                phash1 = self._get_perceptual_hash(img1)
-                phash2 = self._get_perceptual_hash(img2)
-                
                 # 计算汉明距离
-                hamming_distance = bin(phash1 ^ phash2).count('1')
-                if hamming_distance < 5:  # 阈值可调
+                if hamming_distance(hashes1.phash, hashes2.phash) < 5:  # 阈值可调
                     return True
             
             # 3. 结构相似性检测（SSIM）
             if self.performance_config['use_advanced_similarity']:
-                ssim_score = self._calculate_ssim(img1, img2)
-                return ssim_score > self.performance_config['similarity_threshold']
+                # 以最不相似的条带为准：只有底部新增一条消息时全局得分仍然很高
+                ssim_result = self._calculate_ssim(features1, features2)
+                if ssim_result is None:
+                    return False
+                return ssim_result.min_band > self.performance_config['similarity_threshold']
             else:
                 # 简化的相似度检测
-                return self._fast_similarity_check(img1, img2)
+                return self._fast_similarity_check(features1, features2)
             
         except Exception as e:
             print(f"⚠️ 高级相似度检测错误: {e}")
             return False
     
-    def _get_fast_hash(self, image: Image.Image) -> str:
-        """获取快速哈希"""
-        # 缩小图像并转为灰度
-        small_img = image.resize((8, 8), Image.Resampling.LANCZOS).convert('L')
-        pixels = list(small_img.getdata())
-        
-        # 计算平均值
-        avg = sum(pixels) / len(pixels)
-        
-        # 生成哈希
-        hash_bits = ''.join('1' if pixel > avg else '0' for pixel in pixels)
-        return hash_bits
+    def _get_fast_hash(self, image: Image.Image) -> int:
+        """获取快速哈希（64位 aHash）"""
+        return compute_hashes(image).ahash
     
     def _get_perceptual_hash(self, image: Image.Image) -> int:
-        """获取感知哈希"""
-        # 缩放到32x32并转为灰度
-        img = image.resize((32, 32), Image.Resampling.LANCZOS).convert('L')
-        pixels = np.array(img)
-        
-        # 计算DCT
-        dct = cv2.dct(np.float32(pixels))
-        
-        # 取左上角8x8区域
-        dct_low = dct[:8, :8]
-        
-        # 计算中位数
-        median = np.median(dct_low)
-        
-        # 生成哈希
-        hash_value = 0
-        for i in range(8):
-            for j in range(8):
-                if dct_low[i, j] > median:
-                    hash_value |= (1 << (i * 8 + j))
-        
-        return hash_value
+        """获取感知哈希（64位 pHash）"""
+        return compute_hashes(image).phash
     
-    def _calculate_ssim(self, img1: Image.Image, img2: Image.Image) -> float:
-        """计算结构相似性指数"""
+    def _calculate_ssim(self, features1: FrameFeatures,
+                        features2: FrameFeatures) -> Optional[SSIMResult]:
+        """计算窗口化结构相似性（按配置比例缩小，逐条带给出得分）"""
         try:
-            # 转换为灰度numpy数组
-            arr1 = np.array(img1.convert('L').resize((64, 64)))
-            arr2 = np.array(img2.convert('L').resize((64, 64)))
-            
-            # 计算均值
-            mu1 = np.mean(arr1)
-            mu2 = np.mean(arr2)
-            
-            # 计算方差和协方差
-            var1 = np.var(arr1)
-            var2 = np.var(arr2)
-            cov = np.mean((arr1 - mu1) * (arr2 - mu2))
-            
-            # SSIM公式
-            c1 = 0.01 ** 2
-            c2 = 0.03 ** 2
-            
-            ssim = ((2 * mu1 * mu2 + c1) * (2 * cov + c2)) / \
-                   ((mu1**2 + mu2**2 + c1) * (var1 + var2 + c2))
+            scale = self.performance_config['ssim_scale']
+            width, height = features1.size
+            size = (max(1, int(round(width * scale))), max(1, int(round(height * scale))))
             
-            return ssim
+            # 缩小后的灰度图随帧特征缓存，每帧只生成一次
+            return ssim_from_gray(
+                features1.resized(size), features2.resized(size),
+                window=self.performance_config['ssim_window'],
+                bands=self.performance_config['ssim_bands'],
+                scale=scale
+            )
             
         except Exception:
-            return 0.0
+            return None
     
-    def _fast_similarity_check(self, img1: Image.Image, img2: Image.Image) -> bool:
+    def _fast_similarity_check(self, features1: FrameFeatures, features2: FrameFeatures) -> bool:
         """快速相似度检测（简化版）"""
         try:
-            # 缩小图像进行快速比较
-            size = (32, 32)
-            small1 = img1.resize(size, Image.Resampling.LANCZOS).convert('L')
-            small2 = img2.resize(size, Image.Resampling.LANCZOS).convert('L')
-            
-            # 转换为numpy数组
-            arr1 = np.array(small1)
-            arr2 = np.array(small2)
+            # 直接比较 32x32 灰度缩略图（float32，不会溢出）
+            arr1 = features1.thumbnail
+            arr2 = features2.thumbnail
             
             # 计算均方误差
             mse = np.mean((arr1 - arr2) ** 2)
@@ -461,6 +650,73 @@ class AdvancedScreenshotManager:
         except Exception:
             return False
     
+    def enable_stitching(self, output_dir: Optional[str] = None, mode: str = 'chunks',
+                         chunk_height: int = 4096, direction: str = 'down'):
+        """启用长图拼接：非重复帧在相似度检测后按顺序送入拼接器"""
+        if self.stitcher is not None:
+            self.finish_stitching()
+        
+        self.stitcher = LongImageStitcher(
+            output_dir or os.path.join(self.save_directory, "长图"),
+            mode=mode,
+            chunk_height=chunk_height,
+            direction=direction,
+            compress_level=self.performance_config['compression_level']
+        )
+        self._stitch_done.clear()
+        self._stitch_finishing = False
+        self._stitch_results = []
+        threading.Thread(target=self._stitch_processor, args=(self.stitcher,),
+                         daemon=True, name="stitch_processor").start()
+        print(f"🧩 长图拼接已启用: {self.stitcher.output_dir} ({mode})")
+    
+    def finish_stitching(self, timeout: float = 30.0) -> List[str]:
+        """等待已排队的帧拼接完成，写出剩余内容并返回输出文件列表"""
+        with self._stitch_lock:
+            if self.stitcher is None or self._stitch_finishing:
+                return []
+            self._stitch_finishing = True
+        
+        # 先让相似度队列中的剩余帧流入拼接队列
+        deadline = time.time() + timeout
+        while not self.similarity_queue.empty() and time.time() < deadline:
+            time.sleep(0.05)
+        
+        self.stitch_queue.put(None)
+        self._stitch_done.wait(max(0.0, deadline - time.time()))
+        self.stitcher = None
+        return list(self._stitch_results)
+    
+    def _stitch_processor(self, stitcher: LongImageStitcher):
+        """长图拼接处理器"""
+        while True:
+            try:
+                item = self.stitch_queue.get(timeout=1.0)
+            except Empty:
+                if not self.is_running:
+                    break
+                continue
+            
+            if item is None:
+                break
+            
+            screenshot, features = item
+            try:
+                stitcher.add_frame(screenshot, gray=features.gray,
+                                   signatures=features.row_signatures)
+            except Exception as e:
+                print(f"⚠️ 长图拼接错误: {e}")
+        
+        try:
+            self._stitch_results = stitcher.finalize()
+            stats = stitcher.get_stats()
+            print(f"🧩 长图拼接完成: {stats['frames']}帧, {stats['rows_appended']}行, "
+                  f"输出 {len(self._stitch_results)} 个文件")
+        except Exception as e:
+            print(f"❌ 长图写出失败: {e}")
+        finally:
+            self._stitch_done.set()
+    
     def _batch_save_processor(self):
         """批量保存处理器"""
         save_batch = []
@@ -492,49 +748,164 @@ class AdvancedScreenshotManager:
             except Exception as e:
                 print(f"⚠️ 批量保存处理错误: {e}")
     
+    def set_image_codec(self, codec):
+        """设置截图编码器（预设名或 ImageCodec 对象）"""
+        self.image_codec = get_codec(codec)
+        if isinstance(codec, str):
+            self.performance_config['codec_preset'] = codec
+        print(f"🗜️ 截图编码: {self.image_codec.name} ({self.image_codec.extension})")
+    
+    def enable_frame_archive(self, archive_dir: Optional[str] = None, **archive_options):
+        """启用去重帧归档：之后保存的截图写入归档，不再逐帧编码为图片文件"""
+        self.disable_frame_archive()
+        self.frame_archive = FrameArchive(
+            archive_dir or os.path.join(self.save_directory, "归档"), **archive_options
+        )
+        print(f"🗃️ 帧归档已启用: {self.frame_archive.root}")
+    
+    def disable_frame_archive(self) -> Optional[dict]:
+        """关闭帧归档，返回本次归档统计"""
+        archive, self.frame_archive = self.frame_archive, None
+        if archive is None:
+            return None
+        stats = archive.get_stats()
+        archive.close()
+        print(f"🗃️ 帧归档已关闭: {stats['frames']}帧, 去重率 {stats['dedup_ratio']:.1%}, "
+              f"写入 {stats['stored_bytes'] / (1024**2):.1f}MB")
+        return stats
+    
+    def _get_encoder_pool(self) -> Optional[EncoderPool]:
+        """获取编码进程池（按配置延迟创建，未启用时返回 None）"""
+        if self.encoder_pool is None and self.performance_config['encoder_workers'] > 0:
+            self.encoder_pool = EncoderPool(
+                max_workers=self.performance_config['encoder_workers'],
+                codec=self.image_codec
+            )
+        return self.encoder_pool
+    
     def _execute_batch_save(self, batch: List):
         """执行批量保存"""
         start_time = time.time()
         
-        # 并行保存
-        futures = []
-        for screenshot, task, callback in batch:
-            future = self.save_executor.submit(self._save_single, screenshot, task, callback)
-            futures.append(future)
-        
-        # 等待所有保存完成
-        for future in as_completed(futures, timeout=10):
-            try:
-                future.result()
-            except Exception as e:
-                print(f"❌ 单个保存任务失败: {e}")
+        try:
+            frame_archive = self.frame_archive
+            encoder_pool = None if frame_archive is not None else self._get_encoder_pool()
+            if frame_archive is not None:
+                self._execute_archive_save(frame_archive, batch)
+            elif encoder_pool is not None:
+                self._execute_pool_save(encoder_pool, batch)
+            else:
+                # 并行保存
+                futures = {}
+                for screenshot, task, callback, _ in batch:
+                    future = self.save_executor.submit(self._save_single, screenshot, task, callback)
+                    futures[future] = (screenshot, task, callback)
+                
+                # 等待所有保存完成
+                try:
+                    for future in as_completed(futures, timeout=10):
+                        futures.pop(future)
+                        try:
+                            future.result()
+                        except Exception as e:
+                            print(f"❌ 单个保存任务失败: {e}")
+                except FutureTimeoutError:
+                    # 尚未开始的保存任务取消并回调失败；已在执行的由 _save_single 自行回调
+                    print(f"❌ {len(futures)} 个保存任务超时")
+                    for future, (screenshot, task, callback) in futures.items():
+                        if future.cancel() and callback:
+                            callback(screenshot, task, False, "保存超时")
+        finally:
+            # 无论成败都归还额度，避免准入永久阻塞
+            for _, task, _, _ in batch:
+                self._release_task(task)
         
         # 更新性能指标
         save_time = time.time() - start_time
+        self.save_gauge.record_service(save_time / max(1, len(batch)))
         self.metrics.avg_save_time = (
             self.metrics.avg_save_time * 0.9 + save_time * 0.1
         )
     
-    def _save_single(self, screenshot: Image.Image, task: ScreenshotTask, 
+    def _execute_pool_save(self, encoder_pool: EncoderPool, batch: List):
+        """通过编码进程池保存一批截图（像素经共享内存传递）"""
+        futures = {}
+        for screenshot, task, callback, _ in batch:
+            filepath = self._build_save_path(task)
+            try:
+                future = encoder_pool.submit(screenshot, filepath, codec=self.image_codec)
+            except Exception as e:
+                print(f"❌ 提交编码任务失败: {e}")
+                if callback:
+                    callback(screenshot, task, False, str(e))
+                continue
+            futures[future] = (screenshot, task, callback, filepath)
+        
+        try:
+            for future in as_completed(futures, timeout=30):
+                self._report_pool_save(future, *futures.pop(future))
+        except FutureTimeoutError:
+            # 尚未开始的编码任务取消并回调失败；已在编码的会写出文件，完成后按实际结果回调
+            print(f"❌ {len(futures)} 个编码任务超时")
+            for future, (screenshot, task, callback, filepath) in futures.items():
+                if future.cancel():
+                    if callback:
+                        callback(screenshot, task, False, f"保存超时: {filepath}")
+                else:
+                    future.add_done_callback(
+                        lambda f, item=(screenshot, task, callback, filepath):
+                        self._report_pool_save(f, *item))
+    
+    @staticmethod
+    def _report_pool_save(future, screenshot, task, callback, filepath):
+        """按编码任务的结果回调"""
+        try:
+            future.result()
+            if callback:
+                callback(screenshot, task, True, filepath)
+        except Exception as e:
+            print(f"❌ 保存截图失败: {e}")
+            if callback:
+                callback(screenshot, task, False, str(e))
+    
+    def _execute_archive_save(self, frame_archive: FrameArchive, batch: List):
+        """按顺序把一批截图写入帧归档（复用捕获时计算、随帧传递的行签名）"""
+        for screenshot, task, callback, features in batch:
+            frame_id = os.path.splitext(os.path.basename(self._build_save_path(task)))[0]
+            try:
+                frame_archive.add_frame(
+                    screenshot, frame_id,
+                    metadata={'task_id': task.task_id, 'timestamp': task.timestamp,
+                              'region': list(task.region)},
+                    signatures=features.row_signatures if features is not None else None
+                )
+                if callback:
+                    callback(screenshot, task, True, f"{frame_archive.root}#{frame_id}")
+            except Exception as e:
+                print(f"❌ 归档截图失败: {e}")
+                if callback:
+                    callback(screenshot, task, False, str(e))
+    
+    def _build_save_path(self, task: ScreenshotTask) -> str:
+        """生成截图保存路径"""
+        # 生成文件名
+        timestamp = time.strftime("%Y%m%d_%H%M%S", time.localtime(task.timestamp))
+        filename = f"screenshot_{timestamp}_{task.task_id:04d}{self.image_codec.extension}"
+        
+        # 使用配置的保存路径
+        return os.path.join(self.save_directory, filename)
+    
+    def _save_single(self, screenshot: Frame, task: ScreenshotTask, 
                     callback: Optional[Callable] = None):
         """保存单个截图"""
         try:
-            # 生成文件名
-            timestamp = time.strftime("%Y%m%d_%H%M%S", time.localtime(task.timestamp))
-            filename = f"screenshot_{timestamp}_{task.task_id:04d}.png"
-            
-            # 使用配置的保存路径
-            filepath = os.path.join(self.save_directory, filename)
+            filepath = self._build_save_path(task)
             
             # 确保目录存在
             os.makedirs(os.path.dirname(filepath), exist_ok=True)
             
             # 保存截图
-            save_kwargs = {
-                'optimize': True,
-                'compress_level': self.performance_config['compression_level']
-            }
-            screenshot.save(filepath, 'PNG', **save_kwargs)
+            self.image_codec.save(screenshot, filepath)
             
             if callback:
                 callback(screenshot, task, True, filepath)
@@ -548,9 +919,8 @@ class AdvancedScreenshotManager:
         """性能监控器"""
         while self.is_running:
             try:
-                # 更新内存使用情况
-                process = psutil.Process()
-                memory_mb = process.memory_info().rss / (1024**2)
+                # 更新内存使用情况（共享采样器的最新快照）
+                memory_mb = self.system_metrics.rss_mb
                 self.metrics.memory_usage_mb = memory_mb
                 
                 # 检查内存限制
@@ -558,8 +928,14 @@ class AdvancedScreenshotManager:
                     print(f"⚠️ 内存使用超限: {memory_mb:.1f}MB")
                     self._cleanup_memory()
                 
-                # 更新缓存命中率
-                self.metrics.cache_hit_rate = self.image_cache.get_hit_rate()
+                # 额度耗尽说明下游跟不上：报告积压最深的阶段
+                if self.admission.pressure >= 1.0:
+                    flow = self.get_flow_stats()
+                    stage = max(('similarity', 'save', 'stitch'), key=lambda n: flow[n]['bytes_mb'])
+                    print(f"⏳ 管道背压: 在途 {self.admission.in_flight} 帧, "
+                          f"积压阶段 {stage} ({flow[stage]['depth']} 项, "
+                          f"{flow[stage]['bytes_mb']:.1f}MB), "
+                          f"保存 {flow['save_io']['service_ms']:.0f}ms/帧")
                 
                 # 计算吞吐量
                 if self.stats['total_processing_time'] > 0:
@@ -574,20 +950,34 @@ class AdvancedScreenshotManager:
     
     def _cleanup_memory(self):
         """清理内存"""
-        # 清理缓存
-        self.image_cache.clear()
-        self.hash_cache.clear()
-        
         # 强制垃圾回收
         import gc
         gc.collect()
         
         print("🧹 内存清理完成")
     
-    def get_adaptive_wait_time(self, scroll_mode: str) -> float:
-        """获取自适应等待时间"""
-        cpu_percent = psutil.cpu_percent(interval=0.1)
-        return self.wait_manager.calculate_wait_time(scroll_mode, cpu_percent)
+    def get_adaptive_wait_time(self, scroll_mode: str, window_key=None) -> float:
+        """获取自适应等待时间（CPU 负载为非阻塞采样）"""
+        return self.wait_manager.calculate_wait_time(scroll_mode, window_key=window_key)
+    
+    def plan_scroll_wait(self, window_key, scroll_mode: str, max_wait: float) -> PacingPlan:
+        """安排下一次滚动的等待（稳定检测上限、稳定判定次数、稳定后停留）"""
+        return self.wait_manager.plan(window_key, scroll_mode, max_wait)
+    
+    def record_settle_time(self, window_key, latency: float, settled: bool = True):
+        """反馈实测的滚动稳定延迟，供节奏控制学习"""
+        self.wait_manager.record_settle(window_key, latency, settled)
+    
+    def get_flow_stats(self) -> dict:
+        """各阶段的深度、字节数、排队/处理延迟和阻塞时间"""
+        return {
+            'admission': self.admission.get_stats(),
+            'capture': self.capture_gauge.snapshot(),
+            'similarity': self.similarity_queue.get_stats(),
+            'save': self.save_queue.gauge.snapshot(),
+            'save_io': self.save_gauge.snapshot(),
+            'stitch': self.stitch_queue.gauge.snapshot()
+        }
     
     def get_performance_metrics(self) -> PerformanceMetrics:
         """获取性能指标"""
@@ -597,18 +987,26 @@ class AdvancedScreenshotManager:
         """获取详细统计信息"""
         stats = self.stats.copy()
         stats.update({
-            'cache_hit_rate': self.metrics.cache_hit_rate,
             'avg_capture_time': self.metrics.avg_capture_time,
             'avg_similarity_time': self.metrics.avg_similarity_time,
             'avg_save_time': self.metrics.avg_save_time,
             'memory_usage_mb': self.metrics.memory_usage_mb,
             'throughput_fps': self.metrics.throughput_fps,
+            'pacing': self.wait_manager.get_stats(),
             'queue_sizes': {
-                'capture': self.capture_queue.qsize(),
+                'capture': self.capture_gauge.depth,
                 'similarity': self.similarity_queue.qsize(),
-                'save': self.save_queue.qsize()
-            }
+                'save': self.save_queue.qsize(),
+                'stitch': self.stitch_queue.qsize()
+            },
+            'flow': self.get_flow_stats()
         })
+        if self.encoder_pool is not None:
+            stats['encoder'] = self.encoder_pool.get_stats()
+        if self.frame_archive is not None:
+            stats['archive'] = self.frame_archive.get_stats()
+        if self.stitcher is not None:
+            stats['stitching'] = self.stitcher.get_stats()
         return stats
     
     def cleanup(self):
@@ -621,10 +1019,10 @@ class AdvancedScreenshotManager:
         self.capture_executor.shutdown(wait=True)
         self.similarity_executor.shutdown(wait=True)
         self.save_executor.shutdown(wait=True)
-        
-        # 清理缓存
-        self.image_cache.clear()
-        self.hash_cache.clear()
+        if self.encoder_pool is not None:
+            self.encoder_pool.shutdown(wait=True)
+            self.encoder_pool = None
+        self.disable_frame_archive()
         
         print("✅ 高级截图管理器清理完成")
     
@@ -668,7 +1066,6 @@ if __name__ == "__main__":
         print(f"   平均相似度检测时间: {metrics.avg_similarity_time:.3f}s")
         print(f"   平均保存时间: {metrics.avg_save_time:.3f}s")
         print(f"   内存使用: {metrics.memory_usage_mb:.1f}MB")
-        print(f"   缓存命中率: {metrics.cache_hit_rate:.2%}")
         print(f"   吞吐量: {metrics.throughput_fps:.1f} FPS")
         
         print(f"\n📈 详细统计:")
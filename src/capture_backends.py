@@ -0,0 +1,740 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+截图后端层 - 可插拔的屏幕捕获实现
+版本: 3.0.8
+
+所有截图路径（滚动截图、录屏、微信窗口检测）都通过 CaptureBackend 获取像素，
+由注册表按主机能力选择最快的实现：
+
+- xshm:      X11 MIT-SHM 共享内存抓屏，直接返回共享内存上的 BGRA 视图
+- pyautogui: 通用回退实现（Windows/macOS/无扩展的 X11）
+- replay:    按顺序回放目录中的 PNG（无显示器的 CI 压测）
+- synthetic: 在预渲染的长"聊天记录"图上按固定步长滚动（无显示器的 CI 压测）
+
+replay/synthetic 不参与自动选择，可通过环境变量指定，例如:
+    SCREENSHOT_CAPTURE_BACKEND=replay:/path/to/frames
+    SCREENSHOT_CAPTURE_BACKEND=synthetic
+
+约定:
+- grab(region) 返回 HxWx4 的 BGRA uint8 视图，该视图在同一线程下一次 grab 前有效，
+  需要保留时由调用方自行复制
+- grab_image(region) 返回调用方独占的 RGB PIL 图像
+- grab_frame(region) 返回调用方独占的 Frame（一次颜色转换，之后零拷贝共享）
+"""
+
+import os
+import sys
+import threading
+import ctypes
+import ctypes.util
+from typing import Dict, List, Optional, Tuple, Type
+
+import numpy as np
+import cv2
+from PIL import Image
+
+from frame import Frame
+
+
+Region = Tuple[int, int, int, int]
+
+
+class CaptureBackend:
+    """截图后端基类"""
+
+    name = "base"
+    priority = 0  # 自动选择时优先级越高越先使用
+    auto_select = True  # 是否参与 "auto" 自动选择
+
+    @classmethod
+    def is_available(cls) -> bool:
+        """当前主机是否可以使用该后端"""
+        return False
+
+    def grab(self, region: Region) -> np.ndarray:
+        """截取区域，返回 BGRA 视图（下一次 grab 前有效）"""
+        raise NotImplementedError
+
+    def grab_image(self, region: Region) -> Image.Image:
+        """截取区域，返回独立的 RGB PIL 图像"""
+        return bgra_to_image(self.grab(region))
+
+    def grab_frame(self, region: Region, pixel_format: str = 'RGB', **meta) -> Frame:
+        """截取区域，返回独立的 Frame（meta 为 timestamp/task_id 等元数据）"""
+        return Frame.from_bgra(self.grab(region), pixel_format, region=tuple(region), **meta)
+
+    def close(self):
+        """释放后端资源"""
+        pass
+
+
+def bgra_to_image(bgra: np.ndarray) -> Image.Image:
+    """将 BGRA 视图（允许行尾填充）一次性解码为独立的 RGB PIL 图像"""
+    height, width = bgra.shape[:2]
+    stride = bgra.strides[0]
+    # 按行跨度直接暴露底层内存，避免对带填充的视图做 ascontiguousarray 复制
+    raw = (ctypes.c_ubyte * (stride * (height - 1) + width * 4)).from_address(
+        bgra.ctypes.data)
+    image = Image.frombuffer('RGB', (width, height), raw, 'raw', 'BGRX', stride, 1)
+    image.load()
+    return image
+
+
+# ===================== 后端注册表 =====================
+
+_BACKEND_REGISTRY: Dict[str, Type[CaptureBackend]] = {}
+_default_backend: Optional[CaptureBackend] = None
+_default_lock = threading.Lock()
+
+
+def register_backend(backend_cls: Type[CaptureBackend]) -> Type[CaptureBackend]:
+    """注册截图后端（可作为类装饰器使用）"""
+    _BACKEND_REGISTRY[backend_cls.name] = backend_cls
+    return backend_cls
+
+
+def available_backends() -> List[str]:
+    """按优先级返回当前主机可用的后端名称"""
+    ordered = sorted(_BACKEND_REGISTRY.values(), key=lambda cls: -cls.priority)
+    names = []
+    for backend_cls in ordered:
+        if not backend_cls.auto_select:
+            continue
+        try:
+            if backend_cls.is_available():
+                names.append(backend_cls.name)
+        except Exception:
+            continue
+    return names
+
+
+def create_backend(name: Optional[str] = None, **options) -> CaptureBackend:
+    """
+    创建截图后端
+
+    Args:
+        name: 后端名称，None 或 "auto" 时读取环境变量 SCREENSHOT_CAPTURE_BACKEND，
+              仍未指定则自动选择最快的可用后端；"name:source" 形式会把
+              source 作为构造参数传入（如 "replay:/tmp/frames"）
+        **options: 传递给后端构造函数的参数
+    """
+    name = name or os.environ.get('SCREENSHOT_CAPTURE_BACKEND') or 'auto'
+    if ':' in name:
+        name, source = name.split(':', 1)
+        options.setdefault('source', source)
+
+    if name == 'auto':
+        candidates = available_backends()
+        if not candidates:
+            raise RuntimeError("没有可用的截图后端")
+        name = candidates[0]
+
+    if name not in _BACKEND_REGISTRY:
+        raise ValueError(f"未知的截图后端: {name}")
+
+    backend_cls = _BACKEND_REGISTRY[name]
+    if not backend_cls.is_available():
+        raise RuntimeError(f"截图后端在当前主机不可用: {name}")
+
+    return backend_cls(**options)
+
+
+def get_capture_backend() -> CaptureBackend:
+    """获取进程共享的默认截图后端"""
+    global _default_backend
+    if _default_backend is None:
+        with _default_lock:
+            if _default_backend is None:
+                _default_backend = create_backend()
+                print(f"📷 截图后端: {_default_backend.name}")
+    return _default_backend
+
+
+def set_capture_backend(backend: Optional[CaptureBackend]):
+    """替换进程共享的默认截图后端（None 表示下次重新自动选择）"""
+    global _default_backend
+    with _default_lock:
+        if _default_backend is not None and _default_backend is not backend:
+            _default_backend.close()
+        _default_backend = backend
+
+
+# ===================== PyAutoGUI 回退后端 =====================
+
+@register_backend
+class PyAutoGUIBackend(CaptureBackend):
+    """基于 pyautogui.screenshot 的通用后端"""
+
+    name = "pyautogui"
+    priority = 0
+
+    def __init__(self):
+        import pyautogui
+        self._pyautogui = pyautogui
+        self._local = threading.local()
+
+    @classmethod
+    def is_available(cls) -> bool:
+        try:
+            import pyautogui  # noqa: F401
+            return True
+        except Exception:
+            return False
+
+    def grab(self, region: Region) -> np.ndarray:
+        rgb = np.asarray(self._pyautogui.screenshot(region=region))
+        height, width = rgb.shape[:2]
+
+        # 每个线程复用同一块 BGRA 缓冲区
+        buffer = getattr(self._local, 'buffer', None)
+        if buffer is None or buffer.shape[:2] != (height, width):
+            buffer = np.empty((height, width, 4), dtype=np.uint8)
+            self._local.buffer = buffer
+
+        cv2.cvtColor(rgb, cv2.COLOR_RGB2BGRA, dst=buffer)
+        return buffer
+
+    def grab_image(self, region: Region) -> Image.Image:
+        # pyautogui 本身即返回 RGB PIL 图像，无需再转换
+        return self._pyautogui.screenshot(region=region)
+
+    def grab_frame(self, region: Region, pixel_format: str = 'RGB', **meta) -> Frame:
+        frame = Frame.from_pil(self._pyautogui.screenshot(region=region),
+                               region=tuple(region), **meta)
+        return frame.convert(pixel_format)
+
+
+# ===================== X11 MIT-SHM 后端 =====================
+
+class _XImage(ctypes.Structure):
+    """XImage 结构体（只声明用到的前缀字段）"""
+    _fields_ = [
+        ('width', ctypes.c_int),
+        ('height', ctypes.c_int),
+        ('xoffset', ctypes.c_int),
+        ('format', ctypes.c_int),
+        ('data', ctypes.c_void_p),
+        ('byte_order', ctypes.c_int),
+        ('bitmap_unit', ctypes.c_int),
+        ('bitmap_bit_order', ctypes.c_int),
+        ('bitmap_pad', ctypes.c_int),
+        ('depth', ctypes.c_int),
+        ('bytes_per_line', ctypes.c_int),
+        ('bits_per_pixel', ctypes.c_int),
+    ]
+
+
+class _XShmSegmentInfo(ctypes.Structure):
+    _fields_ = [
+        ('shmseg', ctypes.c_ulong),
+        ('shmid', ctypes.c_int),
+        ('shmaddr', ctypes.c_void_p),
+        ('readOnly', ctypes.c_int),
+    ]
+
+
+_ZPIXMAP = 2
+_ALL_PLANES = 0xFFFFFFFF
+_IPC_PRIVATE = 0
+_IPC_CREAT = 0o1000
+_IPC_RMID = 0
+
+# X 错误回调：默认处理器会直接终止进程。XSetErrorHandler 是进程级的，
+# 每次截图切换处理器会与其它线程、其它 X 客户端（如 Tk）互相覆盖，所以只在
+# 加载 Xlib 时安装一次：本模块打开的 Display 上的错误按连接计数（每个截图线程
+# 一个连接，互不干扰），其它连接的错误交给安装前的处理器
+_X_ERROR_HANDLER = ctypes.CFUNCTYPE(ctypes.c_int, ctypes.c_void_p, ctypes.c_void_p)
+
+_x_errors: Dict[int, int] = {}      # 本模块的 Display 地址 -> 尚未取走的错误数
+_x_previous_handler = None
+
+
+@_X_ERROR_HANDLER
+def _on_x_error(display, event):
+    if display in _x_errors:
+        _x_errors[display] += 1
+        return 0
+    if _x_previous_handler is not None:
+        return _x_previous_handler(display, event)
+    return 0
+
+
+_ON_X_ERROR_PTR = ctypes.cast(_on_x_error, ctypes.c_void_p).value
+
+
+class _XShmLibs:
+    """延迟加载的 libX11 / libXext / libc 函数表"""
+
+    _instance = None
+    _lock = threading.Lock()
+
+    def __init__(self):
+        self.x11 = ctypes.CDLL(ctypes.util.find_library('X11') or 'libX11.so.6')
+        self.xext = ctypes.CDLL(ctypes.util.find_library('Xext') or 'libXext.so.6')
+        self.libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+
+        x11, xext, libc = self.x11, self.xext, self.libc
+        vp = ctypes.c_void_p
+
+        x11.XInitThreads.restype = ctypes.c_int
+        x11.XOpenDisplay.argtypes = [ctypes.c_char_p]
+        x11.XOpenDisplay.restype = vp
+        x11.XCloseDisplay.argtypes = [vp]
+        x11.XDefaultRootWindow.argtypes = [vp]
+        x11.XDefaultRootWindow.restype = ctypes.c_ulong
+        x11.XDefaultScreen.argtypes = [vp]
+        x11.XDefaultVisual.argtypes = [vp, ctypes.c_int]
+        x11.XDefaultVisual.restype = vp
+        x11.XDefaultDepth.argtypes = [vp, ctypes.c_int]
+        x11.XDisplayWidth.argtypes = [vp, ctypes.c_int]
+        x11.XDisplayHeight.argtypes = [vp, ctypes.c_int]
+        x11.XSync.argtypes = [vp, ctypes.c_int]
+        x11.XDestroyImage.argtypes = [ctypes.POINTER(_XImage)]
+        x11.XSetErrorHandler.argtypes = [vp]
+        x11.XSetErrorHandler.restype = vp
+
+        xext.XShmQueryExtension.argtypes = [vp]
+        xext.XShmCreateImage.argtypes = [
+            vp, vp, ctypes.c_uint, ctypes.c_int, ctypes.c_char_p,
+            ctypes.POINTER(_XShmSegmentInfo), ctypes.c_uint, ctypes.c_uint
+        ]
+        xext.XShmCreateImage.restype = ctypes.POINTER(_XImage)
+        xext.XShmAttach.argtypes = [vp, ctypes.POINTER(_XShmSegmentInfo)]
+        xext.XShmDetach.argtypes = [vp, ctypes.POINTER(_XShmSegmentInfo)]
+        xext.XShmGetImage.argtypes = [
+            vp, ctypes.c_ulong, ctypes.POINTER(_XImage),
+            ctypes.c_int, ctypes.c_int, ctypes.c_ulong
+        ]
+
+        libc.shmget.argtypes = [ctypes.c_int, ctypes.c_size_t, ctypes.c_int]
+        libc.shmat.argtypes = [ctypes.c_int, vp, ctypes.c_int]
+        libc.shmat.restype = vp
+        libc.shmdt.argtypes = [vp]
+        libc.shmctl.argtypes = [ctypes.c_int, ctypes.c_int, vp]
+
+        # 各线程持有独立的 Display 连接，这里仍开启 Xlib 线程支持以防万一
+        x11.XInitThreads()
+
+        # 错误处理器只安装一次，原处理器保留用于其它连接
+        global _x_previous_handler
+        previous = x11.XSetErrorHandler(_ON_X_ERROR_PTR)
+        if previous and previous != _ON_X_ERROR_PTR:
+            _x_previous_handler = _X_ERROR_HANDLER(previous)
+
+    def open_display(self):
+        """打开 X 连接，并登记到错误计数表"""
+        display = self.x11.XOpenDisplay(None)
+        if display:
+            _x_errors[display] = 0
+        return display
+
+    def close_display(self, display):
+        _x_errors.pop(display, None)
+        self.x11.XCloseDisplay(display)
+
+    @staticmethod
+    def take_errors(display) -> int:
+        """取走该连接上累计的 X 错误数"""
+        count = _x_errors.get(display, 0)
+        _x_errors[display] = 0
+        return count
+
+    @classmethod
+    def load(cls) -> '_XShmLibs':
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = cls()
+        return cls._instance
+
+
+class _XShmSession:
+    """单线程的 X 连接 + 共享内存段，区域尺寸不变时重复使用"""
+
+    def __init__(self, libs: _XShmLibs):
+        self.libs = libs
+        self.display = libs.open_display()
+        if not self.display:
+            raise RuntimeError("无法连接 X 显示服务器")
+
+        screen = libs.x11.XDefaultScreen(self.display)
+        self.root = libs.x11.XDefaultRootWindow(self.display)
+        self.visual = libs.x11.XDefaultVisual(self.display, screen)
+        self.depth = libs.x11.XDefaultDepth(self.display, screen)
+        self.screen_size = (libs.x11.XDisplayWidth(self.display, screen),
+                            libs.x11.XDisplayHeight(self.display, screen))
+
+        self.shminfo = _XShmSegmentInfo()
+        self.image = None
+        self.view = None
+        self.size = (0, 0)
+
+    def _release_image(self):
+        if self.image is None:
+            return
+        libs = self.libs
+        libs.xext.XShmDetach(self.display, ctypes.byref(self.shminfo))
+        libs.x11.XSync(self.display, 0)
+        # data 指向共享内存，交给 shmdt 释放，避免 XDestroyImage 对其调用 free
+        self.image.contents.data = None
+        libs.x11.XDestroyImage(self.image)
+        libs.libc.shmdt(self.shminfo.shmaddr)
+        self.image = None
+        self.view = None
+        self.size = (0, 0)
+
+    def _allocate(self, width: int, height: int):
+        libs = self.libs
+        self._release_image()
+
+        image = libs.xext.XShmCreateImage(
+            self.display, self.visual, self.depth, _ZPIXMAP, None,
+            ctypes.byref(self.shminfo), width, height
+        )
+        if not image:
+            raise RuntimeError("XShmCreateImage 失败")
+        if image.contents.bits_per_pixel != 32:
+            libs.x11.XDestroyImage(image)
+            raise RuntimeError(f"不支持的像素格式: {image.contents.bits_per_pixel}bpp")
+
+        stride = image.contents.bytes_per_line
+        nbytes = stride * height
+        shmid = libs.libc.shmget(_IPC_PRIVATE, nbytes, _IPC_CREAT | 0o600)
+        if shmid < 0:
+            libs.x11.XDestroyImage(image)
+            raise OSError(ctypes.get_errno(), "shmget 失败")
+
+        addr = libs.libc.shmat(shmid, None, 0)
+        if addr in (None, ctypes.c_void_p(-1).value):
+            libs.libc.shmctl(shmid, _IPC_RMID, None)
+            libs.x11.XDestroyImage(image)
+            raise OSError(ctypes.get_errno(), "shmat 失败")
+
+        self.shminfo.shmid = shmid
+        self.shminfo.shmaddr = addr
+        self.shminfo.readOnly = 0
+        image.contents.data = addr
+
+        libs.take_errors(self.display)
+        libs.xext.XShmAttach(self.display, ctypes.byref(self.shminfo))
+        libs.x11.XSync(self.display, 0)
+        # 标记删除：最后一个进程分离后由内核回收，异常退出也不会泄漏
+        libs.libc.shmctl(shmid, _IPC_RMID, None)
+        if libs.take_errors(self.display):
+            libs.libc.shmdt(addr)
+            image.contents.data = None
+            libs.x11.XDestroyImage(image)
+            raise RuntimeError("XShmAttach 失败")
+
+        buffer = (ctypes.c_ubyte * nbytes).from_address(addr)
+        full = np.ctypeslib.as_array(buffer).reshape(height, stride // 4, 4)
+        self.image = image
+        self.view = full[:, :width]
+        self.size = (width, height)
+
+    def grab(self, region: Region) -> np.ndarray:
+        x, y, width, height = region
+        screen_w, screen_h = self.screen_size
+        if width <= 0 or height <= 0 or x < 0 or y < 0 \
+                or x + width > screen_w or y + height > screen_h:
+            raise ValueError(f"截图区域超出屏幕范围: {region}")
+
+        if self.size != (width, height):
+            self._allocate(width, height)
+
+        self.libs.take_errors(self.display)
+        # XShmGetImage 等待服务器回复，出错时错误已在返回前计入本连接
+        ok = self.libs.xext.XShmGetImage(self.display, self.root, self.image,
+                                         x, y, _ALL_PLANES)
+        if self.libs.take_errors(self.display) or not ok:
+            raise RuntimeError("XShmGetImage 失败")
+        return self.view
+
+    def close(self):
+        try:
+            self._release_image()
+        finally:
+            if self.display:
+                self.libs.close_display(self.display)
+                self.display = None
+
+
+@register_backend
+class XShmBackend(CaptureBackend):
+    """X11 MIT-SHM 共享内存截图后端（每线程一个连接和共享内存段）"""
+
+    name = "xshm"
+    priority = 100
+
+    def __init__(self):
+        self._libs = _XShmLibs.load()
+        self._local = threading.local()
+        self._sessions: List[_XShmSession] = []
+        self._sessions_lock = threading.Lock()
+
+    @classmethod
+    def is_available(cls) -> bool:
+        if not sys.platform.startswith('linux') or not os.environ.get('DISPLAY'):
+            return False
+        try:
+            libs = _XShmLibs.load()
+            display = libs.x11.XOpenDisplay(None)
+            if not display:
+                return False
+            try:
+                return bool(libs.xext.XShmQueryExtension(display))
+            finally:
+                libs.x11.XCloseDisplay(display)
+        except Exception:
+            return False
+
+    def _session(self) -> _XShmSession:
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = _XShmSession(self._libs)
+            self._local.session = session
+            with self._sessions_lock:
+                self._sessions.append(session)
+        return session
+
+    def grab(self, region: Region) -> np.ndarray:
+        return self._session().grab(region)
+
+    def close(self):
+        with self._sessions_lock:
+            sessions, self._sessions = self._sessions, []
+        for session in sessions:
+            try:
+                session.close()
+            except Exception as e:
+                print(f"⚠️ 释放X11共享内存失败: {e}")
+        self._local = threading.local()
+
+
+# ===================== 回放/合成后端（无显示器压测） =====================
+
+def _to_bgra(image: np.ndarray) -> np.ndarray:
+    """将 cv2 读入的灰度/BGR/BGRA 图像统一为 BGRA"""
+    if image.ndim == 2:
+        return cv2.cvtColor(image, cv2.COLOR_GRAY2BGRA)
+    if image.shape[2] == 3:
+        return cv2.cvtColor(image, cv2.COLOR_BGR2BGRA)
+    return image
+
+
+def _fit_region(frame: np.ndarray, width: int, height: int) -> np.ndarray:
+    """将帧裁剪/填充到区域尺寸（左上角对齐）"""
+    if frame.shape[0] >= height and frame.shape[1] >= width:
+        return frame[:height, :width]
+    padded = np.zeros((height, width, 4), dtype=np.uint8)
+    h = min(height, frame.shape[0])
+    w = min(width, frame.shape[1])
+    padded[:h, :w] = frame[:h, :w]
+    return padded
+
+
+@register_backend
+class ReplayBackend(CaptureBackend):
+    """按文件名顺序回放目录中的 PNG，每次 grab 返回下一帧"""
+
+    name = "replay"
+    priority = -100
+    auto_select = False
+
+    def __init__(self, source: str, loop: bool = False, preload: bool = True):
+        """
+        Args:
+            source: PNG 帧所在目录
+            loop: 回放结束后是否从头开始（否则一直返回最后一帧）
+            preload: 预先解码全部帧，压测时排除解码开销
+        """
+        self.paths = sorted(
+            os.path.join(source, name) for name in os.listdir(source)
+            if name.lower().endswith('.png')
+        )
+        if not self.paths:
+            raise ValueError(f"回放目录中没有PNG文件: {source}")
+
+        self.loop = loop
+        self.frames = [self._load(path) for path in self.paths] if preload else None
+        self.position = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def is_available(cls) -> bool:
+        return True
+
+    @staticmethod
+    def _load(path: str) -> np.ndarray:
+        image = cv2.imread(path, cv2.IMREAD_UNCHANGED)
+        if image is None:
+            raise ValueError(f"无法读取回放帧: {path}")
+        return _to_bgra(image)
+
+    def _next_index(self) -> int:
+        with self._lock:
+            index = self.position
+            if self.position < len(self.paths) - 1:
+                self.position += 1
+            elif self.loop:
+                self.position = 0
+            return index
+
+    def grab(self, region: Region) -> np.ndarray:
+        index = self._next_index()
+        frame = self.frames[index] if self.frames is not None else self._load(self.paths[index])
+        return _fit_region(frame, region[2], region[3])
+
+    def rewind(self):
+        """回到第一帧"""
+        with self._lock:
+            self.position = 0
+
+
+@register_backend
+class SyntheticScrollBackend(CaptureBackend):
+    """在预渲染的长聊天记录图上滚动，模拟微信消息列表"""
+
+    name = "synthetic"
+    priority = -100
+    auto_select = False
+
+    def __init__(self, source: Optional[str] = None, step: int = 400,
+                 width: int = 800, messages: int = 300, seed: int = 0,
+                 advance_on_grab: bool = True, loop: bool = False):
+        """
+        Args:
+            source: 预渲染的长图路径，None 时按 seed 生成确定性的聊天记录
+            step: 每次滚动的像素数
+            width/messages/seed: 生成聊天记录的宽度、消息条数和随机种子
+            advance_on_grab: 每次 grab 后自动滚动一步；
+                             为 False 时需调用 scroll() 驱动（模拟真实滚动）
+            loop: 滚到底部后是否回到顶部（否则停在底部，触发重复检测）
+        """
+        if source:
+            image = cv2.imread(source, cv2.IMREAD_UNCHANGED)
+            if image is None:
+                raise ValueError(f"无法读取长图: {source}")
+            self.canvas = np.ascontiguousarray(_to_bgra(image))
+        else:
+            self.canvas = render_chat_transcript(width=width, messages=messages, seed=seed)
+
+        self.step = step
+        self.advance_on_grab = advance_on_grab
+        self.loop = loop
+        self.offset = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def is_available(cls) -> bool:
+        return True
+
+    def scroll(self, steps: int = 1):
+        """滚动若干步（负数向上）"""
+        with self._lock:
+            self._move(steps)
+
+    def _move(self, steps: int):
+        self.offset += steps * self.step
+        if self.offset < 0:
+            self.offset = 0
+
+    def grab(self, region: Region) -> np.ndarray:
+        width, height = region[2], region[3]
+        max_offset = max(0, self.canvas.shape[0] - height)
+
+        with self._lock:
+            if self.offset > max_offset:
+                self.offset = 0 if self.loop else max_offset
+            top = self.offset
+            if self.advance_on_grab:
+                self._move(1)
+
+        # 直接返回长图上的视图，不产生复制
+        return _fit_region(self.canvas[top:top + height], width, height)
+
+    def rewind(self):
+        """回到顶部"""
+        with self._lock:
+            self.offset = 0
+
+
+def render_chat_transcript(width: int = 800, messages: int = 300,
+                           seed: int = 0) -> np.ndarray:
+    """
+    渲染确定性的微信风格长聊天记录（BGRA）
+
+    左右交替的白色/绿色气泡、头像和时间分隔条，每条消息带唯一编号，
+    保证相邻截图之间既有大量重叠又能区分。
+    """
+    rng = np.random.default_rng(seed)
+    background = (245, 245, 245, 255)
+    bubble_colors = [(255, 255, 255, 255), (105, 236, 149, 255)]
+    line_height = 26
+    margin = 20
+    avatar = 40
+
+    # 先确定每条消息的行数，计算总高度
+    line_counts = rng.integers(1, 5, size=messages)
+    has_time_bar = rng.random(messages) < 0.15
+    total_height = int(sum(
+        n * line_height + 24 + margin + (36 if bar else 0)
+        for n, bar in zip(line_counts, has_time_bar)
+    )) + margin
+
+    canvas = np.empty((total_height, width, 4), dtype=np.uint8)
+    canvas[:] = background
+    words = ['hello', 'ok', 'meeting', 'tomorrow', 'file', 'price', 'contract',
+             'received', 'thanks', 'call', 'photo', 'address', 'sure', 'done']
+
+    y = margin
+    for index in range(messages):
+        if has_time_bar[index]:
+            label = f"{8 + index % 12:02d}:{index % 60:02d}"
+            cv2.putText(canvas, label, (width // 2 - 25, y + 20),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.45, (160, 160, 160, 255), 1)
+            y += 36
+
+        side = index % 2
+        lines = int(line_counts[index])
+        bubble_h = lines * line_height + 24
+        bubble_w = int(rng.integers(width // 4, width // 2 + width // 6))
+
+        if side == 0:
+            avatar_x = margin
+            bubble_x = margin + avatar + 12
+        else:
+            avatar_x = width - margin - avatar
+            bubble_x = avatar_x - 12 - bubble_w
+
+        avatar_color = tuple(int(c) for c in rng.integers(60, 220, size=3)) + (255,)
+        cv2.rectangle(canvas, (avatar_x, y), (avatar_x + avatar, y + avatar),
+                      avatar_color, -1)
+        cv2.rectangle(canvas, (bubble_x, y), (bubble_x + bubble_w, y + bubble_h),
+                      bubble_colors[side], -1)
+
+        for line in range(lines):
+            text = f"#{index} " + ' '.join(rng.choice(words, size=4))
+            cv2.putText(canvas, text, (bubble_x + 12, y + 12 + (line + 1) * line_height - 8),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, (30, 30, 30, 255), 1, cv2.LINE_AA)
+
+        y += bubble_h + margin
+
+    return canvas
+
+
+__all__ = [
+    'CaptureBackend',
+    'bgra_to_image',
+    'PyAutoGUIBackend',
+    'XShmBackend',
+    'ReplayBackend',
+    'SyntheticScrollBackend',
+    'render_chat_transcript',
+    'register_backend',
+    'available_backends',
+    'create_backend',
+    'get_capture_backend',
+    'set_capture_backend',
+]
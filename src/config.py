@@ -54,6 +54,7 @@ class AppConfig:
     default_save_dir: str = "微信聊天记录"
     image_format: str = "png"
     image_quality: int = 95
+    image_codec_preset: str = ""  # "fastest" / "raw" / "balanced" / "smallest"，为空时按 image_format 选择
     filename_pattern: str = "screenshot_{timestamp}_{count:04d}.{ext}"
     
     # 性能设置
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+编码进程池 - 通过共享内存把原始帧交给子进程做 PNG 编码
+版本: 3.0.8
+
+PNG 的 deflate 压缩（尤其是 optimize=True）是纯 CPU 工作，放在线程池里
+会被 GIL 串行化。这里用进程池并行编码：主进程只把像素拷贝进一块
+multiprocessing.shared_memory 共享内存，子进程按名称挂载后用指定的
+编码器（image_codecs）直接编码写盘，不对 PIL 图像做 pickle。
+每个工作进程的编码吞吐量单独统计。
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, Optional, Union
+
+import numpy as np
+from PIL import Image
+
+from frame import Frame
+from image_codecs import ImageCodec, PNGCodec
+
+try:
+    from multiprocessing import shared_memory
+    SHARED_MEMORY_AVAILABLE = True
+except ImportError:  # Python 3.7
+    shared_memory = None
+    SHARED_MEMORY_AVAILABLE = False
+
+
+@dataclass
+class EncodeResult:
+    """一次编码的结果"""
+    path: str
+    raw_bytes: int          # 原始像素字节数
+    encoded_bytes: int      # 输出文件字节数
+    encode_time: float      # 子进程内编码+写盘耗时（秒）
+    worker_pid: int
+
+
+def default_worker_count() -> int:
+    """按核心数确定工作进程数：保留一个核心给截图/界面线程"""
+    return max(1, min(8, (os.cpu_count() or 1) - 1))
+
+
+def _encode_worker(source, shape, mode: str, path: str, codec: ImageCodec) -> EncodeResult:
+    """子进程入口：挂载共享内存（或直接使用传入的字节）并编码写盘"""
+    start = time.perf_counter()
+    height, width = shape[:2]
+    shm = None
+    buffer = image = None
+    try:
+        if isinstance(source, str):
+            shm = shared_memory.SharedMemory(name=source)
+            buffer = shm.buf
+        else:
+            buffer = source
+
+        image = Image.frombuffer(mode, (width, height), buffer, 'raw', mode, 0, 1)
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        encoded_bytes = codec.save(image, path)
+    finally:
+        # 先释放对共享内存的全部引用，才能关闭映射
+        buffer = image = None
+        if shm is not None:
+            shm.close()
+
+    return EncodeResult(path, int(np.prod(shape)), encoded_bytes,
+                        time.perf_counter() - start, os.getpid())
+
+
+class EncoderPool:
+    """图像编码进程池"""
+
+    def __init__(self, max_workers: Optional[int] = None, codec: Optional[ImageCodec] = None):
+        """
+        Args:
+            max_workers: 工作进程数（默认按核心数）
+            codec: 默认编码器（默认 PNG 压缩级别 6）
+        """
+        self.max_workers = max_workers or default_worker_count()
+        self.codec = codec or PNGCodec()
+        self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.worker_stats: Dict[int, dict] = {}
+        self.totals = {'frames': 0, 'failed': 0, 'raw_bytes': 0, 'encoded_bytes': 0,
+                       'submit_time': 0.0}
+        self._started = time.perf_counter()
+
+    @staticmethod
+    def _to_array(image: Union[Image.Image, np.ndarray, Frame]):
+        """返回 (连续像素数组, PIL 模式)"""
+        if isinstance(image, Frame):
+            # Frame 的缓冲区直接拷入共享内存；BGR 顺序先转换为 PIL 可直接解释的格式
+            if image.pixel_format not in ('RGB', 'RGBA', 'L'):
+                image = image.convert('RGBA' if image.channels == 4 else 'RGB')
+            return image.array, image.mode
+        if isinstance(image, Image.Image):
+            if image.mode not in ('RGB', 'RGBA', 'L'):
+                image = image.convert('RGB')
+            return np.asarray(image), image.mode
+
+        arr = np.ascontiguousarray(image)
+        if arr.ndim == 2:
+            return arr, 'L'
+        return arr, {3: 'RGB', 4: 'RGBA'}[arr.shape[2]]
+
+    def submit(self, image: Union[Image.Image, np.ndarray, Frame], path: str,
+               codec: Optional[ImageCodec] = None) -> Future:
+        """
+        提交一帧编码任务，返回 Future[EncodeResult]
+
+        数组输入按通道数解释为 L / RGB / RGBA；codec 为空时使用默认编码器。
+        """
+        start = time.perf_counter()
+        arr, mode = self._to_array(image)
+        codec = codec or self.codec
+
+        shm = None
+        if SHARED_MEMORY_AVAILABLE:
+            shm = shared_memory.SharedMemory(create=True, size=max(1, arr.nbytes))
+            np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[...] = arr
+            source = shm.name
+        else:
+            source = arr.tobytes()
+
+        try:
+            future = self._executor.submit(_encode_worker, source, arr.shape, mode, path, codec)
+        except Exception:
+            if shm is not None:
+                shm.close()
+                shm.unlink()
+            raise
+
+        with self._lock:
+            self._pending += 1
+            self.totals['submit_time'] += time.perf_counter() - start
+        future.add_done_callback(lambda f: self._on_done(f, shm))
+        return future
+
+    def _on_done(self, future: Future, shm):
+        """编码完成：释放共享内存并记录统计"""
+        if shm is not None:
+            shm.close()
+            try:
+                shm.unlink()
+            except FileNotFoundError:
+                pass
+
+        with self._lock:
+            self._pending -= 1
+            if future.cancelled() or future.exception() is not None:
+                self.totals['failed'] += 1
+                return
+
+            result = future.result()
+            stats = self.worker_stats.setdefault(result.worker_pid, {
+                'frames': 0, 'raw_bytes': 0, 'encoded_bytes': 0, 'encode_time': 0.0
+            })
+            stats['frames'] += 1
+            stats['raw_bytes'] += result.raw_bytes
+            stats['encoded_bytes'] += result.encoded_bytes
+            stats['encode_time'] += result.encode_time
+
+            self.totals['frames'] += 1
+            self.totals['raw_bytes'] += result.raw_bytes
+            self.totals['encoded_bytes'] += result.encoded_bytes
+
+    @property
+    def pending(self) -> int:
+        """已提交但尚未完成的任务数"""
+        return self._pending
+
+    def get_stats(self) -> dict:
+        """编码统计：每个工作进程的帧数、编码吞吐量（原始 MB/s）和平均耗时"""
+        with self._lock:
+            workers = {}
+            for pid, stats in self.worker_stats.items():
+                busy = stats['encode_time']
+                workers[pid] = {
+                    'frames': stats['frames'],
+                    'avg_encode_ms': busy / stats['frames'] * 1000 if stats['frames'] else 0.0,
+                    'throughput_mb_s': stats['raw_bytes'] / busy / (1024**2) if busy > 0 else 0.0,
+                    'frames_per_s': stats['frames'] / busy if busy > 0 else 0.0,
+                    'compression_ratio': (stats['encoded_bytes'] / stats['raw_bytes']
+                                          if stats['raw_bytes'] else 0.0)
+                }
+
+            elapsed = time.perf_counter() - self._started
+            totals = dict(self.totals)
+            return {
+                'workers': self.max_workers,
+                'pending': self._pending,
+                'frames': totals['frames'],
+                'failed': totals['failed'],
+                'avg_submit_ms': (totals['submit_time'] / max(1, totals['frames'] + self._pending)
+                                  * 1000),
+                'overall_frames_per_s': totals['frames'] / elapsed if elapsed > 0 else 0.0,
+                'per_worker': workers
+            }
+
+    def shutdown(self, wait: bool = True):
+        """关闭进程池"""
+        self._executor.shutdown(wait=wait)
+
+
+__all__ = [
+    'SHARED_MEMORY_AVAILABLE',
+    'EncodeResult',
+    'EncoderPool',
+    'default_worker_count',
+]
@@ -11,11 +11,19 @@ import datetime
 import uuid
 import os
 from pathlib import Path
-from typing import Dict, List, Any, Optional
+from typing import Dict, Iterable, Any, Optional
+from cryptography.exceptions import InvalidSignature
 from cryptography.hazmat.primitives import hashes, serialization
 from cryptography.hazmat.primitives.asymmetric import rsa, padding
 from cryptography.hazmat.backends import default_backend
 
+from evidence_database import get_evidence_database
+from evidence_package import (PACKAGE_EXTENSION, EvidencePackageReader, hash_file,
+                              write_package)
+from report_aggregator import ReportAggregator, iter_storage
+from signing_service import (DEFAULT_KEY_PATH, MERKLE_ALGORITHM, SIGNATURE_DIR_NAME, SigningService,
+                             public_key_fingerprint)
+
 __version__ = "3.0.8"
 
 class ISO27037Compliance:
@@ -128,9 +136,16 @@ class GB29360Compliance:
             'evidence_presentation': True
         }
         
-    def create_forensic_report(self, evidence_packages: List[Dict[str, Any]]) -> Dict[str, Any]:
-        """创建符合GB/T 29360标准的司法鉴定报告"""
+    def create_forensic_report(self, evidence_packages: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        创建符合GB/T 29360标准的司法鉴定报告
+        
+        evidence_packages 为列表时报告附带完整证据清单；为迭代器（如 iter_storage）时
+        一遍扫描完成统计，报告只附清单摘要，内存占用与证据数量无关。
+        """
         report_id = f"RPT_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        aggregator = ReportAggregator().consume(evidence_packages)
+        stats = aggregator.finish()
         
         report = {
             'report_id': report_id,
@@ -146,63 +161,41 @@ class GB29360Compliance:
                 'investigator': os.getlogin()
             },
             'evidence_summary': {
-                'total_evidence_count': len(evidence_packages),
-                'evidence_types': self._analyze_evidence_types(evidence_packages),
-                'acquisition_period': self._get_acquisition_period(evidence_packages)
+                'total_evidence_count': aggregator.count,
+                'evidence_types': aggregator.evidence_types(),
+                'acquisition_period': aggregator.acquisition_period(),
+                'data_volume_bytes': aggregator.total_bytes
             },
             'technical_details': {
                 'acquisition_tools': f'智能滚动截图工具 v{__version__}',
                 'hash_algorithms': ['SHA-256'],
                 'verification_methods': ['数字签名', '哈希校验']
             },
-            'evidence_list': evidence_packages,
+            'evidence_inventory': stats['integrity'],
             'conclusion': {
-                'integrity_verified': True,
+                # 哈希/证据链要素齐全，不代表已重新计算哈希或验签（见 verify_storage）
+                'integrity_elements_complete': aggregator.elements_complete,
                 'authenticity_confirmed': True,
                 'legal_admissibility': True
             }
         }
+        if isinstance(evidence_packages, list):
+            report['evidence_list'] = evidence_packages
         
         return report
-        
-    def _analyze_evidence_types(self, evidence_packages: List[Dict[str, Any]]) -> List[str]:
-        """分析证据类型"""
-        types = set()
-        for package in evidence_packages:
-            if 'screenshot' in package.get('evidence_data', {}):
-                types.add('屏幕截图')
-            if 'video' in package.get('evidence_data', {}):
-                types.add('屏幕录制')
-            if 'text' in package.get('evidence_data', {}):
-                types.add('文字内容')
-        return list(types)
-        
-    def _get_acquisition_period(self, evidence_packages: List[Dict[str, Any]]) -> Dict[str, str]:
-        """获取取证时间段"""
-        if not evidence_packages:
-            return {'start': '', 'end': ''}
-            
-        timestamps = []
-        for package in evidence_packages:
-            timestamp = package.get('acquisition_metadata', {}).get('timestamp', '')
-            if timestamp:
-                timestamps.append(timestamp)
-                
-        if timestamps:
-            timestamps.sort()
-            return {
-                'start': timestamps[0],
-                'end': timestamps[-1]
-            }
-        return {'start': '', 'end': ''}
 
 class DigitalSignature:
     """数字签名管理"""
     
-    def __init__(self):
-        self.private_key = None
-        self.public_key = None
-        self._generate_key_pair()
+    def __init__(self, private_key=None):
+        """
+        Args:
+            private_key: 已载入的 RSA 私钥（如 SigningService 的持久化密钥），为 None 时临时生成
+        """
+        self.private_key = private_key
+        self.public_key = private_key.public_key() if private_key is not None else None
+        if private_key is None:
+            self._generate_key_pair()
         
     def _generate_key_pair(self):
         """生成RSA密钥对"""
@@ -251,12 +244,37 @@ class DigitalSignature:
 class EnhancedLegalCompliance:
     """增强法律合规管理器"""
     
-    def __init__(self):
+    def __init__(self, case_id: str = '', database=None,
+                 key_path: str = DEFAULT_KEY_PATH, signature_batch_size: int = 64,
+                 package_format: str = "binary", trusted_fingerprints=()):
+        """
+        Args:
+            case_id: 默认案件ID（截图元数据中的 case_id 优先）
+            database: EvidenceDatabase（默认使用共享的 evidence_database.db，False 表示不写数据库）
+            key_path: 持久化签名私钥路径（不要放在证据目录中）
+            signature_batch_size: 每批签名的证据数（Merkle 树叶子数）
+            package_format: 'binary' 保存为 .evp 证据包（JSON 头 + 原始截图字节），
+                            'json' 保存为旧格式（截图字节十六进制编码进 JSON，体积翻倍）
+            trusted_fingerprints: 除当前签名密钥外，校验时还信任的公钥指纹（如轮换前的旧密钥）
+        """
+        if package_format not in ('binary', 'json'):
+            raise ValueError(f"未知的证据包格式: {package_format}")
+        self.package_format = package_format
         self.iso27037 = ISO27037Compliance()
         self.gb29360 = GB29360Compliance()
-        self.digital_signature = DigitalSignature()
         self.evidence_storage_path = Path("evidence_storage")
         self.evidence_storage_path.mkdir(exist_ok=True)
+        self.case_id = case_id
+        if database is None:
+            database = get_evidence_database()
+        self.database = database or None
+        
+        # 密钥只载入一次；证据按批构建 Merkle 树，每批只对根签名一次
+        self.signing = SigningService(key_path, str(self.evidence_storage_path / SIGNATURE_DIR_NAME),
+                                      batch_size=signature_batch_size,
+                                      trusted_fingerprints=trusted_fingerprints)
+        self.signing.add_listener(self._on_batch_signed)
+        self.digital_signature = DigitalSignature(self.signing.private_key)
         
     def process_screenshot_evidence(self, screenshot_data: bytes, metadata: Dict[str, Any]) -> Dict[str, Any]:
         """处理截图证据"""
@@ -271,21 +289,65 @@ class EnhancedLegalCompliance:
         # 创建ISO 27037证据包
         iso_package = self.iso27037.create_evidence_package(evidence_data)
         
-        # 添加数字签名
-        signature = self.digital_signature.sign_data(screenshot_data)
-        iso_package['digital_signature'] = {
-            'signature': signature.hex(),
-            'public_key': self.digital_signature.export_public_key().decode('utf-8'),
-            'algorithm': 'RSA-PSS-SHA256'
-        }
+        # 加入签名批次：包内只记录批次号、叶子序号和叶子摘要，
+        # 根签名、公钥和包含证明在批次签名文件中（满批或 flush_signatures 时写出）
+        iso_package['digital_signature'] = self.signing.add(
+            iso_package['evidence_id'], iso_package['integrity_verification']['content_hash'])
         
         # 保存证据
         self._save_evidence(iso_package)
         
         return iso_package
         
-    def generate_legal_report(self, evidence_packages: List[Dict[str, Any]], case_info: Dict[str, str] = None) -> Dict[str, Any]:
-        """生成法律证据报告"""
+    def process_screenshot_file(self, file_path: str, metadata: Dict[str, Any],
+                                content_hash: Optional[str] = None) -> Dict[str, Any]:
+        """
+        处理已保存的截图文件：证据包按内容哈希引用该文件，不复制截图字节
+        
+        Args:
+            content_hash: 文件的 SHA-256（如 HashedFile.sha256；为 None 时流式计算）
+        """
+        if content_hash is None:
+            content_hash, size = hash_file(file_path)
+        else:
+            size = os.path.getsize(file_path)
+        evidence_data = {
+            'type': 'screenshot',
+            'metadata': metadata,
+            'size': size,
+            'content_file': str(file_path)
+        }
+        iso_package = self.iso27037.create_evidence_package(evidence_data)
+        # 内容哈希取截图文件本身的 SHA-256（create_evidence_package 对非字节内容哈希的是元数据）
+        iso_package['integrity_verification']['content_hash'] = content_hash
+        iso_package['digital_signature'] = self.signing.add(iso_package['evidence_id'], content_hash)
+        self._save_evidence(iso_package, reference=str(file_path))
+        return iso_package
+        
+    def flush_signatures(self):
+        """立即签名当前未满的批次"""
+        return self.signing.flush()
+        
+    def close(self):
+        """签名剩余的证据并停止签名服务的后台线程（所有者关闭时调用）"""
+        self.signing.close()
+        
+    def _on_batch_signed(self, batch):
+        if self.database is not None:
+            self.database.log_audit(batch.batch_id, 'SIGN_BATCH',
+                                    details=f"root={batch.root} leaves={batch.leaf_count}")
+        
+    def generate_legal_report(self, evidence_packages: Optional[Iterable[Dict[str, Any]]] = None,
+                              case_info: Dict[str, str] = None) -> Dict[str, Any]:
+        """
+        生成法律证据报告
+        
+        Args:
+            evidence_packages: 证据包列表或迭代器（为 None 时逐个读取证据存储目录中的证据包头）
+        """
+        self.flush_signatures()
+        if evidence_packages is None:
+            evidence_packages = iter_storage(str(self.evidence_storage_path))
         # 创建GB/T 29360报告
         report = self.gb29360.create_forensic_report(evidence_packages)
         
@@ -295,19 +357,47 @@ class EnhancedLegalCompliance:
             
         # 保存报告
         self._save_report(report)
+        if self.database is not None:
+            self.database.log_audit(report['report_id'], 'REPORT',
+                                    details=f"{report['evidence_summary']['total_evidence_count']} evidence packages")
         
         return report
         
-    def _save_evidence(self, evidence_package: Dict[str, Any]):
-        """保存证据到本地存储"""
+    def _save_evidence(self, evidence_package: Dict[str, Any], reference: Optional[str] = None):
+        """
+        保存证据到本地存储
+        
+        二进制格式: 元数据写入 .evp 头，截图字节作为原始载荷流式写入（或按哈希引用外部文件）；
+        JSON 格式: 截图字节十六进制编码（旧格式）。
+        """
         evidence_id = evidence_package['evidence_id']
-        file_path = self.evidence_storage_path / f"{evidence_id}.json"
+        evidence_data = dict(evidence_package.get('evidence_data', {}))
+        content = evidence_data.pop('content', None)
+        header = self._make_serializable(dict(evidence_package, evidence_data=evidence_data))
         
-        # 序列化时处理bytes类型
-        serializable_package = self._make_serializable(evidence_package)
+        if self.package_format == 'binary':
+            file_path = self.evidence_storage_path / f"{evidence_id}{PACKAGE_EXTENSION}"
+            content_hash = evidence_package['integrity_verification']['content_hash']
+            if reference is not None:
+                write_package(str(file_path), header, reference=reference, payload_sha256=content_hash)
+            else:
+                write_package(str(file_path), header, payload=content, payload_sha256=content_hash)
+        else:
+            file_path = self.evidence_storage_path / f"{evidence_id}.json"
+            # 序列化时处理bytes类型
+            serializable_package = self._make_serializable(evidence_package)
+            with open(file_path, 'w', encoding='utf-8') as f:
+                json.dump(serializable_package, f, ensure_ascii=False, indent=2)
         
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(serializable_package, f, ensure_ascii=False, indent=2)
+        if self.database is not None:
+            # 数据库只存元数据和哈希，截图内容留在证据文件中，避免库体积随截图膨胀
+            record = dict(header)
+            evidence_data = dict(record.get('evidence_data', {}))
+            evidence_data['content_file'] = str(file_path)
+            record['evidence_data'] = evidence_data
+            metadata = evidence_data.get('metadata') or {}
+            case_id = metadata.get('case_id') or self.case_id
+            self.database.store_evidence(evidence_id, case_id, record)
             
     def _save_report(self, report: Dict[str, Any]):
         """保存报告到本地存储"""
@@ -329,23 +419,92 @@ class EnhancedLegalCompliance:
             return obj
             
     def verify_evidence_integrity(self, evidence_package: Dict[str, Any]) -> bool:
-        """验证证据完整性"""
+        """验证证据完整性（内存中的证据包，content 为字节或十六进制字符串）"""
         try:
             # 验证哈希
-            content = bytes.fromhex(evidence_package['evidence_data']['content'])
-            expected_hash = evidence_package['integrity_verification']['content_hash']
+            content = evidence_package['evidence_data']['content']
+            if not isinstance(content, bytes):
+                content = bytes.fromhex(content)
             actual_hash = self.iso27037.calculate_hash(content)
+            return self._verify_signed_hash(evidence_package, actual_hash, lambda: content)
             
-            if expected_hash != actual_hash:
-                return False
-                
-            # 验证数字签名
-            signature = bytes.fromhex(evidence_package['digital_signature']['signature'])
-            return self.digital_signature.verify_signature(content, signature)
+        except Exception as e:
+            print(f"证据完整性验证失败: {e}")
+            return False
             
+    def verify_package_file(self, file_path: str) -> bool:
+        """验证 .evp 证据包文件（载荷或被引用的截图按块流式哈希，不整体载入）"""
+        try:
+            with EvidencePackageReader(file_path) as reader:
+                actual_hash, size = reader.payload_digest()
+                package = reader.header
+                if size != reader.payload_info['size'] or actual_hash != reader.payload_info['sha256']:
+                    self._audit_verification(package, False, 'payload hash mismatch')
+                    return False
+                return self._verify_signed_hash(package, actual_hash, reader.read_payload)
         except Exception as e:
             print(f"证据完整性验证失败: {e}")
             return False
+            
+    def _verify_signed_hash(self, evidence_package: Dict[str, Any], actual_hash: str,
+                            load_content) -> bool:
+        """核对内容哈希并验证签名（仅旧格式的逐包签名需要载入内容）"""
+        expected_hash = evidence_package['integrity_verification']['content_hash']
+        if expected_hash != actual_hash:
+            self._audit_verification(evidence_package, False, 'content hash mismatch')
+            return False
+            
+        # 验证数字签名
+        signature_info = evidence_package['digital_signature']
+        if signature_info.get('algorithm') == MERKLE_ALGORITHM:
+            # 批次签名：叶子摘要 + 包含证明 + 根签名
+            self.flush_signatures()
+            valid = self.signing.verify_reference(signature_info, evidence_package['evidence_id'],
+                                                  actual_hash)
+        else:
+            # 旧格式逐包签名：包内公钥须为可信密钥，不能拿包自带的公钥自证
+            public_key = serialization.load_pem_public_key(
+                signature_info['public_key'].encode('utf-8'), backend=default_backend())
+            if public_key_fingerprint(public_key) not in self.signing.trusted_fingerprints:
+                self._audit_verification(evidence_package, False, 'untrusted signing key')
+                return False
+            try:
+                public_key.verify(
+                    bytes.fromhex(signature_info['signature']),
+                    load_content(),
+                    padding.PSS(mgf=padding.MGF1(hashes.SHA256()), salt_length=padding.PSS.MAX_LENGTH),
+                    hashes.SHA256()
+                )
+                valid = True
+            except InvalidSignature:
+                valid = False
+        self._audit_verification(evidence_package, valid,
+                                 'verified' if valid else 'signature invalid')
+        return valid
+
+    def verify_storage(self, workers: Optional[int] = None, resume: bool = True):
+        """
+        并行复核整个证据存储目录（只信任本实例的签名公钥，支持断点续验）
+        
+        Returns:
+            VerificationSummary
+        """
+        from evidence_verifier import EvidenceVerifier
+        self.flush_signatures()
+        verifier = EvidenceVerifier(workers=workers,
+                                    trusted_fingerprints=self.signing.trusted_fingerprints)
+        summary = verifier.verify(str(self.evidence_storage_path), resume)
+        if self.database is not None:
+            self.database.log_audit(None, 'VERIFY_STORAGE' if summary.passed else 'VERIFY_STORAGE_FAILED',
+                                    details=f"{summary.valid}/{summary.total} valid, "
+                                            f"{summary.invalid} invalid, {summary.errors} errors")
+        return summary
+        
+    def _audit_verification(self, evidence_package: Dict[str, Any], valid: bool, details: str):
+        """记录完整性验证结果到审计日志"""
+        if self.database is not None:
+            self.database.log_audit(evidence_package.get('evidence_id'),
+                                    'VERIFY' if valid else 'VERIFY_FAILED', details=details)
 
 # 使用示例
 if __name__ == "__main__":
@@ -375,4 +534,6 @@ if __name__ == "__main__":
     
     # 验证证据完整性
     is_valid = compliance.verify_evidence_integrity(evidence)
-    print(f"✅ 证据完整性验证: {'通过' if is_valid else '失败'}")
\ No newline at end of file
+    print(f"✅ 证据完整性验证: {'通过' if is_valid else '失败'}")
+    
+    compliance.close()
\ No newline at end of file
@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+证据数据库 - evidence_database.db 的 SQLite 持久化层
+版本: 3.0.8
+
+证据原来只保存在内存列表和逐条 JSON 文件里，案件记录多了以后无法
+查询。EvidenceDatabase 把证据写入 evidence_records / audit_log 两张表
+（与仓库自带的 evidence_database.db 结构相同）:
+
+    - WAL 模式，synchronous=NORMAL：读写互不阻塞，每批提交一次
+    - 所有写操作进入队列，由单独的写线程按批取出，同一条 SQL 合并为
+      一次 executemany，一批一个事务；调用方不等待磁盘
+    - case_id / created_at / evidence_id 建有索引，审计日志按 (evidence_id, timestamp)
+      复合索引，按案件、时间查询和按编号查找都不需要全表扫描；读取用游标分批
+      返回，不一次载入
+
+读操作使用每个线程各自的只读连接，读之前会等待此前提交的写入落盘（写线程
+已退出时抛出异常，超时后不再等待）。get_evidence_database 返回的共享实例在
+进程退出时自动 close，队列中的写操作不会丢失。
+"""
+
+import atexit
+import getpass
+import json
+import queue
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+
+DEFAULT_DB_PATH = "evidence_database.db"
+
+# 读操作等待写入落盘的默认最长时间（秒）
+DEFAULT_FLUSH_TIMEOUT = 30.0
+
+_SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS evidence_records (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                evidence_id TEXT UNIQUE NOT NULL,
+                case_id TEXT NOT NULL,
+                evidence_data TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )""",
+    """CREATE TABLE IF NOT EXISTS audit_log (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                evidence_id TEXT,
+                operation TEXT,
+                operator TEXT,
+                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                details TEXT
+            )""",
+    # evidence_id 的唯一约束自带索引；按案件查询时同时按时间排序
+    "CREATE INDEX IF NOT EXISTS idx_evidence_case_created ON evidence_records (case_id, created_at)",
+    "CREATE INDEX IF NOT EXISTS idx_evidence_created ON evidence_records (created_at)",
+    # 一条证据的审计日志按时间顺序读取；复合索引同时覆盖按编号查找（替代旧的单列索引）
+    "DROP INDEX IF EXISTS idx_audit_evidence",
+    "CREATE INDEX IF NOT EXISTS idx_audit_evidence_time ON audit_log (evidence_id, timestamp)",
+    "CREATE INDEX IF NOT EXISTS idx_audit_timestamp ON audit_log (timestamp)",
+)
+
+# SQLite 3.24 起支持 UPSERT；更早的版本先 INSERT OR IGNORE 再 UPDATE
+if sqlite3.sqlite_version_info >= (3, 24, 0):
+    _STORE_SQL = (
+        "INSERT INTO evidence_records (evidence_id, case_id, evidence_data) VALUES (?, ?, ?) "
+        "ON CONFLICT(evidence_id) DO UPDATE SET case_id = excluded.case_id, "
+        "evidence_data = excluded.evidence_data, updated_at = CURRENT_TIMESTAMP",
+    )
+else:
+    _STORE_SQL = (
+        "INSERT OR IGNORE INTO evidence_records (evidence_id, case_id, evidence_data) VALUES (?, ?, ?)",
+        "UPDATE evidence_records SET case_id = ?2, evidence_data = ?3, updated_at = CURRENT_TIMESTAMP "
+        "WHERE evidence_id = ?1 AND evidence_data != ?3",
+    )
+
+_AUDIT_SQL = "INSERT INTO audit_log (evidence_id, operation, operator, details) VALUES (?, ?, ?, ?)"
+
+
+def _default_operator() -> str:
+    try:
+        return getpass.getuser()
+    except Exception:
+        return 'unknown'
+
+
+class EvidenceDatabase:
+    """证据数据库（单写线程 + 批量提交，线程安全）"""
+
+    def __init__(self, path: str = DEFAULT_DB_PATH, batch_size: int = 500,
+                 flush_interval: float = 0.2, operator: Optional[str] = None):
+        """
+        Args:
+            path: 数据库文件路径
+            batch_size: 每个事务最多合并的写操作数
+            flush_interval: 写线程凑批的最长等待时间（秒）
+            operator: 审计日志默认操作人（默认当前系统用户）
+        """
+        self.path = str(path)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.operator = operator or _default_operator()
+
+        self._queue: "queue.Queue[Optional[tuple]]" = queue.Queue()
+        self._local = threading.local()
+        self._closed = False
+        self.stats = {
+            'records_written': 0,
+            'audit_written': 0,
+            'batches': 0,
+            'errors': 0,
+            'write_time': 0.0
+        }
+
+        # 建表在调用线程完成，结构错误能直接抛给调用方
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        with conn:
+            for statement in _SCHEMA:
+                conn.execute(statement)
+        conn.close()
+
+        self._writer = threading.Thread(target=self._write_loop, name='evidence-db-writer',
+                                        daemon=True)
+        self._writer.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    # ---------- 写入（异步） ----------
+
+    def store_evidence(self, evidence_id: str, case_id: str, evidence_data: Dict[str, Any],
+                       operator: Optional[str] = None, details: str = 'Evidence stored successfully'):
+        """写入（或更新）一条证据，并记一条 STORE 审计日志"""
+        data = json.dumps(evidence_data, ensure_ascii=False, default=str)
+        self._put('store', (evidence_id, case_id or '', data))
+        self.log_audit(evidence_id, 'STORE', operator, details)
+
+    def log_audit(self, evidence_id: Optional[str], operation: str,
+                  operator: Optional[str] = None, details: str = ''):
+        """追加一条审计日志"""
+        self._put('audit', (evidence_id, operation, operator or self.operator, details))
+
+    def _put(self, kind: str, params: tuple):
+        if self._closed:
+            raise RuntimeError("证据数据库已关闭")
+        self._check_writer()
+        self._queue.put((kind, params))
+
+    def _check_writer(self):
+        if not self._writer.is_alive():
+            raise RuntimeError("证据数据库写线程已退出，写操作无法落盘")
+
+    def flush(self, timeout: Optional[float] = DEFAULT_FLUSH_TIMEOUT) -> bool:
+        """
+        等待此前提交的写操作全部落盘
+
+        Returns:
+            是否在 timeout 秒内完成（None 表示一直等待；写线程退出时抛出 RuntimeError）
+        """
+        if self._closed:
+            return True
+        self._check_writer()
+        done = threading.Event()
+        self._queue.put(('flush', done))
+        deadline = None if timeout is None else time.time() + timeout
+        # 分段等待，期间写线程意外退出时不会一直阻塞
+        while not done.wait(0.5 if deadline is None else max(0.0, min(0.5, deadline - time.time()))):
+            self._check_writer()
+            if deadline is not None and time.time() >= deadline:
+                print(f"⚠️ 证据数据库写入 {timeout:.0f} 秒内未落盘，积压 {self._queue.qsize()} 项")
+                return False
+        return True
+
+    def _write_loop(self):
+        """写线程：凑批，同类 SQL 合并 executemany，一批一个事务"""
+        conn = self._connect()
+        running = True
+        while running:
+            item = self._queue.get()
+            batch = [item]
+            deadline = time.time() + self.flush_interval
+            # 凑批：已有积压时立即取走，否则最多等待 flush_interval
+            while item is not None and item[0] != 'flush' and len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.time()))
+                except queue.Empty:
+                    break
+                batch.append(item)
+
+            waiters = [params for kind, params in
+                       (entry for entry in batch if entry is not None) if kind == 'flush']
+            operations = [entry for entry in batch if entry is not None and entry[0] != 'flush']
+            running = batch[-1] is not None
+
+            if operations:
+                self._commit(conn, operations)
+            for done in waiters:
+                done.set()
+
+        conn.execute("PRAGMA optimize")
+        conn.close()
+
+    def _commit(self, conn: sqlite3.Connection, operations: List[tuple]):
+        """把一批写操作作为一个事务提交（失败时逐条重试，坏记录不拖累整批）"""
+        start = time.time()
+        try:
+            with conn:
+                self._execute(conn, operations)
+        except sqlite3.Error as e:
+            print(f"⚠️ 证据数据库批量写入失败，逐条重试: {e}")
+            for operation in operations:
+                try:
+                    with conn:
+                        self._execute(conn, [operation])
+                except sqlite3.Error as e:
+                    self.stats['errors'] += 1
+                    print(f"❌ 证据数据库写入失败 {operation[1][0]}: {e}")
+        self.stats['batches'] += 1
+        self.stats['write_time'] += time.time() - start
+
+    def _execute(self, conn: sqlite3.Connection, operations: List[tuple]):
+        """
+        按类型分组，每类一次 executemany
+
+        store_evidence 总是先排一条 store 再排一条 audit，按相邻合并时每批只有一行；
+        证据与审计之间的先后不影响结果，同类操作内部仍保持写入顺序。
+        """
+        stores = [params for kind, params in operations if kind == 'store']
+        audits = [params for kind, params in operations if kind != 'store']
+        if stores:
+            for sql in _STORE_SQL:
+                conn.executemany(sql, stores)
+            self.stats['records_written'] += len(stores)
+        if audits:
+            conn.executemany(_AUDIT_SQL, audits)
+            self.stats['audit_written'] += len(audits)
+
+    # ---------- 查询 ----------
+
+    def _reader(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA query_only=ON")
+            self._local.conn = conn
+        return conn
+
+    def get_evidence(self, evidence_id: str) -> Optional[Dict[str, Any]]:
+        """按编号取一条证据（走唯一索引）"""
+        self.flush()
+        row = self._reader().execute(
+            "SELECT evidence_data FROM evidence_records WHERE evidence_id = ?", (evidence_id,)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def iter_case(self, case_id: str, start: Optional[str] = None, end: Optional[str] = None,
+                  batch: int = 1000) -> Iterator[Tuple[str, str, Dict[str, Any]]]:
+        """
+        按写入时间顺序分批读取一个案件的证据
+
+        Args:
+            start/end: created_at 范围（'YYYY-MM-DD HH:MM:SS'，UTC，含两端）
+
+        Yields:
+            (evidence_id, created_at, evidence_data)
+        """
+        self.flush()
+        sql = "SELECT evidence_id, created_at, evidence_data FROM evidence_records WHERE case_id = ?"
+        params: list = [case_id]
+        if start:
+            sql += " AND created_at >= ?"
+            params.append(start)
+        if end:
+            sql += " AND created_at <= ?"
+            params.append(end)
+        cursor = self._reader().execute(sql + " ORDER BY created_at, id", params)
+        while True:
+            rows = cursor.fetchmany(batch)
+            if not rows:
+                break
+            for evidence_id, created_at, data in rows:
+                yield evidence_id, created_at, json.loads(data)
+
+    def count(self, case_id: Optional[str] = None) -> int:
+        """证据条数（可按案件）"""
+        self.flush()
+        if case_id is None:
+            return self._reader().execute("SELECT COUNT(*) FROM evidence_records").fetchone()[0]
+        return self._reader().execute(
+            "SELECT COUNT(*) FROM evidence_records WHERE case_id = ?", (case_id,)
+        ).fetchone()[0]
+
+    def list_cases(self) -> List[Tuple[str, int, str, str]]:
+        """所有案件: (case_id, 证据数, 最早写入时间, 最晚写入时间)"""
+        self.flush()
+        return self._reader().execute(
+            "SELECT case_id, COUNT(*), MIN(created_at), MAX(created_at) "
+            "FROM evidence_records GROUP BY case_id ORDER BY MIN(created_at)"
+        ).fetchall()
+
+    def get_audit_log(self, evidence_id: str) -> List[Dict[str, Any]]:
+        """一条证据的审计日志（按时间顺序）"""
+        self.flush()
+        rows = self._reader().execute(
+            "SELECT operation, operator, timestamp, details FROM audit_log "
+            "WHERE evidence_id = ? ORDER BY timestamp, id", (evidence_id,)
+        ).fetchall()
+        return [{'operation': op, 'operator': who, 'timestamp': ts, 'details': details}
+                for op, who, ts, details in rows]
+
+    def get_stats(self) -> dict:
+        stats = dict(self.stats)
+        stats['pending'] = self._queue.qsize()
+        return stats
+
+    def close(self, timeout: float = 10.0):
+        """写完队列中的操作后关闭"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._writer.join(timeout)
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+_databases: Dict[str, EvidenceDatabase] = {}
+_databases_lock = threading.Lock()
+
+
+def get_evidence_database(path: str = DEFAULT_DB_PATH) -> EvidenceDatabase:
+    """获取进程共享的证据数据库（同一路径只开一个写线程，进程退出时自动关闭）"""
+    with _databases_lock:
+        database = _databases.get(path)
+        if database is None or database._closed:
+            database = _databases[path] = EvidenceDatabase(path)
+        return database
+
+
+@atexit.register
+def _close_databases():
+    """进程退出时写完共享数据库的队列（写线程是守护线程，不关闭会丢掉积压的写操作）"""
+    with _databases_lock:
+        databases = list(_databases.values())
+        _databases.clear()
+    for database in databases:
+        database.close()
+
+
+__all__ = [
+    'DEFAULT_DB_PATH',
+    'DEFAULT_FLUSH_TIMEOUT',
+    'EvidenceDatabase',
+    'get_evidence_database',
+]
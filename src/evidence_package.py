@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+二进制证据包 - JSON 头 + 原始载荷（或按内容哈希引用外部截图）
+版本: 3.0.8
+
+原来的证据包把截图原始字节十六进制编码后放进 JSON，文件大小翻倍，
+校验时还要把整段十六进制 bytes.fromhex 回来。.evp 证据包的结构:
+
+    偏移 0   b'EVPK'                魔数
+    偏移 4   版本（1 字节）+ 3 字节保留
+    偏移 8   头长度（4 字节，大端）
+    偏移 12  头（UTF-8 JSON：证据包元数据 + payload 描述）
+    其后     载荷原始字节（payload.encoding == 'raw' 时）
+
+payload 描述:
+    {"encoding": "raw", "size": n, "sha256": "..."}              载荷在包内
+    {"encoding": "reference", "size": n, "sha256": "...", "path": "..."}
+                                                                  引用外部截图文件
+
+读写都按块流式进行：写入时边写边算 SHA-256 并与头中声明的摘要核对，
+校验时直接对载荷（或被引用的文件）做一遍流式哈希。
+"""
+
+import hashlib
+import json
+import os
+import struct
+from typing import BinaryIO, Iterator, Optional, Union
+
+PACKAGE_MAGIC = b'EVPK'
+PACKAGE_VERSION = 1
+PACKAGE_EXTENSION = '.evp'
+
+# 魔数 + 版本 + 保留 + 头长度
+_PREAMBLE = struct.Struct('>4sB3xI')
+_CHUNK_SIZE = 1024 * 1024
+
+PayloadSource = Union[bytes, bytearray, memoryview, BinaryIO, str, os.PathLike]
+
+
+def hash_file(path: str) -> tuple:
+    """流式计算文件 SHA-256，返回 (摘要, 字节数)"""
+    hasher = hashlib.sha256()
+    size = 0
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(_CHUNK_SIZE), b''):
+            hasher.update(chunk)
+            size += len(chunk)
+    return hasher.hexdigest(), size
+
+
+def is_package_file(path: str) -> bool:
+    """按魔数判断是否为 .evp 证据包"""
+    try:
+        with open(path, 'rb') as f:
+            return f.read(4) == PACKAGE_MAGIC
+    except OSError:
+        return False
+
+
+def _iter_source(source: PayloadSource) -> Iterator[memoryview]:
+    """按块读取载荷来源（字节串不复制，文件对象/路径按块读取）"""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        view = memoryview(source).cast('B')
+        for start in range(0, len(view), _CHUNK_SIZE):
+            yield view[start:start + _CHUNK_SIZE]
+        return
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as f:
+            yield from _iter_source(f)
+        return
+    for chunk in iter(lambda: source.read(_CHUNK_SIZE), b''):
+        yield memoryview(chunk)
+
+
+def write_package(path: str, header: dict, payload: Optional[PayloadSource] = None,
+                  payload_sha256: Optional[str] = None, reference: Optional[str] = None,
+                  fsync: bool = True) -> dict:
+    """
+    写入 .evp 证据包（先写临时文件，完成后原子替换）
+
+    Args:
+        path: 输出路径
+        header: 证据包元数据（可 JSON 序列化，不含截图字节）
+        payload: 载荷（字节串、二进制文件对象或文件路径），与 reference 二选一
+        payload_sha256: 载荷的 SHA-256（已知时传入；写入时会核对）
+        reference: 被引用的外部截图路径（包内不含载荷）
+        fsync: 替换前是否 fsync
+
+    Returns:
+        写入的 payload 描述
+    """
+    if (payload is None) == (reference is None):
+        raise ValueError("payload 与 reference 必须且只能指定一个")
+
+    if reference is not None:
+        digest, size = hash_file(reference)
+        if payload_sha256 and payload_sha256 != digest:
+            raise ValueError(f"被引用文件的 SHA-256 与声明不符: {reference}")
+        # 引用路径相对证据包所在目录保存，证据目录整体拷贝后依然有效
+        base = os.path.dirname(os.path.abspath(path))
+        descriptor = {'encoding': 'reference', 'size': size, 'sha256': digest,
+                      'path': os.path.relpath(os.path.abspath(reference), base)}
+    else:
+        if isinstance(payload, (bytes, bytearray, memoryview)):
+            size = memoryview(payload).nbytes
+            payload_sha256 = payload_sha256 or hashlib.sha256(payload).hexdigest()
+        elif isinstance(payload, (str, os.PathLike)):
+            if not payload_sha256:
+                payload_sha256, size = hash_file(payload)
+            else:
+                size = os.path.getsize(payload)
+        else:
+            if not payload_sha256:
+                raise ValueError("文件对象载荷需要提供 payload_sha256")
+            size = None
+        descriptor = {'encoding': 'raw', 'size': size, 'sha256': payload_sha256}
+
+    temp_path = path + '.tmp'
+    try:
+        with open(temp_path, 'wb') as f:
+            # 文件对象载荷大小未知时先写占位头，写完后回填
+            header_bytes = _encode_header(header, descriptor)
+            f.write(_PREAMBLE.pack(PACKAGE_MAGIC, PACKAGE_VERSION, len(header_bytes)))
+            f.write(header_bytes)
+            if payload is not None:
+                hasher = hashlib.sha256()
+                written = 0
+                for chunk in _iter_source(payload):
+                    hasher.update(chunk)
+                    f.write(chunk)
+                    written += len(chunk)
+                if hasher.hexdigest() != descriptor['sha256']:
+                    raise ValueError("载荷 SHA-256 与声明不符")
+                if descriptor['size'] is None:
+                    descriptor['size'] = written
+                    patched = _encode_header(header, descriptor)
+                    if len(patched) > len(header_bytes):
+                        raise ValueError("载荷大小回填后头长度溢出")
+                    f.seek(_PREAMBLE.size)
+                    f.write(patched.ljust(len(header_bytes)))
+                elif written != descriptor['size']:
+                    raise ValueError("载荷长度与声明不符")
+            f.flush()
+            if fsync:
+                os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return descriptor
+
+
+def _encode_header(header: dict, descriptor: dict) -> bytes:
+    document = dict(header)
+    document['payload'] = dict(descriptor)
+    if document['payload'].get('size') is None:
+        # 预留足够的位数，回填真实大小后头长度不变（不足部分以空格补齐，JSON 允许）
+        document['payload']['size'] = 10 ** 15
+    return json.dumps(document, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+class EvidencePackageReader:
+    """.evp 证据包读取器（载荷按块流式读取）"""
+
+    def __init__(self, path: str):
+        self.path = str(path)
+        self._file = open(self.path, 'rb')
+        try:
+            magic, version, header_length = _PREAMBLE.unpack(self._file.read(_PREAMBLE.size))
+            if magic != PACKAGE_MAGIC:
+                raise ValueError(f"不是证据包文件: {self.path}")
+            if version > PACKAGE_VERSION:
+                raise ValueError(f"不支持的证据包版本: {version}")
+            self.version = version
+            self.header = json.loads(self._file.read(header_length))
+            self.payload_offset = _PREAMBLE.size + header_length
+        except Exception:
+            self._file.close()
+            raise
+
+    @property
+    def payload_info(self) -> dict:
+        return self.header['payload']
+
+    @property
+    def is_reference(self) -> bool:
+        return self.payload_info['encoding'] == 'reference'
+
+    def reference_path(self) -> str:
+        """被引用文件的绝对路径（相对证据包所在目录解析）"""
+        path = self.payload_info['path']
+        if os.path.isabs(path):
+            return path
+        return os.path.join(os.path.dirname(os.path.abspath(self.path)), path)
+
+    def iter_payload(self, chunk_size: int = _CHUNK_SIZE) -> Iterator[bytes]:
+        """按块读取载荷（引用型证据包读取被引用的文件）"""
+        if self.is_reference:
+            with open(self.reference_path(), 'rb') as f:
+                yield from iter(lambda: f.read(chunk_size), b'')
+            return
+        remaining = self.payload_info['size']
+        self._file.seek(self.payload_offset)
+        while remaining > 0:
+            chunk = self._file.read(min(chunk_size, remaining))
+            if not chunk:
+                raise ValueError(f"证据包载荷被截断: {self.path}")
+            remaining -= len(chunk)
+            yield chunk
+
+    def read_payload(self) -> bytes:
+        """一次性读取全部载荷"""
+        return b''.join(self.iter_payload())
+
+    def payload_digest(self) -> tuple:
+        """流式计算载荷 SHA-256，返回 (摘要, 字节数)"""
+        hasher = hashlib.sha256()
+        size = 0
+        for chunk in self.iter_payload():
+            hasher.update(chunk)
+            size += len(chunk)
+        return hasher.hexdigest(), size
+
+    def verify_payload(self) -> bool:
+        """载荷（或被引用文件）的 SHA-256 和长度是否与头中声明一致"""
+        try:
+            digest, size = self.payload_digest()
+        except (OSError, ValueError):
+            return False
+        return digest == self.payload_info['sha256'] and size == self.payload_info['size']
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+def read_package(path: str, with_payload: bool = False) -> dict:
+    """读取证据包头（with_payload 为 True 时把载荷放回 evidence_data['content']）"""
+    with EvidencePackageReader(path) as reader:
+        package = dict(reader.header)
+        if with_payload:
+            evidence_data = dict(package.get('evidence_data') or {})
+            evidence_data['content'] = reader.read_payload()
+            package['evidence_data'] = evidence_data
+        return package
+
+
+__all__ = [
+    'PACKAGE_MAGIC',
+    'PACKAGE_VERSION',
+    'PACKAGE_EXTENSION',
+    'EvidencePackageReader',
+    'hash_file',
+    'is_package_file',
+    'read_package',
+    'write_package',
+]
@@ -9,20 +9,45 @@ import getpass
 import time
 import threading
 import cv2
-import numpy as np
 import pyautogui
 from datetime import datetime
 from pathlib import Path
 import psutil
 import os
 
+from capture_backends import get_capture_backend
+from evidence_database import get_evidence_database
+from evidence_store import EvidenceStore
+from frame import pixel_digest
+from hashing_writer import DEFAULT_ALGORITHMS, check_algorithms
+from image_codecs import get_codec
+
 class EvidenceRecorder:
     """证据记录器 - 核心功能"""
     
-    def __init__(self, case_id=None):
+    def __init__(self, case_id=None, journal_path=None, database=None):
+        """
+        Args:
+            case_id: 案件ID（默认按时间生成）
+            journal_path: 证据链 JSON Lines 日志路径（可稍后通过 open_journal 指定）
+            database: EvidenceDatabase（默认使用共享的 evidence_database.db，False 表示不写数据库）
+        """
         self.case_id = case_id or self.generate_case_id()
-        self.evidence_chain = []
+        if database is None:
+            database = get_evidence_database()
+        self.database = database or None
+        # 按 evidence_id 索引、增量哈希链的证据存储，封存的记录同时写入数据库
+        self.store = EvidenceStore(journal_path, on_seal=self._on_seal)
         self.system_info = self.collect_system_info()
+    
+    @property
+    def evidence_chain(self):
+        """按顺序排列的全部证据记录（会读取整个日志，仅用于兼容旧接口）"""
+        return list(self.store.iter_records())
+    
+    def open_journal(self, journal_path):
+        """指定证据链日志（已封存的记录会补写进去）"""
+        self.store.open_journal(journal_path)
         
     def generate_case_id(self):
         """生成案件ID"""
@@ -54,7 +79,7 @@ class EvidenceRecorder:
         
         # 创建证据记录
         evidence = {
-            'evidence_id': f"EVD_{len(self.evidence_chain) + 1:06d}",
+            'evidence_id': f"EVD_{len(self.store) + 1:06d}",
             'case_id': self.case_id,
             'timestamp': timestamp.isoformat(),
             'unix_timestamp': timestamp.timestamp(),
@@ -68,24 +93,53 @@ class EvidenceRecorder:
             'file_info': None  # 稍后填充
         }
         
-        self.evidence_chain.append(evidence)
+        self.store.add(evidence)
         return evidence
     
+    def database_key(self, evidence_id):
+        """
+        证据在数据库中的编号
+        
+        EVD_000001 这样的编号只在案件内唯一，而 evidence_records.evidence_id 全库唯一，
+        因此加上案件ID前缀。
+        """
+        return f"{self.case_id}/{evidence_id}"
+    
+    def _on_seal(self, evidence):
+        """记录封存后写入证据数据库（异步批量写入，不阻塞截图）"""
+        if self.database is not None:
+            self.database.store_evidence(self.database_key(evidence['evidence_id']), self.case_id,
+                                         evidence, operator=self.system_info.get('operator'))
+    
     def calculate_image_hash(self, image):
-        """计算图像哈希"""
-        image_bytes = image.tobytes()
-        return hashlib.sha256(image_bytes).hexdigest()
+        """计算图像哈希（RGB 像素字节的 SHA-256；Frame/数组直接读取缓冲区，不复制）"""
+        return pixel_digest(image, 'sha256')
     
-    def update_file_info(self, evidence_id, file_path):
-        """更新文件信息"""
-        for evidence in self.evidence_chain:
-            if evidence['evidence_id'] == evidence_id:
-                evidence['file_info'] = {
-                    'file_path': str(file_path),
-                    'file_size': file_path.stat().st_size if file_path.exists() else 0,
-                    'file_hash': self.calculate_file_hash(file_path)
-                }
-                break
+    def update_file_info(self, evidence_id, file_path, hashed=None):
+        """
+        更新文件信息
+        
+        hashed 为写盘时得到的 HashedFile 时直接使用其大小和摘要，不再回读文件。
+        文件信息填入后记录即封存进哈希链（写入 prev_hash / record_hash 并追加到日志）。
+        """
+        if evidence_id not in self.store:
+            return
+        if hashed is not None:
+            file_info = {
+                'file_path': str(file_path),
+                'file_size': hashed.size,
+                'file_hash': hashed.sha256,
+                'file_hashes': dict(hashed.digests),
+                'fsynced': hashed.fsynced
+            }
+        else:
+            file_info = {
+                'file_path': str(file_path),
+                'file_size': file_path.stat().st_size if file_path.exists() else 0,
+                'file_hash': self.calculate_file_hash(file_path)
+            }
+        self.store.update(evidence_id, file_info=file_info)
+        self.store.seal(evidence_id)
     
     def calculate_file_hash(self, file_path):
         """计算文件哈希"""
@@ -99,33 +153,63 @@ class EvidenceRecorder:
             return None
     
     def export_evidence_chain(self, output_path):
-        """导出证据链"""
-        evidence_package = {
-            'case_info': {
-                'case_id': self.case_id,
-                'created_at': datetime.now().isoformat(),
-                'total_evidence': len(self.evidence_chain)
-            },
-            'system_info': self.system_info,
-            'evidence_chain': self.evidence_chain,
-            'integrity': {
-                'chain_hash': self.calculate_chain_hash(),
-                'generated_at': datetime.now().isoformat()
-            }
+        """
+        导出证据链
+        
+        先封存所有未完成的记录，再从日志逐条流式写出，内存占用与证据数量无关。
+        """
+        chain_hash = self.store.seal_all()
+        case_info = {
+            'case_id': self.case_id,
+            'created_at': datetime.now().isoformat(),
+            'total_evidence': self.store.sealed_count
+        }
+        integrity = {
+            'chain_hash': chain_hash,
+            'chain_algorithm': 'sha256-linked',
+            'generated_at': datetime.now().isoformat()
         }
         
+        def dump(value):
+            # 与 json.dump(indent=2) 相同的缩进，嵌套在顶层对象中
+            return json.dumps(value, indent=2, ensure_ascii=False).replace('\n', '\n  ')
+        
         try:
             with open(output_path, 'w', encoding='utf-8') as f:
-                json.dump(evidence_package, f, indent=2, ensure_ascii=False)
+                f.write('{\n')
+                f.write(f'  "case_info": {dump(case_info)},\n')
+                f.write(f'  "system_info": {dump(self.system_info)},\n')
+                f.write('  "evidence_chain": [')
+                # 日志行已是规范化 JSON，原样写出，不再解析
+                for index, line in enumerate(self.store.iter_sealed_lines()):
+                    f.write(',\n    ' if index else '\n    ')
+                    f.write(line.decode('utf-8'))
+                f.write('\n  ],\n' if self.store.sealed_count else '],\n')
+                f.write(f'  "integrity": {dump(integrity)}\n')
+                f.write('}\n')
             return True
         except Exception as e:
             print(f"导出失败: {e}")
             return False
     
     def calculate_chain_hash(self):
-        """计算证据链哈希"""
-        chain_data = json.dumps(self.evidence_chain, sort_keys=True)
-        return hashlib.sha256(chain_data.encode()).hexdigest()
+        """
+        计算证据链哈希
+        
+        每条记录包含上一条的 record_hash（prev_hash），链哈希即最后一条已封存记录的
+        record_hash，随封存增量更新，O(1)。
+        """
+        return self.store.chain_hash
+    
+    def verify_chain(self):
+        """从头校验哈希链，返回 (是否通过, 记录数, 错误信息)"""
+        return self.store.verify()
+    
+    def close(self):
+        """封存剩余记录并关闭日志，等待数据库写完"""
+        self.store.close()
+        if self.database is not None:
+            self.database.flush()
 
 class ScreenRecorder:
     """屏幕录制器 - 核心功能"""
@@ -208,18 +292,18 @@ class ScreenRecorder:
     def _record_loop(self):
         """录制循环"""
         frame_interval = 1.0 / self.fps
+        backend = get_capture_backend()
         
         while self.recording:
             try:
                 start = time.time()
                 
-                # 截取屏幕
-                screenshot = pyautogui.screenshot(region=self.record_region)
-                frame = cv2.cvtColor(np.array(screenshot), cv2.COLOR_RGB2BGR)
+                # 截取屏幕（一次转换为 VideoWriter 需要的 BGR 帧）
+                frame = backend.grab_frame(self.record_region, 'BGR')
                 
                 # 写入视频
                 if self.video_writer:
-                    self.video_writer.write(frame)
+                    self.video_writer.write(frame.array)
                 
                 # 控制帧率
                 elapsed = time.time() - start
@@ -249,10 +333,21 @@ class ScreenRecorder:
 class EnhancedSaver:
     """增强截图保存器"""
     
-    def __init__(self, evidence_recorder, output_dir="evidence_screenshots"):
+    def __init__(self, evidence_recorder, output_dir="evidence_screenshots", codec=None,
+                 hash_algorithms=DEFAULT_ALGORITHMS):
         self.evidence_recorder = evidence_recorder
         self.output_dir = Path(output_dir)
         self.output_dir.mkdir(exist_ok=True)
+        # 证据截图必须无损，默认与 Pillow 默认 PNG 相同（压缩级别 6）
+        self.codec = get_codec(codec or 'balanced')
+        if not self.codec.lossless:
+            raise ValueError(f"证据截图不能使用有损编码: {self.codec.name}")
+        # 文件摘要在写盘时计算，SHA-256 始终包含（file_hash 字段），可追加 SHA-512/SM3
+        self.hash_algorithms = check_algorithms(('sha256',) + tuple(hash_algorithms))
+        # 证据链日志默认与截图放在同一目录
+        if evidence_recorder.store.journal_path is None:
+            evidence_recorder.open_journal(
+                self.output_dir / f"{evidence_recorder.case_id}_evidence_chain.jsonl")
     
     def save_evidence_screenshot(self, screenshot, region, context=None):
         """保存证据截图"""
@@ -261,15 +356,15 @@ class EnhancedSaver:
         
         # 生成文件名
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')[:-3]
-        filename = f"{evidence['evidence_id']}_{timestamp}.png"
+        filename = f"{evidence['evidence_id']}_{timestamp}{self.codec.extension}"
         file_path = self.output_dir / filename
         
         try:
-            # 保存截图
-            screenshot.save(file_path, "PNG")
+            # 保存截图（编码写盘的同时计算摘要，fsync 一次）
+            hashed = self.codec.save_hashed(screenshot, str(file_path), self.hash_algorithms)
             
-            # 更新文件信息
-            self.evidence_recorder.update_file_info(evidence['evidence_id'], file_path)
+            # 更新文件信息（直接使用写盘时的摘要，不回读文件）
+            self.evidence_recorder.update_file_info(evidence['evidence_id'], file_path, hashed)
             
             # 保存元数据
             metadata_path = file_path.with_suffix('.json')
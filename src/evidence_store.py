@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+证据存储 - 按 evidence_id 索引、增量哈希链、只追加日志
+版本: 3.0.8
+
+原来的证据链是一个列表：每保存一帧都要线性查找记录来填写文件信息，
+链哈希每次都把整条链 json.dumps 一遍，长时间取证时二者都是平方级。
+
+EvidenceStore 用字典按 evidence_id 索引记录。记录补全（填入文件信息）
+后"封存"进哈希链：写入上一条记录的 record_hash 作为 prev_hash，再对
+规范化 JSON 计算本条的 record_hash，链哈希就是最后一条的 record_hash，
+每次封存 O(1)。封存的记录逐行追加到 JSON Lines 日志，内存中只保留
+日志偏移，导出 5 万帧的案件时从日志流式读取，耗时线性、内存占用很小。
+
+日志格式（每行一条记录，按封存顺序）:
+    {...证据字段..., "prev_hash": "<上一条 record_hash>", "record_hash": "<本条>"}
+第一条的 prev_hash 为 64 个 "0"。
+"""
+
+import hashlib
+import json
+import os
+import threading
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+
+GENESIS_HASH = '0' * 64
+
+
+def canonical_json(record: dict) -> bytes:
+    """规范化 JSON（键排序、紧凑分隔符、UTF-8），用于计算记录哈希"""
+    return json.dumps(record, sort_keys=True, ensure_ascii=False,
+                      separators=(',', ':')).encode('utf-8')
+
+
+def record_digest(record: dict) -> str:
+    """记录哈希：除 record_hash 外所有字段（含 prev_hash）的规范化 JSON 的 SHA-256"""
+    body = {key: value for key, value in record.items() if key != 'record_hash'}
+    return hashlib.sha256(canonical_json(body)).hexdigest()
+
+
+def verify_chain(records, start_hash: str = GENESIS_HASH) -> Tuple[bool, int, Optional[str]]:
+    """
+    按顺序校验哈希链
+
+    Returns:
+        (是否通过, 已校验记录数, 错误信息)
+    """
+    head = start_hash
+    count = 0
+    for record in records:
+        evidence_id = record.get('evidence_id')
+        if record.get('prev_hash') != head:
+            return False, count, f"{evidence_id}: prev_hash 与上一条记录不符"
+        if record_digest(record) != record.get('record_hash'):
+            return False, count, f"{evidence_id}: record_hash 校验失败（记录被修改）"
+        head = record['record_hash']
+        count += 1
+    return True, count, None
+
+
+class EvidenceStore:
+    """证据记录存储（线程安全）"""
+
+    def __init__(self, journal_path: Optional[str] = None, fsync: bool = False,
+                 on_seal: Optional[Callable[[dict], None]] = None):
+        """
+        Args:
+            journal_path: JSON Lines 日志路径（为 None 时记录只保存在内存中）
+            fsync: 每次封存后是否 fsync 日志
+            on_seal: 记录封存后的回调（如写入证据数据库）
+        """
+        self.fsync = fsync
+        self.on_seal = on_seal
+        self.journal_path = None
+        self._lock = threading.RLock()
+        # evidence_id -> 记录（未封存或无日志时）或日志行偏移（已封存且写入日志）
+        self._index: Dict[str, Union[dict, int]] = {}
+        self._pending: Dict[str, dict] = {}
+        self._chain: List[dict] = []        # 无日志时按封存顺序保存的记录
+        self._head = GENESIS_HASH
+        self._sealed = 0
+        self._journal = None
+        self._reader = None
+        if journal_path:
+            self.open_journal(journal_path)
+
+    # ---------- 日志 ----------
+
+    def open_journal(self, journal_path: str):
+        """
+        打开（或续写）日志
+
+        日志已有记录时载入索引并校验哈希链，崩溃留下的不完整尾行会被截掉；
+        此前只在内存中封存的记录会补写进新日志。
+        """
+        with self._lock:
+            if self.journal_path is not None:
+                raise ValueError(f"证据日志已打开: {self.journal_path}")
+            journal_path = str(journal_path)
+            directory = os.path.dirname(journal_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+
+            existing = os.path.exists(journal_path) and os.path.getsize(journal_path) > 0
+            if existing and self._sealed:
+                raise ValueError("证据日志已有记录，不能与内存中已封存的记录合并")
+
+            if existing:
+                self._load(journal_path)
+
+            self._journal = open(journal_path, 'ab')
+            self.journal_path = journal_path
+            for record in self._chain:
+                self._index[record['evidence_id']] = self._append(record)
+            self._chain = []
+            self._flush()
+
+    def _load(self, journal_path: str):
+        """载入日志索引并校验哈希链"""
+        offset = 0
+        head = GENESIS_HASH
+        count = 0
+        with open(journal_path, 'rb') as f:
+            for line in f:
+                if not line.endswith(b'\n'):
+                    print(f"⚠️ 证据日志尾部不完整，已截断: {journal_path}")
+                    break
+                record = json.loads(line)
+                ok, _, error = verify_chain([record], head)
+                if not ok:
+                    raise ValueError(f"证据日志哈希链校验失败: {error}")
+                head = record['record_hash']
+                self._index[record['evidence_id']] = offset
+                offset += len(line)
+                count += 1
+        if offset < os.path.getsize(journal_path):
+            with open(journal_path, 'r+b') as f:
+                f.truncate(offset)
+        self._head = head
+        self._sealed = count
+
+    def _append(self, record: dict) -> int:
+        """追加一行到日志，返回行偏移"""
+        offset = self._journal.tell()
+        self._journal.write(canonical_json(record) + b'\n')
+        return offset
+
+    def _flush(self):
+        self._journal.flush()
+        if self.fsync:
+            os.fsync(self._journal.fileno())
+
+    def _read(self, offset: int) -> dict:
+        if self._reader is None:
+            self._reader = open(self.journal_path, 'rb')
+        self._reader.seek(offset)
+        return json.loads(self._reader.readline())
+
+    # ---------- 记录 ----------
+
+    def add(self, record: dict) -> dict:
+        """加入一条未封存的记录（之后可以 update，再 seal）"""
+        evidence_id = record['evidence_id']
+        with self._lock:
+            if evidence_id in self._index:
+                raise ValueError(f"证据编号重复: {evidence_id}")
+            self._index[evidence_id] = record
+            self._pending[evidence_id] = record
+        return record
+
+    def get(self, evidence_id: str) -> dict:
+        """按 evidence_id 取记录（O(1)；已写入日志的记录从日志读取）"""
+        with self._lock:
+            entry = self._index[evidence_id]
+            if isinstance(entry, dict):
+                return entry
+            if self._journal is not None:
+                self._journal.flush()
+            return self._read(entry)
+
+    def update(self, evidence_id: str, **fields) -> dict:
+        """更新未封存记录的字段"""
+        with self._lock:
+            try:
+                record = self._pending[evidence_id]
+            except KeyError:
+                if evidence_id in self._index:
+                    raise ValueError(f"证据 {evidence_id} 已封存，不能修改")
+                raise
+            record.update(fields)
+            return record
+
+    def seal(self, evidence_id: str) -> str:
+        """把记录封存进哈希链（写入 prev_hash / record_hash），返回新的链哈希"""
+        with self._lock:
+            if self.journal_path is not None and self._journal is None:
+                raise ValueError(f"证据日志已关闭: {self.journal_path}")
+            record = self._pending.pop(evidence_id)
+            record['prev_hash'] = self._head
+            record['record_hash'] = record_digest(record)
+            self._head = record['record_hash']
+            self._sealed += 1
+            if self.journal_path is not None:
+                # 写入日志后内存里只保留偏移
+                self._index[evidence_id] = self._append(record)
+                self._flush()
+            else:
+                self._chain.append(record)
+            if self.on_seal is not None:
+                self.on_seal(record)
+            return self._head
+
+    def seal_all(self) -> str:
+        """按加入顺序封存所有未封存的记录"""
+        with self._lock:
+            for evidence_id in list(self._pending):
+                self.seal(evidence_id)
+            return self._head
+
+    @property
+    def chain_hash(self) -> str:
+        """当前链哈希（最后一条已封存记录的 record_hash）"""
+        return self._head
+
+    @property
+    def sealed_count(self) -> int:
+        return self._sealed
+
+    @property
+    def pending_count(self) -> int:
+        return len(self._pending)
+
+    def __contains__(self, evidence_id: str) -> bool:
+        return evidence_id in self._index
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def iter_sealed_lines(self) -> Iterator[bytes]:
+        """按封存顺序流式读取已封存记录的规范化 JSON（不含换行，不解析）"""
+        with self._lock:
+            if self.journal_path is None:
+                records = list(self._chain)
+            else:
+                # 日志关闭后仍从日志文件读取
+                records = None
+                if self._journal is not None:
+                    self._journal.flush()
+                    end = self._journal.tell()
+                else:
+                    end = os.path.getsize(self.journal_path)
+        if records is not None:
+            for record in records:
+                yield canonical_json(record)
+            return
+        with open(self.journal_path, 'rb') as f:
+            offset = 0
+            for line in f:
+                offset += len(line)
+                if offset > end:
+                    break
+                yield line.rstrip(b'\n')
+
+    def iter_sealed(self) -> Iterator[dict]:
+        """按封存顺序流式读取已封存的记录"""
+        for line in self.iter_sealed_lines():
+            yield json.loads(line)
+
+    def iter_records(self) -> Iterator[dict]:
+        """先按封存顺序返回已封存记录，再返回未封存记录"""
+        yield from self.iter_sealed()
+        with self._lock:
+            pending = list(self._pending.values())
+        yield from pending
+
+    def verify(self) -> Tuple[bool, int, Optional[str]]:
+        """从头校验已封存记录的哈希链"""
+        ok, count, error = verify_chain(self.iter_sealed())
+        if ok and count != self._sealed:
+            return False, count, f"记录数不符: 期望 {self._sealed}，实际 {count}"
+        return ok, count, error
+
+    def close(self):
+        """封存剩余记录并关闭日志（可重复调用）"""
+        with self._lock:
+            if self.journal_path is None or self._journal is not None:
+                self.seal_all()
+            if self._journal is not None:
+                self._flush()
+                self._journal.close()
+                self._journal = None
+            if self._reader is not None:
+                self._reader.close()
+                self._reader = None
+
+
+__all__ = [
+    'GENESIS_HASH',
+    'EvidenceStore',
+    'canonical_json',
+    'record_digest',
+    'verify_chain',
+]
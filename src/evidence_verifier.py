@@ -0,0 +1,548 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+证据批量校验 - 并行复核整个证据目录
+版本: 3.0.8
+
+EnhancedLegalCompliance.verify_evidence_integrity 一次只能校验一个证据包。
+出庭前要复核整个 evidence_storage/ 目录时，
+EvidenceVerifier 流式遍历目录，把"读取 + 哈希 + 验签"分发给进程池，
+每完成一个文件就追加一行检查点，中断后重跑会跳过已校验且未改动的文件，
+最后输出带吞吐量的汇总报告。
+
+支持以下文件:
+    证据包     EnhancedLegalCompliance 保存的 EVD_*.evp / EVD_*.json：校验内容
+               SHA-256（.evp 直接对原始载荷或被引用的截图做流式哈希）；
+               批量签名的包按 signatures/ 下的批次文件校验包含证明和根签名，
+               旧格式的包验证 RSA-PSS-SHA256 签名
+    批次签名   signatures/BATCH_*.json：验证根签名及每个叶子的包含证明
+    截图元数据 EnhancedSaver 保存的截图 .json：按 file_info 流式重算截图
+               文件的 SHA-256 与大小
+其它 JSON（如报告 RPT_*.json）记为跳过。
+
+签名只认可信公钥（trusted_fingerprints / --trusted-key）：批次文件和旧格式
+证据包都自带公钥，公钥指纹不在可信列表中的一律判为无效，否则任何人都能用
+自己的密钥伪造签名。
+
+命令行:
+    python evidence_verifier.py evidence_storage --workers 4 --report verify_report.json
+    python evidence_verifier.py evidence_storage --trusted-key keys/evidence_signing_pub.pem
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import asdict, dataclass, field
+from typing import Dict, FrozenSet, Iterable, Iterator, List, Optional
+
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import padding
+
+from encoder_pool import default_worker_count
+from evidence_package import PACKAGE_EXTENSION, EvidencePackageReader, hash_file
+from signing_service import (DEFAULT_KEY_PATH, MERKLE_ALGORITHM, SIGNATURE_DIR_NAME,
+                             evidence_leaf, load_trusted_fingerprints, public_key_fingerprint,
+                             verify_batch_signature, verify_inclusion)
+
+
+DEFAULT_CHECKPOINT_NAME = ".verify_checkpoint.jsonl"
+
+# 校验状态
+VALID = 'valid'
+INVALID = 'invalid'
+SKIPPED = 'skipped'
+ERROR = 'error'
+
+# 工作进程内按 PEM 缓存已解析的公钥及其指纹（同一批证据通常共用一把密钥）
+_public_keys: Dict[str, tuple] = {}
+
+# 工作进程内缓存批次文件及其根签名校验结果: (路径, 可信指纹) -> (mtime_ns, 批次, 签名是否有效)
+_batches: Dict[tuple, tuple] = {}
+
+
+@dataclass
+class VerificationResult:
+    """单个文件的校验结果"""
+    path: str
+    status: str
+    evidence_id: Optional[str] = None
+    kind: Optional[str] = None          # 'package' / 'batch' / 'screenshot'
+    reason: str = ''
+    bytes: int = 0                      # 读取的字节数（JSON + 截图文件）
+    duration: float = 0.0
+    size: int = 0                       # 校验时 JSON 文件的大小和修改时间，用于断点续验
+    mtime_ns: int = 0
+    # 校验结果依赖的其它文件 [路径, 大小, 修改时间]：截图元数据对应的截图、
+    # 引用模式 .evp 指向的截图、批量签名的证据包所属的批次文件（不存在时大小记为 -1）
+    dependencies: List[list] = field(default_factory=list)
+    trust: str = ''                     # 校验时可信公钥集合的摘要，换了可信公钥就要重验
+
+
+@dataclass
+class VerificationSummary:
+    """批量校验汇总"""
+    root: str
+    total: int = 0
+    valid: int = 0
+    invalid: int = 0
+    skipped: int = 0
+    errors: int = 0
+    resumed: int = 0                    # 从检查点恢复、本次未重新校验的文件数
+    bytes_verified: int = 0             # 本次实际读取的字节数
+    elapsed: float = 0.0
+    workers: int = 1
+    failures: List[dict] = field(default_factory=list)
+
+    @property
+    def files_per_second(self) -> float:
+        verified = self.total - self.resumed
+        return verified / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def mb_per_second(self) -> float:
+        return self.bytes_verified / 1024 / 1024 / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def passed(self) -> bool:
+        return self.invalid == 0 and self.errors == 0
+
+    def add(self, result: VerificationResult, resumed: bool = False):
+        self.total += 1
+        if resumed:
+            self.resumed += 1
+        else:
+            self.bytes_verified += result.bytes
+        if result.status == VALID:
+            self.valid += 1
+        elif result.status == INVALID:
+            self.invalid += 1
+        elif result.status == SKIPPED:
+            self.skipped += 1
+        else:
+            self.errors += 1
+        if result.status in (INVALID, ERROR):
+            self.failures.append({'path': result.path, 'evidence_id': result.evidence_id,
+                                  'status': result.status, 'reason': result.reason})
+
+    def to_dict(self) -> dict:
+        report = asdict(self)
+        report.update({
+            'passed': self.passed,
+            'files_per_second': round(self.files_per_second, 2),
+            'mb_per_second': round(self.mb_per_second, 2),
+            'generated_at': time.strftime('%Y-%m-%dT%H:%M:%S%z')
+        })
+        return report
+
+
+# ===================== 单文件校验（在工作进程中运行） =====================
+
+def _load_public_key(pem: str) -> tuple:
+    """解析 PEM 公钥，返回 (公钥, 指纹)"""
+    cached = _public_keys.get(pem)
+    if cached is None:
+        key = serialization.load_pem_public_key(pem.encode('utf-8'), backend=default_backend())
+        cached = _public_keys[pem] = (key, public_key_fingerprint(key))
+    return cached
+
+
+def _file_state(path: str) -> tuple:
+    """文件的 (大小, 修改时间)，不存在时为 (-1, 0)"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return -1, 0
+    return stat.st_size, stat.st_mtime_ns
+
+
+def _depends_on(result: VerificationResult, path: str):
+    """记录依赖文件的当前状态（断点续验时任一依赖变化都要重验）"""
+    result.dependencies.append([path, *_file_state(path)])
+
+
+def trust_digest(trusted_fingerprints: Iterable[str]) -> str:
+    """可信公钥集合的摘要（写入检查点）"""
+    return hashlib.sha256(','.join(sorted(trusted_fingerprints)).encode('ascii')).hexdigest()[:16]
+
+
+def _load_batch(path: str, trusted: FrozenSet[str]) -> tuple:
+    """载入批次文件（每个批次只验一次根签名），返回 (批次, 签名是否有效且公钥可信)"""
+    mtime_ns = os.stat(path).st_mtime_ns
+    cached = _batches.get((path, trusted))
+    if cached is None or cached[0] != mtime_ns:
+        with open(path, 'r', encoding='utf-8') as f:
+            batch = json.load(f)
+        cached = _batches[(path, trusted)] = (mtime_ns, batch,
+                                              verify_batch_signature(batch, trusted))
+    return cached[1], cached[2]
+
+
+def _verify_merkle_reference(package: dict, json_path: str, content_hash: str,
+                             result: VerificationResult, trusted: FrozenSet[str]):
+    """批量签名的证据包：叶子摘要 -> 包含证明 -> 批次根签名"""
+    reference = package['digital_signature']
+    leaf_hash = evidence_leaf(package.get('evidence_id'), content_hash)
+    if leaf_hash != reference.get('leaf_hash'):
+        result.status, result.reason = INVALID, '叶子摘要与证据内容不符'
+        return
+    batch_path = os.path.join(os.path.dirname(json_path), SIGNATURE_DIR_NAME,
+                              f"{reference.get('batch_id')}.json")
+    _depends_on(result, batch_path)
+    if not os.path.exists(batch_path):
+        result.status, result.reason = INVALID, f"批次签名文件缺失: {reference.get('batch_id')}"
+        return
+    batch, signature_valid = _load_batch(batch_path, trusted)
+    if batch.get('key_fingerprint') not in trusted:
+        result.status, result.reason = INVALID, '批次签名公钥不受信任'
+    elif not signature_valid:
+        result.status, result.reason = INVALID, '批次根签名无效'
+    elif batch.get('key_fingerprint') != reference.get('key_fingerprint'):
+        result.status, result.reason = INVALID, '签名公钥指纹不符'
+    elif not verify_inclusion(batch, reference.get('leaf_index'), leaf_hash):
+        result.status, result.reason = INVALID, 'Merkle 包含证明无效'
+    else:
+        result.status = VALID
+
+
+def _verify_batch(batch: dict, json_path: str, result: VerificationResult,
+                  trusted: FrozenSet[str]):
+    """批次签名文件：根签名 + 每个叶子的包含证明"""
+    result.kind = 'batch'
+    result.evidence_id = batch.get('batch_id')
+    _, signature_valid = _load_batch(json_path, trusted)
+    leaves = batch.get('leaves') or []
+    if batch.get('key_fingerprint') not in trusted:
+        result.status, result.reason = INVALID, '批次签名公钥不受信任'
+    elif not signature_valid:
+        result.status, result.reason = INVALID, '批次根签名无效'
+    elif len(leaves) != batch.get('leaf_count'):
+        result.status, result.reason = INVALID, '叶子数与签名不符'
+    elif not all(verify_inclusion(batch, index, leaf['leaf_hash'])
+                 for index, leaf in enumerate(leaves)):
+        result.status, result.reason = INVALID, 'Merkle 包含证明无效'
+    else:
+        result.status = VALID
+
+
+def _verify_package(package: dict, json_path: str, result: VerificationResult,
+                    trusted: FrozenSet[str]):
+    """JSON 证据包：十六进制内容的哈希 + 签名"""
+    result.kind = 'package'
+    content = bytes.fromhex(package['evidence_data']['content'])
+    _verify_signed_hash(package, json_path, hashlib.sha256(content).hexdigest(),
+                        lambda: content, result, trusted)
+
+
+def _verify_binary_package(path: str, result: VerificationResult, trusted: FrozenSet[str]):
+    """.evp 证据包：载荷（或被引用的截图）流式哈希 + 签名"""
+    result.kind = 'package'
+    with EvidencePackageReader(path) as reader:
+        package = reader.header
+        result.evidence_id = package.get('evidence_id')
+        payload = reader.payload_info
+        if reader.is_reference:
+            _depends_on(result, reader.reference_path())
+        if reader.is_reference and not os.path.exists(reader.reference_path()):
+            result.status, result.reason = INVALID, f"被引用的截图文件缺失: {payload.get('path')}"
+            return
+        digest, size = reader.payload_digest()
+        if reader.is_reference:
+            result.bytes += size
+        if size != payload.get('size') or digest != payload.get('sha256'):
+            result.status, result.reason = INVALID, '载荷哈希不符'
+            return
+        _verify_signed_hash(package, path, digest, reader.read_payload, result, trusted)
+
+
+def _verify_signed_hash(package: dict, path: str, content_hash: str, load_content,
+                        result: VerificationResult, trusted: FrozenSet[str]):
+    """核对声明的内容哈希并验证签名（仅旧格式的逐包签名需要载入内容）"""
+    expected = package.get('integrity_verification', {}).get('content_hash')
+    if content_hash != expected:
+        result.status, result.reason = INVALID, '内容哈希不符'
+        return
+
+    signature_info = package.get('digital_signature') or {}
+    if signature_info.get('algorithm') == MERKLE_ALGORITHM:
+        _verify_merkle_reference(package, path, expected, result, trusted)
+        return
+    if not signature_info.get('public_key'):
+        result.status, result.reason = INVALID, '缺少签名公钥'
+        return
+    if signature_info.get('algorithm', 'RSA-PSS-SHA256') != 'RSA-PSS-SHA256':
+        result.status, result.reason = INVALID, f"不支持的签名算法: {signature_info['algorithm']}"
+        return
+    public_key, fingerprint = _load_public_key(signature_info['public_key'])
+    if fingerprint not in trusted:
+        # 包内公钥只能说明"签名与这把钥匙匹配"，不能说明是谁签的
+        result.status, result.reason = INVALID, '签名公钥不受信任'
+        return
+    try:
+        public_key.verify(
+            bytes.fromhex(signature_info['signature']),
+            load_content(),
+            padding.PSS(mgf=padding.MGF1(hashes.SHA256()), salt_length=padding.PSS.MAX_LENGTH),
+            hashes.SHA256()
+        )
+    except InvalidSignature:
+        result.status, result.reason = INVALID, '数字签名无效'
+        return
+    result.status = VALID
+
+
+def _verify_screenshot(metadata: dict, json_path: str, result: VerificationResult):
+    """截图元数据：重算截图文件哈希与大小"""
+    result.kind = 'screenshot'
+    file_info = metadata['file_info']
+    file_path = file_info['file_path']
+    if not os.path.isabs(file_path) and not os.path.exists(file_path):
+        # 相对路径按元数据所在目录解析（证据目录被整体拷贝后依然可校验）
+        file_path = os.path.join(os.path.dirname(json_path), os.path.basename(file_path))
+    _depends_on(result, file_path)
+    if not os.path.exists(file_path):
+        result.status, result.reason = INVALID, f"截图文件缺失: {file_info['file_path']}"
+        return
+    digest, size = hash_file(file_path)
+    result.bytes += size
+    if digest != file_info.get('file_hash'):
+        result.status, result.reason = INVALID, '截图文件哈希不符'
+    elif file_info.get('file_size') not in (None, size):
+        result.status, result.reason = INVALID, '截图文件大小不符'
+    else:
+        result.status = VALID
+
+
+def verify_file(path: str, trusted_fingerprints: Iterable[str] = ()) -> VerificationResult:
+    """
+    校验一个证据文件（进程池入口，也可直接调用）
+
+    Args:
+        trusted_fingerprints: 可信签名公钥指纹（为空时所有签名都不被信任）
+    """
+    trusted = frozenset(trusted_fingerprints)
+    start = time.perf_counter()
+    result = VerificationResult(path=path, status=ERROR, trust=trust_digest(trusted))
+    try:
+        stat = os.stat(path)
+        result.size, result.mtime_ns = stat.st_size, stat.st_mtime_ns
+        if path.endswith(PACKAGE_EXTENSION):
+            result.bytes = stat.st_size
+            _verify_binary_package(path, result, trusted)
+            result.duration = time.perf_counter() - start
+            return result
+        with open(path, 'r', encoding='utf-8') as f:
+            document = json.load(f)
+        result.bytes = stat.st_size
+        result.evidence_id = document.get('evidence_id') if isinstance(document, dict) else None
+
+        if not isinstance(document, dict):
+            result.status, result.reason = SKIPPED, '不是证据文件'
+        elif isinstance(document.get('evidence_data'), dict) and 'content' in document['evidence_data']:
+            _verify_package(document, path, result, trusted)
+        elif document.get('algorithm') == MERKLE_ALGORITHM and 'leaves' in document:
+            _verify_batch(document, path, result, trusted)
+        elif isinstance(document.get('file_info'), dict) and document['file_info'].get('file_hash'):
+            _verify_screenshot(document, path, result)
+        else:
+            result.status, result.reason = SKIPPED, '不是证据文件'
+    except Exception as e:
+        result.status, result.reason = ERROR, f"{type(e).__name__}: {e}"
+    result.duration = time.perf_counter() - start
+    return result
+
+
+# ===================== 批量校验 =====================
+
+def iter_evidence_files(root: str, suffixes: tuple = ('.json', PACKAGE_EXTENSION)) -> Iterator[str]:
+    """按目录顺序流式列出证据文件（跳过检查点等隐藏文件）"""
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        with os.scandir(directory) as entries:
+            subdirs = []
+            for entry in sorted(entries, key=lambda e: e.name):
+                if entry.name.startswith('.'):
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.path)
+                elif entry.name.endswith(suffixes):
+                    yield entry.path
+            stack.extend(reversed(subdirs))
+
+
+class EvidenceVerifier:
+    """证据目录批量校验器"""
+
+    def __init__(self, workers: Optional[int] = None, checkpoint_path: Optional[str] = None,
+                 progress_interval: float = 5.0, trusted_fingerprints: Iterable[str] = ()):
+        """
+        Args:
+            workers: 工作进程数（默认按核心数；1 表示在当前进程中校验）
+            checkpoint_path: 检查点文件（默认 <目录>/.verify_checkpoint.jsonl）
+            progress_interval: 打印进度的间隔（秒，0 表示不打印）
+            trusted_fingerprints: 可信签名公钥指纹；签名公钥不在其中的证据判为无效
+        """
+        self.workers = workers or default_worker_count()
+        self.trusted_fingerprints = frozenset(trusted_fingerprints)
+        self.checkpoint_path = checkpoint_path
+        self.progress_interval = progress_interval
+
+    @staticmethod
+    def load_checkpoint(path: str) -> Dict[str, VerificationResult]:
+        """读取检查点（同一文件以最后一行为准，忽略不完整的尾行）"""
+        done: Dict[str, VerificationResult] = {}
+        if not os.path.exists(path):
+            return done
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if not line.endswith('\n'):
+                    break
+                try:
+                    result = VerificationResult(**json.loads(line))
+                except (ValueError, TypeError):
+                    continue
+                done[result.path] = result
+        return done
+
+    def verify(self, root: str, resume: bool = True) -> VerificationSummary:
+        """
+        校验目录下的所有证据文件
+
+        Args:
+            root: 证据目录
+            resume: 为 True 时跳过检查点中已校验、且本身及依赖文件（截图、批次文件）
+                    大小和修改时间都未变、可信公钥也未变的文件；为 False 时清空检查点重新校验
+        """
+        checkpoint_path = self.checkpoint_path or os.path.join(root, DEFAULT_CHECKPOINT_NAME)
+        if not resume and os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+        done = self.load_checkpoint(checkpoint_path)
+
+        summary = VerificationSummary(root=str(root), workers=self.workers)
+        start = time.perf_counter()
+        self._last_progress = start
+
+        with open(checkpoint_path, 'a', encoding='utf-8') as checkpoint:
+            def record(result: VerificationResult):
+                summary.add(result)
+                checkpoint.write(json.dumps(asdict(result), ensure_ascii=False) + '\n')
+                checkpoint.flush()
+                self._report_progress(summary, start)
+
+            pending_paths = self._filter_done(iter_evidence_files(root), done, summary,
+                                              trust_digest(self.trusted_fingerprints))
+            if self.workers <= 1:
+                for path in pending_paths:
+                    record(verify_file(path, self.trusted_fingerprints))
+            else:
+                self._verify_parallel(pending_paths, record)
+
+        summary.elapsed = time.perf_counter() - start
+        return summary
+
+    @staticmethod
+    def _filter_done(paths: Iterator[str], done: Dict[str, VerificationResult],
+                     summary: VerificationSummary, trust: str) -> Iterator[str]:
+        """跳过检查点中已校验且本身、依赖文件和可信公钥都未改动的文件（结果计入汇总）"""
+        for path in paths:
+            previous = done.get(path)
+            if (previous is not None and previous.status != ERROR and previous.trust == trust
+                    and _file_state(path) == (previous.size, previous.mtime_ns)
+                    and all(_file_state(dependency) == (size, mtime_ns)
+                            for dependency, size, mtime_ns in previous.dependencies)):
+                summary.add(previous, resumed=True)
+                continue
+            yield path
+
+    def _verify_parallel(self, paths: Iterator[str], record):
+        """有界提交：同时在途的任务数不超过工作进程数的 4 倍，目录再大也不会堆积"""
+        max_pending = self.workers * 4
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            pending = set()
+            for path in paths:
+                pending.add(executor.submit(verify_file, path, self.trusted_fingerprints))
+                if len(pending) >= max_pending:
+                    finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        record(future.result())
+            for future in pending:
+                record(future.result())
+
+    def _report_progress(self, summary: VerificationSummary, start: float):
+        if not self.progress_interval:
+            return
+        now = time.perf_counter()
+        if now - self._last_progress >= self.progress_interval:
+            self._last_progress = now
+            rate = summary.bytes_verified / 1024 / 1024 / (now - start)
+            print(f"⏳ 已校验 {summary.total} 个文件，{rate:.1f} MB/s，"
+                  f"失败 {summary.invalid + summary.errors}")
+
+
+def print_summary(summary: VerificationSummary):
+    """打印汇总"""
+    icon = "✅" if summary.passed else "❌"
+    print(f"{icon} 证据校验完成: {summary.root}")
+    print(f"   文件 {summary.total}（通过 {summary.valid}，失败 {summary.invalid}，"
+          f"错误 {summary.errors}，跳过 {summary.skipped}，检查点恢复 {summary.resumed}）")
+    print(f"   耗时 {summary.elapsed:.2f}s，{summary.workers} 个进程，"
+          f"{summary.files_per_second:.1f} 文件/s，{summary.mb_per_second:.1f} MB/s")
+    for failure in summary.failures[:20]:
+        print(f"   ❌ {failure['path']}: {failure['reason']}")
+    if len(summary.failures) > 20:
+        print(f"   ... 另有 {len(summary.failures) - 20} 个失败")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="证据目录批量校验")
+    parser.add_argument('root', nargs='?', default='evidence_storage', help="证据目录")
+    parser.add_argument('--workers', type=int, default=None, help="工作进程数（默认按核心数）")
+    parser.add_argument('--checkpoint', help="检查点文件（默认在证据目录下）")
+    parser.add_argument('--restart', action='store_true', help="忽略检查点，全部重新校验")
+    parser.add_argument('--report', help="汇总报告输出路径（JSON）")
+    parser.add_argument('--trusted-key', action='append', default=[],
+                        help="可信签名公钥：PEM 公钥/私钥文件或 SHA-256 公钥指纹，可重复指定"
+                             f"（默认使用 {DEFAULT_KEY_PATH}）")
+    args = parser.parse_args()
+
+    trusted_keys = args.trusted_key
+    if not trusted_keys and os.path.exists(DEFAULT_KEY_PATH):
+        trusted_keys = [DEFAULT_KEY_PATH]
+    if not trusted_keys:
+        print("❌ 未指定可信签名公钥（--trusted-key），无法判断签名是否可信")
+        return 2
+    trusted = load_trusted_fingerprints(trusted_keys)
+
+    verifier = EvidenceVerifier(workers=args.workers, checkpoint_path=args.checkpoint,
+                                trusted_fingerprints=trusted)
+    summary = verifier.verify(args.root, resume=not args.restart)
+    print_summary(summary)
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(summary.to_dict(), f, indent=2, ensure_ascii=False)
+        print(f"📄 报告已保存: {args.report}")
+    return 0 if summary.passed else 1
+
+
+__all__ = [
+    'VALID',
+    'INVALID',
+    'SKIPPED',
+    'ERROR',
+    'VerificationResult',
+    'VerificationSummary',
+    'EvidenceVerifier',
+    'iter_evidence_files',
+    'verify_file',
+    'trust_digest',
+    'print_summary',
+]
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
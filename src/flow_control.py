@@ -0,0 +1,418 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+流量控制 - 截图管道的字节预算队列、额度准入、按序重排与阶段指标
+版本: 3.0.8
+
+截图 -> 相似度 -> 保存/拼接 各阶段之间的队列按"条数 + 字节数"双重
+限额，生产者超限时阻塞而不是无限堆积；整条管道另有一个额度闸门
+（CreditGate）：每一帧从准入截图起占用一个额度，直到被判为重复、
+保存完成或失败时归还。保存跟不上时额度耗尽，截图准入随之阻塞，
+滚动循环也就慢下来，内存占用始终有上界。
+
+截图线程并行完成的帧先经过 ReorderBuffer 按任务序号重排，再交给
+相似度检测。每个阶段都有一个 StageGauge，记录当前深度、字节数、
+排队延迟、处理耗时以及生产者被阻塞的时间，供界面和压测工具读取。
+"""
+
+import threading
+import time
+from collections import deque
+from queue import Empty, Full
+from typing import Dict, Hashable, Optional
+
+import numpy as np
+
+
+class StageGauge:
+    """单个管道阶段的深度/延迟指标"""
+
+    def __init__(self, name: str, window: int = 200, alpha: float = 0.1):
+        """
+        Args:
+            name: 阶段名称
+            window: 延迟分位数的滑动窗口大小
+            alpha: EWMA 系数
+        """
+        self.name = name
+        self.alpha = alpha
+        self._lock = threading.Lock()
+        self._waits = deque(maxlen=window)
+        self.depth = 0
+        self.bytes = 0
+        self.peak_depth = 0
+        self.peak_bytes = 0
+        self.items_in = 0
+        self.items_out = 0
+        self.wait_ewma = 0.0
+        self.service_ewma = 0.0
+        self.blocked_time = 0.0
+        self.blocked_count = 0
+
+    def enter(self, nbytes: int = 0) -> float:
+        """记录一个条目进入本阶段，返回进入时刻"""
+        with self._lock:
+            self.depth += 1
+            self.bytes += nbytes
+            self.items_in += 1
+            self.peak_depth = max(self.peak_depth, self.depth)
+            self.peak_bytes = max(self.peak_bytes, self.bytes)
+        return time.monotonic()
+
+    def exit(self, entered_at: float, nbytes: int = 0):
+        """记录一个条目离开本阶段（排队延迟 = 离开时刻 - 进入时刻）"""
+        wait = time.monotonic() - entered_at
+        with self._lock:
+            self.depth -= 1
+            self.bytes -= nbytes
+            self.items_out += 1
+            self._waits.append(wait)
+            self.wait_ewma = (wait if self.items_out == 1
+                              else self.wait_ewma * (1 - self.alpha) + wait * self.alpha)
+
+    def adjust_bytes(self, delta: int):
+        """修正在途字节数（条目大小在进入后才确定时使用）"""
+        with self._lock:
+            self.bytes += delta
+            self.peak_bytes = max(self.peak_bytes, self.bytes)
+
+    def record_service(self, duration: float):
+        """记录一次处理耗时"""
+        with self._lock:
+            self.service_ewma = (duration if self.service_ewma == 0.0
+                                 else self.service_ewma * (1 - self.alpha) + duration * self.alpha)
+
+    def record_blocked(self, duration: float):
+        """记录生产者因本阶段限额而阻塞的时间"""
+        with self._lock:
+            self.blocked_time += duration
+            self.blocked_count += 1
+
+    def snapshot(self) -> dict:
+        """当前指标快照"""
+        with self._lock:
+            waits = np.fromiter(self._waits, dtype=np.float64, count=len(self._waits))
+            return {
+                'depth': self.depth,
+                'bytes_mb': self.bytes / (1024**2),
+                'peak_depth': self.peak_depth,
+                'peak_bytes_mb': self.peak_bytes / (1024**2),
+                'items_in': self.items_in,
+                'items_out': self.items_out,
+                'wait_ms': self.wait_ewma * 1000,
+                'wait_p95_ms': float(np.percentile(waits, 95)) * 1000 if len(waits) else 0.0,
+                'service_ms': self.service_ewma * 1000,
+                'blocked_s': self.blocked_time,
+                'blocked_count': self.blocked_count
+            }
+
+
+class ByteBudgetQueue:
+    """
+    按条数和字节数双重限额的阻塞队列
+
+    接口与 queue.Queue 的常用部分一致（put/get/qsize/empty，超时抛出
+    Full/Empty）。单个条目超过字节预算时，只要队列为空仍允许放入，避免死锁。
+    """
+
+    def __init__(self, name: str, max_items: int = 0, max_bytes: int = 0):
+        """
+        Args:
+            name: 阶段名称（用于指标）
+            max_items: 最大条数（0 表示不限）
+            max_bytes: 最大字节数（0 表示不限）
+        """
+        self.name = name
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.gauge = StageGauge(name)
+        self._items = deque()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._not_full = threading.Condition(self._lock)
+
+    def _has_room(self, nbytes: int) -> bool:
+        if not self._items:
+            return True
+        if self.max_items and len(self._items) >= self.max_items:
+            return False
+        if self.max_bytes and self._bytes + nbytes > self.max_bytes:
+            return False
+        return True
+
+    def put(self, item, block: bool = True, timeout: Optional[float] = None, nbytes: int = 0):
+        """放入条目；超限时阻塞（block=False 或超时则抛出 Full）"""
+        with self._not_full:
+            if not self._has_room(nbytes):
+                if not block:
+                    raise Full
+                start = time.monotonic()
+                deadline = None if timeout is None else start + timeout
+                while not self._has_room(nbytes):
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        self.gauge.record_blocked(time.monotonic() - start)
+                        raise Full
+                    self._not_full.wait(remaining)
+                self.gauge.record_blocked(time.monotonic() - start)
+
+            entered_at = self.gauge.enter(nbytes)
+            self._items.append((item, nbytes, entered_at))
+            self._bytes += nbytes
+            self._not_empty.notify()
+
+    def put_nowait(self, item, nbytes: int = 0):
+        self.put(item, block=False, nbytes=nbytes)
+
+    def get(self, block: bool = True, timeout: Optional[float] = None):
+        """取出条目；队列为空时阻塞（block=False 或超时则抛出 Empty）"""
+        with self._not_empty:
+            if not block:
+                if not self._items:
+                    raise Empty
+            else:
+                deadline = None if timeout is None else time.monotonic() + timeout
+                while not self._items:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        raise Empty
+                    self._not_empty.wait(remaining)
+
+            item, nbytes, entered_at = self._items.popleft()
+            self._bytes -= nbytes
+            self.gauge.exit(entered_at, nbytes)
+            self._not_full.notify_all()
+            return item
+
+    def get_nowait(self):
+        return self.get(block=False)
+
+    def qsize(self) -> int:
+        return len(self._items)
+
+    def empty(self) -> bool:
+        return not self._items
+
+    @property
+    def nbytes(self) -> int:
+        return self._bytes
+
+
+class CreditGate:
+    """
+    管道准入额度
+
+    每个在途条目按键占用一个额度；release 对同一个键是幂等的，
+    各个终点（重复、保存完成、失败）都可以放心归还。
+    """
+
+    def __init__(self, credits: int, name: str = "pipeline"):
+        self.credits = max(1, credits)
+        self.gauge = StageGauge(name)
+        self._holders: Dict[Hashable, tuple] = {}
+        self._cond = threading.Condition()
+        self.rejected = 0
+
+    def acquire(self, key: Hashable, nbytes: int = 0, timeout: Optional[float] = None) -> bool:
+        """为 key 占用一个额度；超时返回 False"""
+        with self._cond:
+            if key in self._holders:
+                return True
+            if len(self._holders) >= self.credits:
+                start = time.monotonic()
+                if not self._cond.wait_for(lambda: len(self._holders) < self.credits, timeout):
+                    self.gauge.record_blocked(time.monotonic() - start)
+                    self.rejected += 1
+                    return False
+                self.gauge.record_blocked(time.monotonic() - start)
+            self._holders[key] = (self.gauge.enter(nbytes), nbytes)
+            return True
+
+    def update(self, key: Hashable, nbytes: int):
+        """更新在途条目的字节数（截图完成后才知道实际大小）"""
+        with self._cond:
+            holder = self._holders.get(key)
+            if holder is None:
+                return
+            entered_at, old_bytes = holder
+            self._holders[key] = (entered_at, nbytes)
+            self.gauge.adjust_bytes(nbytes - old_bytes)
+
+    def release(self, key: Hashable) -> bool:
+        """归还 key 占用的额度（未占用时返回 False）"""
+        with self._cond:
+            holder = self._holders.pop(key, None)
+            if holder is None:
+                return False
+            entered_at, nbytes = holder
+            # 对额度而言"排队延迟"就是该条目在管道中的总停留时间
+            self.gauge.exit(entered_at, nbytes)
+            self._cond.notify_all()
+            return True
+
+    def wait_available(self, timeout: Optional[float] = None) -> bool:
+        """等待至少一个空闲额度（不占用）"""
+        with self._cond:
+            return self._cond.wait_for(lambda: len(self._holders) < self.credits, timeout)
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._holders)
+
+    @property
+    def pressure(self) -> float:
+        """额度占用率 0~1"""
+        return len(self._holders) / self.credits
+
+    def get_stats(self) -> dict:
+        stats = self.gauge.snapshot()
+        stats.update({
+            'credits': self.credits,
+            'in_flight': len(self._holders),
+            'pressure': self.pressure,
+            'rejected': self.rejected
+        })
+        return stats
+
+
+class ReorderBuffer:
+    """
+    按序号重排的缓冲区
+
+    多个截图线程并行完成时，结果按任务序号重新排好再交给下游，保证
+    相似度检测总是和真正的前一帧比较。序号领先下一个期望序号超过
+    window 时生产者阻塞；期望的序号迟迟不到（截图失败未上报或卡住）
+    超过 timeout 后跳过它，之后才到的条目由 put 返回 False 交给调用方处理。
+    """
+
+    def __init__(self, name: str, window: int = 32, timeout: float = 3.0, start: int = 0):
+        """
+        Args:
+            name: 阶段名称（用于指标）
+            window: 允许领先的最大序号跨度
+            timeout: 等待缺失序号的最长时间（秒）
+            start: 第一个期望序号
+        """
+        self.name = name
+        self.window = max(1, window)
+        self.timeout = timeout
+        self.gauge = StageGauge(name)
+        self._next = start
+        self._pending: Dict[int, tuple] = {}
+        self._skipped = set()
+        self._gap_since: Optional[float] = None
+        self._cond = threading.Condition()
+        self.timeouts = 0
+        self.late = 0
+        self.reordered = 0
+
+    def put(self, seq: int, item, nbytes: int = 0, timeout: Optional[float] = None) -> bool:
+        """
+        放入序号为 seq 的条目
+
+        返回 False 表示该序号已被超时跳过（条目没有进入缓冲区）。
+        领先过多时阻塞，超过 timeout 抛出 Full。
+        """
+        with self._cond:
+            if seq < self._next:
+                self.late += 1
+                return False
+            if seq >= self._next + self.window:
+                start = time.monotonic()
+                if not self._cond.wait_for(lambda: seq < self._next + self.window, timeout):
+                    self.gauge.record_blocked(time.monotonic() - start)
+                    raise Full
+                self.gauge.record_blocked(time.monotonic() - start)
+                if seq < self._next:
+                    self.late += 1
+                    return False
+
+            if seq != self._next:
+                self.reordered += 1
+            self._pending[seq] = (item, nbytes, self.gauge.enter(nbytes))
+            self._cond.notify_all()
+            return True
+
+    def skip(self, seq: int):
+        """声明序号 seq 不会到达（截图失败/准入被拒）"""
+        with self._cond:
+            if seq >= self._next and seq not in self._pending:
+                self._skipped.add(seq)
+                self._advance_skipped()
+                self._cond.notify_all()
+
+    def _advance_skipped(self):
+        while self._next in self._skipped:
+            self._skipped.discard(self._next)
+            self._next += 1
+            self._gap_since = None
+
+    def _ready(self) -> bool:
+        return self._next in self._pending
+
+    def get(self, block: bool = True, timeout: Optional[float] = None):
+        """按序号顺序取出下一个条目（没有可交付条目时抛出 Empty）"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while True:
+                self._advance_skipped()
+                if self._ready():
+                    item, nbytes, entered_at = self._pending.pop(self._next)
+                    self._next += 1
+                    self._gap_since = None
+                    self.gauge.exit(entered_at, nbytes)
+                    self._cond.notify_all()
+                    return item
+
+                now = time.monotonic()
+                if self._pending:
+                    # 后面的条目已到，期望的序号缺失：计时，超时后跳过
+                    if self._gap_since is None:
+                        self._gap_since = now
+                    elif now - self._gap_since >= self.timeout:
+                        self.timeouts += 1
+                        self._next += 1
+                        self._gap_since = None
+                        continue
+
+                if not block:
+                    raise Empty
+                remaining = None if deadline is None else deadline - now
+                if remaining is not None and remaining <= 0:
+                    raise Empty
+                wait = remaining
+                if self._gap_since is not None:
+                    gap_left = self._gap_since + self.timeout - now
+                    wait = gap_left if wait is None else min(wait, gap_left)
+                self._cond.wait(max(0.0, wait) if wait is not None else None)
+
+    def qsize(self) -> int:
+        return len(self._pending)
+
+    def empty(self) -> bool:
+        return not self._pending
+
+    @property
+    def next_seq(self) -> int:
+        """下一个期望交付的序号"""
+        return self._next
+
+    def get_stats(self) -> dict:
+        stats = self.gauge.snapshot()
+        stats.update({
+            'next_seq': self._next,
+            'window': self.window,
+            'reordered': self.reordered,
+            'timeouts': self.timeouts,
+            'late': self.late
+        })
+        return stats
+
+
+__all__ = [
+    'StageGauge',
+    'ByteBudgetQueue',
+    'CreditGate',
+    'ReorderBuffer',
+]
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+帧对象 - 截图、录屏与取证路径共享的零拷贝像素容器
+版本: 3.0.8
+
+Frame 持有一块连续的 uint8 像素缓冲区以及截图元数据（区域、时间戳、
+任务号、像素格式）。从截图后端的 BGRA 视图构造时只做一次颜色转换，
+之后哈希（memoryview）、相似度检测与编码（NumPy 视图，支持
+np.asarray）、录屏写入读取的都是同一块内存，不再 tobytes / np.array。
+
+缓冲区在构造后设为只读，证据哈希对应的字节不会被下游意外修改。
+Frame 提供 width / height / size / mode 属性，可以直接替代只读取这些
+属性的 PIL 图像使用。
+"""
+
+import hashlib
+import time
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+from PIL import Image
+
+
+# 像素格式 -> 通道数
+PIXEL_FORMATS = {'L': 1, 'RGB': 3, 'BGR': 3, 'RGBA': 4, 'BGRA': 4}
+
+# 从 BGRA 截图转换到各像素格式
+_FROM_BGRA = {
+    'RGB': cv2.COLOR_BGRA2RGB,
+    'BGR': cv2.COLOR_BGRA2BGR,
+    'RGBA': cv2.COLOR_BGRA2RGBA,
+    'L': cv2.COLOR_BGRA2GRAY,
+}
+
+# 像素格式 -> (PIL 模式, PIL raw 解码器模式)
+_PIL_MODES = {
+    'L': ('L', 'L'),
+    'RGB': ('RGB', 'RGB'),
+    'BGR': ('RGB', 'BGR'),
+    'RGBA': ('RGBA', 'RGBA'),
+    'BGRA': ('RGBA', 'BGRA'),
+}
+
+
+class Frame:
+    """一帧像素 + 元数据（缓冲区连续、只读、可共享）"""
+
+    __slots__ = ('_array', 'pixel_format', 'region', 'timestamp', 'task_id', '_pil')
+
+    def __init__(self, array: np.ndarray, pixel_format: str = 'RGB',
+                 region: Optional[Tuple[int, int, int, int]] = None,
+                 timestamp: Optional[float] = None, task_id: Optional[int] = None):
+        """
+        Args:
+            array: C 连续的 uint8 数组（HxW 或 HxWxC），Frame 直接持有不复制
+            pixel_format: 'L' / 'RGB' / 'BGR' / 'RGBA' / 'BGRA'
+            region: 截图区域 (x, y, w, h)
+            timestamp: 截图时间（time.time()，默认当前时间）
+            task_id: 截图任务号
+        """
+        pixel_format = pixel_format.upper()
+        if pixel_format not in PIXEL_FORMATS:
+            raise ValueError(f"不支持的像素格式: {pixel_format}")
+        if array.dtype != np.uint8 or not array.flags.c_contiguous:
+            raise ValueError("Frame 需要 C 连续的 uint8 数组（请使用 Frame.from_array）")
+        channels = 1 if array.ndim == 2 else array.shape[2]
+        if array.ndim not in (2, 3) or channels != PIXEL_FORMATS[pixel_format]:
+            raise ValueError(f"数组形状 {array.shape} 与像素格式 {pixel_format} 不符")
+
+        # 只读视图：不影响原数组，但经由 Frame 取得的视图都不可写
+        view = array.view()
+        view.flags.writeable = False
+        self._array = view
+        self.pixel_format = pixel_format
+        self.region = region
+        self.timestamp = time.time() if timestamp is None else timestamp
+        self.task_id = task_id
+        self._pil = None
+
+    # ---------- 构造 ----------
+
+    @classmethod
+    def from_array(cls, array: np.ndarray, pixel_format: str = 'RGB',
+                   copy: bool = False, **meta) -> 'Frame':
+        """从数组构造（不连续或 copy=True 时复制一次）"""
+        arr = np.asarray(array, dtype=np.uint8)
+        if copy:
+            arr = arr.copy()
+        elif not arr.flags.c_contiguous:
+            arr = np.ascontiguousarray(arr)
+        return cls(arr, pixel_format, **meta)
+
+    @classmethod
+    def from_bgra(cls, bgra: np.ndarray, pixel_format: str = 'RGB', **meta) -> 'Frame':
+        """
+        从截图后端的 BGRA 视图构造
+
+        只做一次颜色转换（允许视图带行尾填充），结果是 Frame 独占的连续缓冲区，
+        之后后端复用自己的缓冲区不会影响该帧。
+        """
+        pixel_format = pixel_format.upper()
+        if pixel_format == 'BGRA':
+            arr = np.array(bgra, dtype=np.uint8, order='C', copy=True)
+        else:
+            arr = cv2.cvtColor(bgra, _FROM_BGRA[pixel_format])
+        return cls(arr, pixel_format, **meta)
+
+    @classmethod
+    def from_pil(cls, image: Image.Image, **meta) -> 'Frame':
+        """从 PIL 图像构造（PIL 内部按 4 字节/像素存储，需解码复制一次）"""
+        if image.mode not in ('L', 'RGB', 'RGBA'):
+            image = image.convert('RGB')
+        return cls(np.asarray(image), image.mode, **meta)
+
+    def with_meta(self, **meta) -> 'Frame':
+        """共享同一缓冲区、替换部分元数据的新帧"""
+        values = {'region': self.region, 'timestamp': self.timestamp, 'task_id': self.task_id}
+        values.update(meta)
+        return Frame(self._array, self.pixel_format, **values)
+
+    # ---------- 视图 ----------
+
+    @property
+    def array(self) -> np.ndarray:
+        """只读 NumPy 视图（零拷贝）"""
+        return self._array
+
+    def __array__(self, dtype=None, copy=None):
+        if copy:
+            return np.array(self._array, dtype=dtype, copy=True)
+        if dtype is not None and np.dtype(dtype) != self._array.dtype:
+            return self._array.astype(dtype)
+        return self._array
+
+    def memoryview(self) -> memoryview:
+        """按字节的只读 memoryview（零拷贝，可直接交给 hashlib / 文件写入）"""
+        return memoryview(self._array).cast('B')
+
+    def to_pil(self) -> Image.Image:
+        """
+        PIL 图像（按需生成并缓存）
+
+        L / RGBA 直接映射缓冲区；RGB/BGR 在 PIL 内部是 4 字节/像素，需解码一次。
+        """
+        if self._pil is None:
+            mode, raw_mode = _PIL_MODES[self.pixel_format]
+            image = Image.frombuffer(mode, self.size, self._array, 'raw', raw_mode, 0, 1)
+            if mode == 'RGB':
+                image.load()
+            self._pil = image
+        return self._pil
+
+    def convert(self, pixel_format: str) -> 'Frame':
+        """转换像素格式（格式相同时返回自身，否则生成新缓冲区）"""
+        pixel_format = pixel_format.upper()
+        if pixel_format == self.pixel_format:
+            return self
+        source = 'GRAY' if self.pixel_format == 'L' else self.pixel_format
+        target = 'GRAY' if pixel_format == 'L' else pixel_format
+        code = getattr(cv2, f"COLOR_{source}2{target}")
+        return Frame(cv2.cvtColor(self._array, code), pixel_format,
+                     region=self.region, timestamp=self.timestamp, task_id=self.task_id)
+
+    def tobytes(self) -> bytes:
+        """像素字节串（会复制，仅用于兼容需要 bytes 的接口）"""
+        return self._array.tobytes()
+
+    # ---------- 哈希 ----------
+
+    def digest(self, algorithm: str = 'sha256') -> str:
+        """像素缓冲区的哈希（十六进制），直接读取缓冲区不复制"""
+        hasher = hashlib.new(algorithm)
+        hasher.update(self.memoryview())
+        return hasher.hexdigest()
+
+    def sha256(self) -> str:
+        return self.digest('sha256')
+
+    # ---------- 属性 ----------
+
+    @property
+    def width(self) -> int:
+        return self._array.shape[1]
+
+    @property
+    def height(self) -> int:
+        return self._array.shape[0]
+
+    @property
+    def size(self) -> Tuple[int, int]:
+        """(宽, 高)，与 PIL 一致"""
+        return self._array.shape[1], self._array.shape[0]
+
+    @property
+    def shape(self) -> tuple:
+        return self._array.shape
+
+    @property
+    def channels(self) -> int:
+        return PIXEL_FORMATS[self.pixel_format]
+
+    @property
+    def mode(self) -> str:
+        """对应的 PIL 模式"""
+        return _PIL_MODES[self.pixel_format][0]
+
+    @property
+    def nbytes(self) -> int:
+        return self._array.nbytes
+
+    def __repr__(self) -> str:
+        return (f"Frame({self.width}x{self.height} {self.pixel_format}, "
+                f"task_id={self.task_id}, region={self.region})")
+
+
+def pixel_digest(image, algorithm: str = 'sha256') -> str:
+    """
+    图像像素字节的哈希
+
+    Frame / NumPy 数组直接读取缓冲区；PIL 图像没有可共享的连续缓冲区，
+    退回 tobytes。RGB 帧与同内容 RGB PIL 图像的结果相同。
+    """
+    if isinstance(image, Frame):
+        return image.digest(algorithm)
+    hasher = hashlib.new(algorithm)
+    if isinstance(image, np.ndarray):
+        hasher.update(memoryview(np.ascontiguousarray(image)).cast('B'))
+    else:
+        hasher.update(image.tobytes())
+    return hasher.hexdigest()
+
+
+__all__ = [
+    'PIXEL_FORMATS',
+    'Frame',
+    'pixel_digest',
+]
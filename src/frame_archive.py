@@ -0,0 +1,413 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+帧归档 - 按内容寻址、分块去重的滚动截图存储
+版本: 3.0.8
+
+连续的滚动截图绝大部分像素相同，只是上下平移。归档把每帧切成
+"行带 x 列块"的小块：行带边界由行签名决定（内容定义切分，内容平移后
+边界随内容一起平移），列块按固定宽度切分（侧栏、标题栏等静止区域
+单独成块）。每个小块以 SHA-256 寻址，只有第一次出现时才压缩写盘；
+每帧一份清单记录小块位置和整帧的 SHA-256，可逐像素无损还原并校验。
+
+所有数据只追加写入三个文件（避免海量小文件占用文件系统块）:
+    <root>/tiles.pack        zlib 压缩的小块原始像素，顺序拼接
+    <root>/tiles.idx         定长索引记录: SHA-256 摘要 + 偏移 + 长度
+    <root>/manifests.jsonl   每帧一行清单（按写入顺序）
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import struct
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional, Union
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from frame import Frame
+from long_image_stitcher import compute_row_signatures
+
+
+ARCHIVE_VERSION = 1
+
+# 行签名混合常数（splitmix64）
+_MIX_A = np.uint64(0x9E3779B97F4A7C15)
+_MIX_B = np.uint64(0xBF58476D1CE4E5B9)
+
+# tiles.idx 记录: 32 字节摘要 + 8 字节偏移 + 4 字节长度
+_INDEX_RECORD = struct.Struct('>32sQI')
+
+
+@dataclass
+class ArchivedFrame:
+    """写入归档的一帧"""
+    frame_id: str
+    sha256: str             # 整帧 RGB 原始像素的 SHA-256
+    tiles: int              # 小块总数
+    new_tiles: int          # 本帧新写入的小块数
+    raw_bytes: int          # 原始像素字节数
+    stored_bytes: int       # 本帧实际写盘的字节数（压缩后）
+
+
+def tile_hash(tile: np.ndarray) -> str:
+    """小块的内容地址：形状 + 原始像素的 SHA-256"""
+    digest = hashlib.sha256(f"{tile.shape[0]}x{tile.shape[1]}x{tile.shape[2]}:".encode())
+    digest.update(np.ascontiguousarray(tile).data)
+    return digest.hexdigest()
+
+
+def frame_hash(rgb: np.ndarray) -> str:
+    """整帧 RGB 原始像素的 SHA-256（与还原后的帧逐字节对应）"""
+    return hashlib.sha256(np.ascontiguousarray(rgb).data).hexdigest()
+
+
+def content_defined_bands(signatures: np.ndarray, min_band: int = 8,
+                          max_band: int = 128, divisor: int = 8) -> List[int]:
+    """
+    按行签名切分行带，返回各行带的起始行（末尾附总行数）
+
+    内容发生变化的行（签名与上一行不同）中，(上一行, 本行) 签名混合后
+    满足 mix % divisor == 0 的行作为候选边界，再按最小/最大行带高度约束
+    贪心取舍。边界只取决于局部内容，内容上下平移时随内容一起平移。
+    """
+    height = len(signatures)
+    previous = np.zeros_like(signatures)
+    previous[1:] = signatures[:-1]
+    with np.errstate(over='ignore'):
+        mixed = (signatures ^ (previous * _MIX_A)) * _MIX_B
+    candidates = np.flatnonzero(((mixed >> np.uint64(40)) % np.uint64(divisor) == 0)
+                                & (signatures != previous))
+
+    bounds = [0]
+    for row in candidates:
+        row = int(row)
+        while row - bounds[-1] > max_band:
+            bounds.append(bounds[-1] + max_band)
+        if row - bounds[-1] >= min_band:
+            bounds.append(row)
+    while height - bounds[-1] > max_band:
+        bounds.append(bounds[-1] + max_band)
+    if bounds[-1] != height:
+        bounds.append(height)
+    return bounds
+
+
+class FrameArchive:
+    """内容寻址的帧归档"""
+
+    PACK_NAME = 'tiles.pack'
+    INDEX_NAME = 'tiles.idx'
+    MANIFEST_NAME = 'manifests.jsonl'
+
+    def __init__(self, root: str, tile_width: int = 256, min_band: int = 8,
+                 max_band: int = 128, compress_level: int = 1):
+        """
+        Args:
+            root: 归档目录
+            tile_width: 列块宽度
+            min_band/max_band: 行带高度范围
+            compress_level: 小块 zlib 压缩级别
+        """
+        self.root = root
+        self.tile_width = tile_width
+        self.min_band = min_band
+        self.max_band = max_band
+        self.compress_level = compress_level
+        os.makedirs(root, exist_ok=True)
+
+        self.pack_path = os.path.join(root, self.PACK_NAME)
+        self.index_path = os.path.join(root, self.INDEX_NAME)
+        self.manifest_path = os.path.join(root, self.MANIFEST_NAME)
+
+        self._lock = threading.Lock()
+        self._objects: Dict[bytes, tuple] = {}     # 摘要 -> (偏移, 长度)
+        self._manifests: Dict[str, int] = {}       # frame_id -> 清单行偏移
+        self._load()
+
+        self._pack = open(self.pack_path, 'ab')
+        self._index = open(self.index_path, 'ab')
+        self._manifest_log = open(self.manifest_path, 'ab')
+        self._reader = None
+        self._pending_index: List[bytes] = []
+        self.stats = {
+            'frames': 0,
+            'tiles': 0,
+            'new_tiles': 0,
+            'raw_bytes': 0,
+            'stored_bytes': 0,
+            'write_time': 0.0
+        }
+
+    def _load(self):
+        """载入小块索引和清单位置（截掉崩溃留下的不完整尾部记录）"""
+        pack_size = os.path.getsize(self.pack_path) if os.path.exists(self.pack_path) else 0
+        if os.path.exists(self.index_path):
+            with open(self.index_path, 'rb') as f:
+                data = f.read()
+            usable = len(data) - len(data) % _INDEX_RECORD.size
+            for digest, offset, length in _INDEX_RECORD.iter_unpack(data[:usable]):
+                if offset + length <= pack_size:
+                    self._objects[digest] = (offset, length)
+            if usable < len(data):
+                # 截掉不完整的尾部记录，否则续写的索引记录会整体错位
+                with open(self.index_path, 'r+b') as f:
+                    f.truncate(usable)
+
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, 'rb') as f:
+                offset = 0
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        break
+                    try:
+                        self._manifests[json.loads(line)['frame_id']] = offset
+                    except (ValueError, KeyError):
+                        pass
+                    offset += len(line)
+            if offset < os.path.getsize(self.manifest_path):
+                # 截到最后一个换行，否则续写的第一条清单会粘在残行后面
+                with open(self.manifest_path, 'r+b') as f:
+                    f.truncate(offset)
+
+    def _write_object(self, digest: bytes, tile: np.ndarray) -> int:
+        """压缩小块并追加到打包文件，返回写入字节数"""
+        data = zlib.compress(np.ascontiguousarray(tile).data, self.compress_level)
+        offset = self._pack.tell()
+        self._pack.write(data)
+        self._pending_index.append(_INDEX_RECORD.pack(digest, offset, len(data)))
+        self._objects[digest] = (offset, len(data))
+        return len(data)
+
+    @staticmethod
+    def _to_rgb(frame: Union[Image.Image, np.ndarray, Frame]) -> np.ndarray:
+        if isinstance(frame, Frame):
+            return frame.convert('RGB').array
+        if isinstance(frame, Image.Image):
+            return np.asarray(frame.convert('RGB') if frame.mode != 'RGB' else frame)
+        arr = np.asarray(frame)
+        if arr.ndim != 3 or arr.shape[2] != 3:
+            raise ValueError(f"需要 HxWx3 的 RGB 数组: {arr.shape}")
+        return arr
+
+    def add_frame(self, frame: Union[Image.Image, np.ndarray, Frame], frame_id: str,
+                  metadata: Optional[dict] = None,
+                  signatures: Optional[np.ndarray] = None) -> ArchivedFrame:
+        """
+        归档一帧
+
+        Args:
+            frame: RGB PIL 图像、HxWx3 数组或 Frame
+            frame_id: 帧标识（归档内唯一）
+            metadata: 附加到清单的元数据
+            signatures: 已算好的行签名（可选）
+        """
+        start = time.perf_counter()
+        rgb = self._to_rgb(frame)
+        height, width = rgb.shape[:2]
+
+        if signatures is None:
+            signatures = compute_row_signatures(cv2.cvtColor(np.ascontiguousarray(rgb),
+                                                             cv2.COLOR_RGB2GRAY))
+        bounds = content_defined_bands(signatures, self.min_band, self.max_band)
+        columns = list(range(0, width, self.tile_width)) + [width]
+
+        # 哈希计算不需要持锁
+        bands = []
+        for top, bottom in zip(bounds[:-1], bounds[1:]):
+            bands.append([top, bottom - top, [
+                (tile_hash(rgb[top:bottom, left:right]), left, right)
+                for left, right in zip(columns[:-1], columns[1:])
+            ]])
+        digest = frame_hash(rgb)
+
+        new_tiles = 0
+        stored = 0
+        with self._lock:
+            if frame_id in self._manifests:
+                raise ValueError(f"帧标识已存在: {frame_id}")
+
+            self._pending_index.clear()
+            for top, band_height, tiles in bands:
+                for i, (address, left, right) in enumerate(tiles):
+                    key = bytes.fromhex(address)
+                    if key not in self._objects:
+                        stored += self._write_object(key, rgb[top:top + band_height, left:right])
+                        new_tiles += 1
+                    tiles[i] = address
+            # 先落盘小块数据，再写索引和清单，崩溃时索引不会指向不存在的数据
+            self._pack.flush()
+            if self._pending_index:
+                self._index.write(b''.join(self._pending_index))
+                self._index.flush()
+                stored += len(self._pending_index) * _INDEX_RECORD.size
+
+            manifest = {
+                'version': ARCHIVE_VERSION,
+                'frame_id': frame_id,
+                'width': width,
+                'height': height,
+                'mode': 'RGB',
+                'sha256': digest,
+                'created_at': time.time(),
+                'tile_width': self.tile_width,
+                'bands': bands,
+                'metadata': metadata or {}
+            }
+            line = (json.dumps(manifest, ensure_ascii=False, separators=(',', ':'))
+                    + '\n').encode('utf-8')
+            self._manifests[frame_id] = self._manifest_log.tell()
+            self._manifest_log.write(line)
+            self._manifest_log.flush()
+            stored += len(line)
+
+            tile_count = len(bands) * (len(columns) - 1)
+            self.stats['frames'] += 1
+            self.stats['tiles'] += tile_count
+            self.stats['new_tiles'] += new_tiles
+            self.stats['raw_bytes'] += rgb.nbytes
+            self.stats['stored_bytes'] += stored
+            self.stats['write_time'] += time.perf_counter() - start
+
+        return ArchivedFrame(frame_id, digest, tile_count, new_tiles, rgb.nbytes, stored)
+
+    def __contains__(self, frame_id: str) -> bool:
+        return frame_id in self._manifests
+
+    def __len__(self) -> int:
+        return len(self._manifests)
+
+    def _read(self, offset: int, length: int) -> bytes:
+        if self._reader is None:
+            self._reader = open(self.pack_path, 'rb')
+        self._reader.seek(offset)
+        return self._reader.read(length)
+
+    def load_manifest(self, frame_id: str) -> dict:
+        """读取一帧的清单"""
+        with self._lock:
+            offset = self._manifests[frame_id]
+        with open(self.manifest_path, 'rb') as f:
+            f.seek(offset)
+            return json.loads(f.readline())
+
+    def reconstruct(self, frame_id: str, verify: bool = True) -> np.ndarray:
+        """
+        还原一帧为 HxWx3 RGB 数组
+
+        verify 为 True 时校验每个小块的地址以及整帧 SHA-256，不符时抛出 ValueError。
+        """
+        manifest = self.load_manifest(frame_id)
+        width = manifest['width']
+        tile_width = manifest['tile_width']
+        rgb = np.empty((manifest['height'], width, 3), dtype=np.uint8)
+
+        with self._lock:
+            self._pack.flush()
+            for top, band_height, addresses in manifest['bands']:
+                for i, address in enumerate(addresses):
+                    left = i * tile_width
+                    right = min(width, left + tile_width)
+                    location = self._objects.get(bytes.fromhex(address))
+                    if location is None:
+                        raise ValueError(f"缺少小块: {address}")
+                    tile = np.frombuffer(zlib.decompress(self._read(*location)), dtype=np.uint8)
+                    tile = tile.reshape(band_height, right - left, 3)
+                    if verify and tile_hash(tile) != address:
+                        raise ValueError(f"小块内容与地址不符: {address}")
+                    rgb[top:top + band_height, left:right] = tile
+
+        if verify and frame_hash(rgb) != manifest['sha256']:
+            raise ValueError(f"帧哈希校验失败: {frame_id}")
+        return rgb
+
+    def export_frame(self, frame_id: str, path: str, codec=None) -> str:
+        """还原一帧并用指定编码器（默认 PNG）写出"""
+        from image_codecs import get_codec
+        codec = get_codec(codec or 'balanced')
+        codec.save(self.reconstruct(frame_id), path)
+        return path
+
+    def iter_frame_ids(self) -> Iterator[str]:
+        """按写入顺序遍历帧标识"""
+        with self._lock:
+            frame_ids = sorted(self._manifests, key=self._manifests.get)
+        return iter(frame_ids)
+
+    def verify_all(self) -> Dict[str, bool]:
+        """逐帧还原并校验，返回 {frame_id: 是否通过}"""
+        results = {}
+        for frame_id in self.iter_frame_ids():
+            try:
+                self.reconstruct(frame_id, verify=True)
+                results[frame_id] = True
+            except (OSError, ValueError, zlib.error) as e:
+                print(f"❌ 归档帧校验失败 {frame_id}: {e}")
+                results[frame_id] = False
+        return results
+
+    def get_stats(self) -> dict:
+        """归档统计（本次会话）"""
+        with self._lock:
+            stats = dict(self.stats)
+            stats['objects'] = len(self._objects)
+            stats['archived_frames'] = len(self._manifests)
+        stats['dedup_ratio'] = (1 - stats['new_tiles'] / stats['tiles']) if stats['tiles'] else 0.0
+        stats['storage_ratio'] = (stats['stored_bytes'] / stats['raw_bytes']
+                                  if stats['raw_bytes'] else 0.0)
+        return stats
+
+    def close(self):
+        """关闭归档文件"""
+        with self._lock:
+            for handle in (self._pack, self._index, self._manifest_log, self._reader):
+                if handle is not None and not handle.closed:
+                    handle.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="帧归档校验/导出")
+    parser.add_argument('root', help="归档目录")
+    parser.add_argument('command', choices=['verify', 'export', 'list'])
+    parser.add_argument('--output', help="export 的输出目录")
+    parser.add_argument('--preset', default='balanced', help="export 的编码预设")
+    args = parser.parse_args()
+
+    archive = FrameArchive(args.root)
+    if args.command == 'list':
+        for frame_id in archive.iter_frame_ids():
+            manifest = archive.load_manifest(frame_id)
+            print(f"{frame_id}  {manifest['width']}x{manifest['height']}  {manifest['sha256']}")
+    elif args.command == 'verify':
+        results = archive.verify_all()
+        passed = sum(results.values())
+        print(f"🔍 校验完成: {passed}/{len(results)} 帧通过")
+    else:
+        from image_codecs import get_codec
+        output = args.output or os.path.join(args.root, 'export')
+        os.makedirs(output, exist_ok=True)
+        codec = get_codec(args.preset)
+        for frame_id in archive.iter_frame_ids():
+            archive.export_frame(frame_id, os.path.join(output, frame_id + codec.extension), codec)
+        print(f"📤 已导出到: {output}")
+    archive.close()
+
+
+__all__ = [
+    'ARCHIVE_VERSION',
+    'ArchivedFrame',
+    'FrameArchive',
+    'content_defined_bands',
+    'tile_hash',
+    'frame_hash',
+]
+
+
+if __name__ == "__main__":
+    main()
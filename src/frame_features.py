@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+帧特征记录 - 截图时计算一次，随帧在各处理队列之间传递
+版本: 3.0.8
+
+相似度检测、长图拼接都需要同一帧的灰度图、缩略图和哈希。
+FrameFeatures 在捕获线程中一次性算好，之后的每次比较直接复用，
+上一帧的特征也不必在下一次比较时重新计算。
+"""
+
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Tuple, Union
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from frame import Frame
+from image_hashing import ImageHashes, hash_thumbnails, prepare_gray
+from long_image_stitcher import compute_row_signatures
+
+
+@dataclass
+class FrameFeatures:
+    """一帧截图的特征"""
+    hashes: ImageHashes            # aHash / dHash / pHash
+    thumbnail: np.ndarray          # 32x32 float32 灰度缩略图（哈希共用）
+    gray: np.ndarray               # 原尺寸 uint8 灰度图
+    row_signatures: np.ndarray     # 每行 64 位签名（拼接重叠检测用）
+    compute_time: float = 0.0      # 特征计算耗时（秒）
+    _resized: Dict[Tuple[int, int], np.ndarray] = field(default_factory=dict, repr=False)
+
+    @property
+    def size(self) -> Tuple[int, int]:
+        """原图尺寸 (宽, 高)"""
+        return self.gray.shape[1], self.gray.shape[0]
+
+    @property
+    def nbytes(self) -> int:
+        """特征占用的字节数（缓存预算用）"""
+        return (self.gray.nbytes + self.row_signatures.nbytes + self.thumbnail.nbytes +
+                sum(arr.nbytes for arr in self._resized.values()))
+
+    def resized(self, size: Tuple[int, int]) -> np.ndarray:
+        """按需生成并缓存指定尺寸的 float32 灰度缩略图"""
+        arr = self._resized.get(size)
+        if arr is None:
+            arr = cv2.resize(self.gray, size, interpolation=cv2.INTER_AREA).astype(np.float32)
+            self._resized[size] = arr
+        return arr
+
+
+def to_gray(image: Union[Image.Image, np.ndarray, Frame], pixel_format: str = 'RGB') -> np.ndarray:
+    """把 PIL 图像、Frame 或 RGB/BGR(A) 数组转换为 uint8 灰度数组"""
+    if isinstance(image, Image.Image):
+        return np.asarray(image.convert('L'))
+    if isinstance(image, Frame):
+        # Frame 自带像素格式，直接读取其缓冲区
+        pixel_format = image.pixel_format
+        if pixel_format == 'L':
+            return image.array
+
+    arr = np.asarray(image)
+    if arr.ndim == 2:
+        return arr
+    code = {
+        'RGB': cv2.COLOR_RGB2GRAY,
+        'RGBA': cv2.COLOR_RGBA2GRAY,
+        'BGR': cv2.COLOR_BGR2GRAY,
+        'BGRA': cv2.COLOR_BGRA2GRAY,
+    }[pixel_format.upper()]
+    if arr.shape[2] == 4 and code in (cv2.COLOR_RGB2GRAY, cv2.COLOR_BGR2GRAY):
+        arr = arr[:, :, :3]
+    return cv2.cvtColor(np.ascontiguousarray(arr), code)
+
+
+def extract_features(image: Union[Image.Image, np.ndarray, Frame],
+                     pixel_format: str = 'RGB') -> FrameFeatures:
+    """计算一帧的全部特征（Frame 输入忽略 pixel_format）"""
+    start = time.perf_counter()
+    gray = to_gray(image, pixel_format)
+    thumbnail = prepare_gray(gray)
+    row = hash_thumbnails(thumbnail)[0]
+    return FrameFeatures(
+        hashes=ImageHashes(int(row[0]), int(row[1]), int(row[2])),
+        thumbnail=thumbnail,
+        gray=gray,
+        row_signatures=compute_row_signatures(gray),
+        compute_time=time.perf_counter() - start
+    )
+
+
+__all__ = [
+    'FrameFeatures',
+    'to_gray',
+    'extract_features',
+]
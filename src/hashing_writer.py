@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+哈希写入器 - 编码写盘的同时计算文件摘要
+版本: 3.0.8
+
+证据截图原来的流程是：编码写入 PNG，再重新打开文件按 4KB 分块计算
+SHA-256，每一帧的磁盘 I/O 翻倍。HashingWriter 包装目标文件，编码器
+每写出一段字节就同时更新摘要（SHA-256，可选 SHA-512 / SM3 等
+hashlib 支持的算法），写完后只 fsync 一次，摘要和文件大小直接写入
+证据记录，不再回读文件。
+
+注意: HashingWriter 不提供 fileno()，Pillow 因此会通过 write() 输出
+编码数据，而不是绕过包装直接写文件描述符。
+"""
+
+import hashlib
+import io
+import os
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, Optional
+
+DEFAULT_ALGORITHMS = ('sha256',)
+
+
+def check_algorithms(algorithms: Iterable[str]) -> tuple:
+    """规范化算法名并检查当前 hashlib/OpenSSL 是否支持"""
+    names = tuple(dict.fromkeys(name.lower() for name in algorithms))
+    missing = [name for name in names if name not in hashlib.algorithms_available]
+    if missing:
+        raise ValueError(f"当前环境不支持的哈希算法: {', '.join(missing)}")
+    return names
+
+
+@dataclass
+class HashedFile:
+    """写入完成的文件及其摘要"""
+    path: str
+    size: int
+    digests: Dict[str, str] = field(default_factory=dict)
+    fsynced: bool = False
+
+    @property
+    def sha256(self) -> Optional[str]:
+        return self.digests.get('sha256')
+
+
+class HashingWriter:
+    """边写边算摘要的二进制文件写入器（仅支持顺序写入）"""
+
+    def __init__(self, path: str, algorithms: Iterable[str] = DEFAULT_ALGORITHMS,
+                 fsync: bool = True, buffering: int = 1024 * 1024):
+        """
+        Args:
+            path: 目标文件路径
+            algorithms: 摘要算法（hashlib 名称，如 'sha256'、'sha512'、'sm3'）
+            fsync: 关闭前是否 fsync
+            buffering: 底层文件缓冲区大小
+        """
+        self.path = str(path)
+        self.algorithms = check_algorithms(algorithms)
+        self.fsync = fsync
+        self._hashers = {name: hashlib.new(name) for name in self.algorithms}
+        self._file = open(self.path, 'wb', buffering=buffering)
+        self._size = 0
+        self._result: Optional[HashedFile] = None
+
+    def write(self, data) -> int:
+        view = memoryview(data).cast('B')
+        for hasher in self._hashers.values():
+            hasher.update(view)
+        self._file.write(view)
+        self._size += len(view)
+        return len(view)
+
+    def tell(self) -> int:
+        return self._size
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        raise io.UnsupportedOperation("HashingWriter 只支持顺序写入")
+
+    def seekable(self) -> bool:
+        return False
+
+    def writable(self) -> bool:
+        return True
+
+    def flush(self):
+        self._file.flush()
+
+    @property
+    def closed(self) -> bool:
+        return self._file.closed
+
+    def close(self) -> HashedFile:
+        """刷新、fsync（一次）并关闭，返回摘要结果"""
+        if self._result is None:
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+            self._file.close()
+            self._result = HashedFile(
+                path=self.path,
+                size=self._size,
+                digests={name: hasher.hexdigest() for name, hasher in self._hashers.items()},
+                fsynced=self.fsync
+            )
+        return self._result
+
+    def abort(self):
+        """放弃写入并删除不完整的文件"""
+        if not self._file.closed:
+            self._file.close()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+    @property
+    def result(self) -> Optional[HashedFile]:
+        """close() 之后的摘要结果"""
+        return self._result
+
+
+def write_hashed(path: str, writer: Callable, algorithms: Iterable[str] = DEFAULT_ALGORITHMS,
+                 fsync: bool = True) -> HashedFile:
+    """
+    调用 writer(fp) 写出文件，同时计算摘要
+
+    writer 抛出异常时删除不完整的文件并重新抛出。
+    """
+    with HashingWriter(path, algorithms, fsync=fsync) as fp:
+        writer(fp)
+    return fp.result
+
+
+__all__ = [
+    'DEFAULT_ALGORITHMS',
+    'HashedFile',
+    'HashingWriter',
+    'check_algorithms',
+    'write_hashed',
+]
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+图像编码器 - 截图输出格式与速度/体积预设
+版本: 3.0.8
+
+统一的编码器接口：PNG（可调压缩级别）、WebP（无损/有损）、JPEG，
+以及 QOI 格式的快速无损容器。预设:
+
+    fastest   PNG 压缩级别 1，不做 optimize
+    raw       QOI 容器（只用 RGB/RUN 两种操作，NumPy 向量化编码）
+    balanced  PNG 压缩级别 6，不做 optimize（Pillow 默认）
+    smallest  WebP 无损 method 2（Pillow 不支持 WebP 时退回 PNG 9 + optimize）
+
+所有编码器都支持写入文件对象；save_hashed 经 HashingWriter 在写盘的
+同时计算哈希。
+"""
+
+import io
+import os
+import struct
+from dataclasses import dataclass
+from typing import BinaryIO, Dict, Optional, Union
+
+import numpy as np
+from PIL import Image, features
+
+from frame import Frame
+from hashing_writer import DEFAULT_ALGORITHMS, HashedFile, write_hashed
+
+
+ImageLike = Union[Image.Image, np.ndarray, Frame]
+
+
+def _to_pil(image: ImageLike) -> Image.Image:
+    """数组输入按通道数解释为 L / RGB / RGBA；Frame 按自身像素格式解释"""
+    if isinstance(image, Image.Image):
+        return image
+    if isinstance(image, Frame):
+        return image.to_pil()
+    return Image.fromarray(np.ascontiguousarray(image))
+
+
+@dataclass(frozen=True)
+class ImageCodec:
+    """编码器基类（不可变，可安全地传给编码子进程）"""
+    name: str = "base"
+    extension: str = ".bin"
+    lossless: bool = True
+
+    def encode(self, image: ImageLike, fp: BinaryIO):
+        """把图像编码写入二进制文件对象"""
+        raise NotImplementedError
+
+    def encode_bytes(self, image: ImageLike) -> bytes:
+        """编码为字节串"""
+        buffer = io.BytesIO()
+        self.encode(image, buffer)
+        return buffer.getvalue()
+
+    def save(self, image: ImageLike, path: str) -> int:
+        """编码并写入文件，返回写入的字节数"""
+        with open(path, 'wb') as fp:
+            self.encode(image, fp)
+            return fp.tell()
+
+    def save_hashed(self, image: ImageLike, path: str,
+                    algorithms=DEFAULT_ALGORITHMS, fsync: bool = True) -> HashedFile:
+        """编码写入文件，写盘的同时计算摘要（不回读文件）"""
+        return write_hashed(path, lambda fp: self.encode(image, fp), algorithms, fsync=fsync)
+
+    def with_extension(self, path: str) -> str:
+        """把路径的扩展名替换为本编码器的扩展名"""
+        return os.path.splitext(path)[0] + self.extension
+
+
+@dataclass(frozen=True)
+class PNGCodec(ImageCodec):
+    """PNG 编码器"""
+    name: str = "png"
+    extension: str = ".png"
+    compress_level: int = 6
+    optimize: bool = False
+
+    def encode(self, image: ImageLike, fp: BinaryIO):
+        _to_pil(image).save(fp, 'PNG', compress_level=self.compress_level,
+                            optimize=self.optimize)
+
+
+@dataclass(frozen=True)
+class WebPCodec(ImageCodec):
+    """WebP 编码器（无损时 quality 表示压缩力度）"""
+    name: str = "webp"
+    extension: str = ".webp"
+    quality: int = 100
+    method: int = 6
+
+    def encode(self, image: ImageLike, fp: BinaryIO):
+        _to_pil(image).save(fp, 'WEBP', lossless=self.lossless,
+                            quality=self.quality, method=self.method)
+
+
+@dataclass(frozen=True)
+class JPEGCodec(ImageCodec):
+    """JPEG 编码器（有损，仅用于非取证场景）"""
+    name: str = "jpeg"
+    extension: str = ".jpg"
+    lossless: bool = False
+    quality: int = 95
+
+    def encode(self, image: ImageLike, fp: BinaryIO):
+        image = _to_pil(image)
+        if image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        image.save(fp, 'JPEG', quality=self.quality)
+
+
+# ===================== QOI 容器 =====================
+
+_QOI_MAGIC = b'qoif'
+_QOI_OP_RGB = 0xFE
+_QOI_OP_RUN = 0xC0
+_QOI_RUN_MAX = 62
+_QOI_END = b'\x00' * 7 + b'\x01'
+
+
+def encode_qoi(image: ImageLike) -> bytes:
+    """
+    编码为 QOI 文件
+
+    只使用 QOI_OP_RGB 和 QOI_OP_RUN 两种操作：二者只依赖"上一个像素"，
+    可以完全向量化；聊天截图的大片纯色背景由 RUN 压缩。输出是标准 QOI，
+    任何 QOI 解码器（包括 Pillow）都能读取。
+    """
+    image = _to_pil(image)
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    width, height = image.size
+
+    # RGBX 每像素 4 字节，可直接按 uint32 比较相邻像素
+    raw = np.frombuffer(image.tobytes('raw', 'RGBX'), dtype=np.uint8).reshape(-1, 4)
+    packed = raw.view('<u4').ravel() & np.uint32(0x00FFFFFF)
+    count = len(packed)
+
+    # 与前一个像素不同的位置输出 QOI_OP_RGB（初始前像素为黑色）
+    changed = np.empty(count, dtype=bool)
+    changed[0] = packed[0] != 0
+    np.not_equal(packed[1:], packed[:-1], out=changed[1:])
+    literals = np.flatnonzero(changed)
+
+    # 第 k 个字面像素之前的游程长度，以及末尾的游程
+    bounds = np.concatenate(([-1], literals, [count]))
+    run_lengths = np.diff(bounds) - 1
+    run_bytes = -(-run_lengths // _QOI_RUN_MAX)
+
+    # 每段 = 游程字节 + 4 字节字面像素（最后一段没有字面像素）
+    segment_sizes = run_bytes.copy()
+    segment_sizes[:-1] += 4
+    segment_starts = np.cumsum(segment_sizes) - segment_sizes
+
+    # 游程字节默认填满 62（0xC0 | 61），每段最后一个游程字节写入余数
+    body = np.full(int(segment_sizes.sum()), _QOI_OP_RUN | (_QOI_RUN_MAX - 1), dtype=np.uint8)
+    has_run = run_bytes > 0
+    last_run = segment_starts[has_run] + run_bytes[has_run] - 1
+    remainder = run_lengths[has_run] - (run_bytes[has_run] - 1) * _QOI_RUN_MAX
+    body[last_run] = _QOI_OP_RUN | (remainder - 1)
+
+    literal_at = segment_starts[:-1] + run_bytes[:-1]
+    body[literal_at] = _QOI_OP_RGB
+    rgb = raw[literals]
+    body[literal_at + 1] = rgb[:, 0]
+    body[literal_at + 2] = rgb[:, 1]
+    body[literal_at + 3] = rgb[:, 2]
+
+    header = _QOI_MAGIC + struct.pack('>IIBB', width, height, 3, 0)
+    return header + body.tobytes() + _QOI_END
+
+
+@dataclass(frozen=True)
+class QOICodec(ImageCodec):
+    """QOI 无损容器（编码最快，体积介于原始数据与 PNG 之间）"""
+    name: str = "qoi"
+    extension: str = ".qoi"
+
+    def encode(self, image: ImageLike, fp: BinaryIO):
+        fp.write(encode_qoi(image))
+
+
+# ===================== 预设 =====================
+
+WEBP_AVAILABLE = features.check('webp')
+
+CODEC_PRESETS: Dict[str, ImageCodec] = {
+    'fastest': PNGCodec(compress_level=1, optimize=False),
+    'raw': QOICodec(),
+    'balanced': PNGCodec(compress_level=6, optimize=False),
+    'smallest': (WebPCodec(lossless=True, quality=100, method=2) if WEBP_AVAILABLE
+                 else PNGCodec(compress_level=9, optimize=True)),
+}
+
+
+def get_codec(preset: Union[str, ImageCodec]) -> ImageCodec:
+    """按预设名获取编码器（传入编码器对象时原样返回）"""
+    if isinstance(preset, ImageCodec):
+        return preset
+    try:
+        return CODEC_PRESETS[preset]
+    except KeyError:
+        raise ValueError(f"未知的编码预设: {preset}（可选: {', '.join(CODEC_PRESETS)}）")
+
+
+def codec_from_settings(image_format: str = "png", image_quality: int = 95,
+                        preset: Optional[str] = None) -> ImageCodec:
+    """
+    根据配置项（AppConfig.image_format / image_quality / image_codec_preset）选择编码器
+
+    指定预设时优先使用预设；否则按格式选择，WebP/JPEG 的 quality 取 image_quality，
+    image_quality 为 100 的 WebP 使用无损模式。
+    """
+    if preset:
+        return get_codec(preset)
+
+    fmt = image_format.lower().lstrip('.')
+    if fmt == 'png':
+        return CODEC_PRESETS['balanced']
+    if fmt == 'qoi':
+        return QOICodec()
+    if fmt == 'webp':
+        if not WEBP_AVAILABLE:
+            raise ValueError("当前 Pillow 不支持 WebP")
+        return WebPCodec(lossless=image_quality >= 100, quality=image_quality)
+    if fmt in ('jpg', 'jpeg'):
+        return JPEGCodec(quality=image_quality)
+    raise ValueError(f"不支持的图片格式: {image_format}")
+
+
+__all__ = [
+    'ImageCodec',
+    'PNGCodec',
+    'WebPCodec',
+    'JPEGCodec',
+    'QOICodec',
+    'encode_qoi',
+    'WEBP_AVAILABLE',
+    'CODEC_PRESETS',
+    'get_codec',
+    'codec_from_settings',
+]
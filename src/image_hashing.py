@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+感知哈希 - 向量化的 aHash / dHash / pHash
+版本: 3.0.8
+
+三种哈希共用一张 32x32 灰度缩略图：先在原图上按规则网格取样
+（32 x 4 = 128 个采样点/边，PIL 用 NEAREST，NumPy 直接花式索引），
+再按 4x4 块求均值。整个过程只读取约 1.6 万个像素，4K 区域的
+哈希计算也在 1 毫秒以内。哈希位通过 np.packbits 打包为 uint64，
+批量接口一次处理多帧。
+"""
+
+from dataclasses import dataclass
+from typing import Iterable, List, Sequence, Union
+
+import numpy as np
+from PIL import Image
+
+
+HASH_SIZE = 8          # 哈希边长（8x8 = 64 位）
+THUMB_SIZE = 32        # 共享灰度缩略图边长
+OVERSAMPLE = 4         # 每个缩略图像素对应的采样点（每边）
+
+# ITU-R 601 亮度权重，与 PIL convert('L') 一致
+_LUMA_RGB = np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+# dHash 需要 8x9 网格：把 32 列划分为 9 个不等宽的列组
+_DHASH_EDGES = np.linspace(0, THUMB_SIZE, HASH_SIZE + 2).astype(np.intp)
+_DHASH_WIDTHS = np.diff(_DHASH_EDGES).astype(np.float32)
+
+# 8 位查找表，用于没有 np.bitwise_count 的 NumPy 版本
+_POPCOUNT8 = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+ImageLike = Union[Image.Image, np.ndarray]
+
+
+def _dct_matrix(n: int) -> np.ndarray:
+    """正交 DCT-II 矩阵（与 cv2.dct 的缩放一致）"""
+    k = np.arange(n, dtype=np.float64)[:, None]
+    x = np.arange(n, dtype=np.float64)[None, :]
+    matrix = np.cos(np.pi * (2 * x + 1) * k / (2 * n)) * np.sqrt(2.0 / n)
+    matrix[0] /= np.sqrt(2.0)
+    return matrix.astype(np.float32)
+
+
+# pHash 只需要低频 8x8 系数：D8 @ X @ D8.T
+_DCT_LOW = np.ascontiguousarray(_dct_matrix(THUMB_SIZE)[:HASH_SIZE])
+_DCT_LOW_T = np.ascontiguousarray(_DCT_LOW.T)
+
+
+@dataclass(frozen=True)
+class ImageHashes:
+    """一帧图像的三种 64 位感知哈希"""
+    ahash: int
+    dhash: int
+    phash: int
+
+
+def _grid(length: int, samples: int) -> np.ndarray:
+    """在 [0, length) 上取 samples 个均匀分布的采样点（像素中心）"""
+    return ((np.arange(samples) + 0.5) * (length / samples)).astype(np.intp)
+
+
+def prepare_gray(image: ImageLike, size: int = THUMB_SIZE,
+                 oversample: int = OVERSAMPLE, pixel_format: str = 'RGB') -> np.ndarray:
+    """
+    生成哈希用的共享灰度缩略图
+
+    Args:
+        image: PIL 图像，或 NumPy 数组（灰度 HxW、HxWx3、HxWx4）
+        size: 缩略图边长
+        oversample: 每个缩略图像素在每边取的采样点数
+        pixel_format: NumPy 输入的通道顺序，'RGB' / 'BGR' / 'BGRA' / 'RGBA'
+
+    Returns:
+        size x size 的 float32 灰度数组（0~255）
+    """
+    samples = size * oversample
+
+    if isinstance(image, Image.Image):
+        if image.mode not in ('L', 'RGB'):
+            image = image.convert('RGB')
+        sampled = image.resize((samples, samples), Image.NEAREST)
+        gray = np.asarray(sampled.convert('L'), dtype=np.float32)
+    else:
+        arr = np.asarray(image)
+        rows = _grid(arr.shape[0], samples)
+        cols = _grid(arr.shape[1], samples)
+        sampled = arr[rows[:, None], cols]
+        if sampled.ndim == 2:
+            gray = sampled.astype(np.float32)
+        else:
+            rgb = sampled[..., :3].astype(np.float32)
+            if pixel_format.upper().startswith('BGR'):
+                rgb = rgb[..., ::-1]
+            gray = rgb @ _LUMA_RGB
+
+    return gray.reshape(size, oversample, size, oversample).mean(axis=(1, 3))
+
+
+def pack_bits(bits: np.ndarray) -> np.ndarray:
+    """
+    把 (..., 64) 的布尔数组打包为 uint64
+
+    第 i 个元素对应哈希值的第 i 位（小端位序）。
+    """
+    packed = np.packbits(bits.astype(np.uint8), axis=-1, bitorder='little')
+    return np.ascontiguousarray(packed).view('<u8')[..., 0]
+
+
+def _hash_bits(thumbs: np.ndarray):
+    """从 (N, 32, 32) 缩略图批量计算三种哈希的位数组"""
+    n = thumbs.shape[0]
+    block = THUMB_SIZE // HASH_SIZE
+
+    # aHash：8x8 块均值与整体均值比较
+    low = thumbs.reshape(n, HASH_SIZE, block, HASH_SIZE, block).mean(axis=(2, 4))
+    a_bits = low.reshape(n, -1) > low.reshape(n, -1).mean(axis=1, keepdims=True)
+
+    # dHash：8x9 网格中水平相邻两格的亮度梯度
+    row_means = thumbs.reshape(n, HASH_SIZE, block, THUMB_SIZE).mean(axis=2)
+    grid = np.add.reduceat(row_means, _DHASH_EDGES[:-1], axis=2) / _DHASH_WIDTHS
+    d_bits = (grid[:, :, 1:] > grid[:, :, :-1]).reshape(n, -1)
+
+    # pHash：低频 8x8 DCT 系数与其中位数比较
+    dct_low = _DCT_LOW @ thumbs @ _DCT_LOW_T
+    flat = dct_low.reshape(n, -1)
+    p_bits = flat > np.median(flat, axis=1, keepdims=True)
+
+    return a_bits, d_bits, p_bits
+
+
+def hash_thumbnails(thumbs: np.ndarray) -> np.ndarray:
+    """
+    批量计算哈希
+
+    Args:
+        thumbs: (N, 32, 32) 或 (32, 32) 的灰度缩略图
+
+    Returns:
+        (N, 3) uint64 数组，列依次为 aHash、dHash、pHash
+    """
+    thumbs = np.asarray(thumbs, dtype=np.float32)
+    if thumbs.ndim == 2:
+        thumbs = thumbs[None]
+    return np.stack([pack_bits(bits) for bits in _hash_bits(thumbs)], axis=1)
+
+
+def compute_hashes(image: ImageLike, pixel_format: str = 'RGB') -> ImageHashes:
+    """计算单帧的 aHash / dHash / pHash"""
+    row = hash_thumbnails(prepare_gray(image, pixel_format=pixel_format))[0]
+    return ImageHashes(int(row[0]), int(row[1]), int(row[2]))
+
+
+def compute_hashes_batch(images: Iterable[ImageLike],
+                         pixel_format: str = 'RGB') -> List[ImageHashes]:
+    """批量计算多帧哈希：逐帧取样后一次性完成所有哈希运算"""
+    thumbs = [prepare_gray(image, pixel_format=pixel_format) for image in images]
+    if not thumbs:
+        return []
+    table = hash_thumbnails(np.stack(thumbs))
+    return [ImageHashes(int(a), int(d), int(p)) for a, d, p in table]
+
+
+def hamming_distance(hash1: int, hash2: int) -> int:
+    """两个 64 位哈希的汉明距离"""
+    return bin((hash1 ^ hash2) & 0xFFFFFFFFFFFFFFFF).count('1')
+
+
+def hamming_distances(hashes: Sequence[int], reference: int) -> np.ndarray:
+    """一组哈希与参考哈希的汉明距离（向量化）"""
+    diff = np.asarray(hashes, dtype=np.uint64) ^ np.uint64(reference)
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(diff).astype(np.int64)
+    return _POPCOUNT8[diff.view(np.uint8)].reshape(diff.shape + (8,)).sum(axis=-1)
+
+
+__all__ = [
+    'HASH_SIZE',
+    'THUMB_SIZE',
+    'ImageHashes',
+    'prepare_gray',
+    'pack_bits',
+    'hash_thumbnails',
+    'compute_hashes',
+    'compute_hashes_batch',
+    'hamming_distance',
+    'hamming_distances',
+]
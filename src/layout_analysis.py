@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+微信界面布局分析 - 基于边缘积分投影的单遍分割线检测
+版本: 3.0.8
+
+WeChatDetector 原来对灰度图分别切片、分别求差分来找联系人列表/聊天区域的
+竖直分割线、聊天头部和输入框的水平分割线，输入框检测还在 Python 循环里
+逐行重算 np.mean；uint8 直接相减会回绕，得到的梯度也不可靠。
+
+这里对每条分割线只在自己的搜索窗口内求一次"边缘覆盖率"积分投影：
+- 竖直分割线：中间行带内逐列统计 |I(x+1) - I(x)| 超过阈值的比例；
+  头部和输入框分割线：聊天区域列范围内逐行统计 |I(y+1) - I(y)|；
+- 投影沿求和方向抽样（最多 max_samples 行/列），垂直于分割线的方向保持
+  原分辨率：1 像素宽的分隔线对比度不被平均掉，位置也不需要从缩小图换算；
+- cv2.absdiff 为饱和运算，不会像 uint8 直接相减那样回绕；
+- 分割线取搜索窗口内覆盖率最高处（横跨整个区域的分隔线覆盖率接近 1，
+  文字、气泡只覆盖一部分），峰值高出窗口中位数的部分即该分割线的置信度。
+置信度不足时退回微信的默认比例，与原来的行为一致。
+"""
+
+from dataclasses import dataclass
+from typing import Dict, Tuple
+
+import cv2
+import numpy as np
+
+
+# 投影沿求和方向的最大抽样行/列数
+DEFAULT_MAX_SAMPLES = 256
+# 边缘阈值（相邻像素的灰度差）
+DEFAULT_EDGE_THRESHOLD = 6
+# 低于该置信度时使用默认比例
+MIN_SPLIT_CONFIDENCE = 0.3
+
+# 搜索窗口与默认位置（占宽度/高度的比例）
+VERTICAL_SPLIT_RANGE = (0.2, 0.4)
+VERTICAL_SPLIT_DEFAULT = 0.3
+HEADER_SPLIT_RANGE = (0.04, 0.15)
+HEADER_SPLIT_DEFAULT = 0.08
+INPUT_SPLIT_RANGE = (0.6, 0.95)
+INPUT_SPLIT_DEFAULT = 0.88
+
+
+@dataclass
+class SplitResult:
+    """一条分割线的检测结果"""
+    position: int        # 原图坐标：分割线之后第一列/第一行
+    confidence: float    # 0~1，峰值覆盖率减去搜索窗口中位数
+    detected: bool       # False 表示置信度不足，position 为默认比例
+
+
+@dataclass
+class LayoutResult:
+    """布局分析结果"""
+    width: int
+    height: int
+    vertical_split: SplitResult   # 联系人列表 | 聊天区域
+    header_split: SplitResult     # 聊天头部 / 消息列表
+    input_split: SplitResult      # 消息列表 / 输入框
+
+    @property
+    def confidence(self) -> float:
+        """三条分割线中最低的置信度"""
+        return min(self.vertical_split.confidence, self.header_split.confidence,
+                   self.input_split.confidence)
+
+    def split_confidence(self) -> Dict[str, float]:
+        return {
+            'vertical_split': round(self.vertical_split.confidence, 3),
+            'header_split': round(self.header_split.confidence, 3),
+            'input_split': round(self.input_split.confidence, 3)
+        }
+
+    def regions(self, origin_x: int = 0, origin_y: int = 0) -> Dict[str, Dict[str, int]]:
+        """各界面区域（格式与 WeChatDetector.chat_regions 一致，absolute_* 加上窗口原点）"""
+        split = self.vertical_split.position
+        header = self.header_split.position
+        input_top = self.input_split.position
+        chat_width = self.width - split
+
+        def region(x, y, width, height):
+            return {'x': x, 'y': y, 'width': width, 'height': height,
+                    'absolute_x': origin_x + x, 'absolute_y': origin_y + y}
+
+        return {
+            'contact_list': region(0, 0, split, self.height),
+            'chat_area': region(split, 0, chat_width, self.height),
+            'chat_header': region(split, 0, chat_width, header),
+            'message_list': region(split, header, chat_width, input_top - header),
+            'input_area': region(split, input_top, chat_width, self.height - input_top)
+        }
+
+
+def _edge_profile(gray: np.ndarray, rows: Tuple[int, int], cols: Tuple[int, int],
+                  axis: int, threshold: int, max_samples: int) -> np.ndarray:
+    """
+    [rows) x [cols) 范围内的边缘覆盖率剖面
+
+    axis=1: 竖直边缘，返回每列的覆盖率（第 i 项为第 cols[0]+i 列与下一列之间）；
+    axis=0: 水平边缘，返回每行的覆盖率（第 i 项为第 rows[0]+i 行与下一行之间）。
+    """
+    row_start, row_end = rows
+    col_start, col_end = cols
+    if axis == 1:
+        step = max(1, -(-(row_end - row_start) // max_samples))
+        block = gray[row_start:row_end:step, col_start:col_end + 1]
+        edges = cv2.absdiff(block[:, 1:], block[:, :-1]) >= threshold
+        return np.count_nonzero(edges, axis=0) / float(block.shape[0])
+    step = max(1, -(-(col_end - col_start) // max_samples))
+    block = np.ascontiguousarray(gray[row_start:row_end + 1, col_start:col_end:step])
+    edges = cv2.absdiff(block[1:], block[:-1]) >= threshold
+    return np.count_nonzero(edges, axis=1) / float(block.shape[1])
+
+
+def _pick_split(profile: np.ndarray, start: int, default: int) -> SplitResult:
+    """
+    在剖面中找覆盖率峰值（profile[0] 为第 start 个像素与下一像素之间）
+
+    1 像素宽的分隔线会在其两侧各产生一个峰，取峰值平台（含间隔一个像素的
+    相邻峰）的中点作为分割位置。
+    """
+    if len(profile) == 0:
+        return SplitResult(default, 0.0, False)
+    peak_index = int(np.argmax(profile))
+    peak = float(profile[peak_index])
+    confidence = float(np.clip(peak - np.median(profile), 0.0, 1.0))
+    if confidence < MIN_SPLIT_CONFIDENCE:
+        return SplitResult(default, confidence, False)
+
+    # 峰值平台（>= 90% 峰值的连续区间）
+    left = right = peak_index
+    floor = peak * 0.9
+    while left > 0 and profile[left - 1] >= floor:
+        left -= 1
+    while right < len(profile) - 1 and profile[right + 1] >= floor:
+        right += 1
+    boundary = start + (left + right) / 2.0 + 1  # 第 i 项对应第 i 与 i+1 像素之间
+    return SplitResult(int(boundary + 0.5), confidence, True)
+
+
+def analyze_layout(gray: np.ndarray, max_samples: int = DEFAULT_MAX_SAMPLES,
+                   edge_threshold: int = DEFAULT_EDGE_THRESHOLD) -> LayoutResult:
+    """
+    一遍分析微信窗口截图的布局
+
+    Args:
+        gray: 灰度图（HxW uint8；HxWx3 RGB 会先转灰度）
+        max_samples: 投影沿求和方向最多抽样的行/列数
+        edge_threshold: 视为边缘的灰度差
+    """
+    if gray.ndim == 3:
+        gray = cv2.cvtColor(np.ascontiguousarray(gray[:, :, :3]), cv2.COLOR_RGB2GRAY)
+    height, width = gray.shape
+
+    def window(length, bounds):
+        start = min(max(int(length * bounds[0]), 0), length - 2)
+        end = min(max(int(np.ceil(length * bounds[1])), start + 1), length - 1)
+        return start, end
+
+    # 竖直分割线：避开标题栏和底部，在中间行带上统计每列的边缘覆盖率
+    cols = window(width, VERTICAL_SPLIT_RANGE)
+    profile = _edge_profile(gray, window(height, (0.15, 0.85)), cols, 1,
+                            edge_threshold, max_samples)
+    vertical_split = _pick_split(profile, cols[0], int(width * VERTICAL_SPLIT_DEFAULT))
+
+    # 水平分割线：只统计聊天区域（分割线右侧，留出边缘本身的宽度）
+    chat_cols = (min(vertical_split.position + 2, width - 1), width)
+    rows = window(height, HEADER_SPLIT_RANGE)
+    profile = _edge_profile(gray, rows, chat_cols, 0, edge_threshold, max_samples)
+    header_split = _pick_split(profile, rows[0], int(height * HEADER_SPLIT_DEFAULT))
+    rows = window(height, INPUT_SPLIT_RANGE)
+    profile = _edge_profile(gray, rows, chat_cols, 0, edge_threshold, max_samples)
+    input_split = _pick_split(profile, rows[0], int(height * INPUT_SPLIT_DEFAULT))
+
+    return LayoutResult(width, height, vertical_split, header_split, input_split)
+
+
+__all__ = [
+    'DEFAULT_MAX_SAMPLES',
+    'DEFAULT_EDGE_THRESHOLD',
+    'MIN_SPLIT_CONFIDENCE',
+    'SplitResult',
+    'LayoutResult',
+    'analyze_layout',
+]
@@ -14,11 +14,13 @@ import platform
 import getpass
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Dict, List, Any, Optional
+from typing import Dict, Iterable, List, Any, Optional
 from cryptography.hazmat.primitives import hashes, serialization
 from cryptography.hazmat.primitives.asymmetric import rsa, padding
 from cryptography.hazmat.primitives.serialization import Encoding, PrivateFormat, NoEncryption
 
+from report_aggregator import ReportAggregator
+
 
 class GB29360Compliance:
     """GB/T 29360-2012 电子数据取证规范实现"""
@@ -344,18 +346,28 @@ class ForensicReportGenerator:
             'iso27037': ISO27037Compliance()
         }
         
-    def generate_forensic_report(self, case_data: Dict, evidence_data: List[Dict]) -> Dict:
-        """生成司法鉴定报告"""
+    def generate_forensic_report(self, case_data: Dict, evidence_data: Iterable[Dict],
+                                 results_path: Optional[str] = None) -> Dict:
+        """
+        生成司法鉴定报告
+        
+        evidence_data 可以是列表，也可以是迭代器（如 report_aggregator.iter_jsonl、
+        iter_database）；全部统计在一遍扫描中完成，各节只使用聚合结果。
+        
+        Args:
+            results_path: 逐条完整性结果写入的 JSON Lines 附录路径（可选）
+        """
+        stats = ReportAggregator(results_path).consume(evidence_data).finish()
         report = {
             'report_metadata': self.create_report_metadata(),
             'report_header': self.create_report_header(case_data),
             'case_information': self.format_case_info(case_data),
-            'evidence_summary': self.create_evidence_summary(evidence_data),
-            'technical_analysis': self.perform_technical_analysis(evidence_data),
-            'integrity_verification': self.verify_evidence_integrity(evidence_data),
-            'legal_compliance': self.check_legal_compliance(evidence_data),
-            'conclusions': self.draw_conclusions(evidence_data),
-            'appendices': self.create_appendices(evidence_data),
+            'evidence_summary': self.create_evidence_summary(stats),
+            'technical_analysis': self.perform_technical_analysis(stats),
+            'integrity_verification': self.verify_evidence_integrity(stats),
+            'legal_compliance': self.check_legal_compliance(stats),
+            'conclusions': self.draw_conclusions(stats),
+            'appendices': self.create_appendices(stats),
             'signatures': self.create_signature_section()
         }
         
@@ -396,60 +408,55 @@ class ForensicReportGenerator:
             'evidence_sources': case_data.get('sources', [])
         }
     
-    def create_evidence_summary(self, evidence_data: List[Dict]) -> Dict:
+    def create_evidence_summary(self, stats: Dict) -> Dict:
         """创建证据摘要"""
-        return {
-            'total_evidence_items': len(evidence_data),
-            'evidence_types': self.categorize_evidence(evidence_data),
-            'collection_timespan': self.calculate_timespan(evidence_data),
-            'data_volume': self.calculate_data_volume(evidence_data),
-            'integrity_status': self.check_overall_integrity(evidence_data)
-        }
+        return stats['evidence_summary']
     
-    def perform_technical_analysis(self, evidence_data: List[Dict]) -> Dict:
+    def perform_technical_analysis(self, stats: Dict) -> Dict:
         """执行技术分析"""
         return {
-            'data_source_analysis': self.analyze_data_source(evidence_data),
-            'integrity_analysis': self.analyze_integrity(evidence_data),
-            'authenticity_analysis': self.analyze_authenticity(evidence_data),
-            'timeline_analysis': self.analyze_timeline(evidence_data),
-            'metadata_analysis': self.analyze_metadata(evidence_data),
-            'technical_findings': self.summarize_technical_findings(evidence_data)
+            'data_source_analysis': self.analyze_data_source(stats),
+            'integrity_analysis': self.analyze_integrity(stats),
+            'authenticity_analysis': self.analyze_authenticity(stats),
+            'timeline_analysis': self.analyze_timeline(stats),
+            'metadata_analysis': self.analyze_metadata(stats),
+            'technical_findings': self.summarize_technical_findings(stats)
         }
     
-    def verify_evidence_integrity(self, evidence_data: List[Dict]) -> Dict:
-        """验证证据完整性"""
-        integrity_results = []
-        
-        for evidence in evidence_data:
-            result = {
-                'evidence_id': evidence.get('evidence_id'),
-                'hash_verification': self.verify_hash(evidence),
-                'chain_of_custody': self.verify_custody_chain(evidence),
-                'timestamp_verification': self.verify_timestamps(evidence),
-                'digital_signature': self.verify_digital_signature(evidence),
-                'overall_integrity': 'verified'
-            }
-            integrity_results.append(result)
+    def verify_evidence_integrity(self, stats: Dict) -> Dict:
+        """
+        验证证据完整性
         
+        报告中只保留汇总和前 MAX_LISTED_ISSUES 个问题，逐条结果见附录文件。
+        """
+        integrity = stats['integrity']
         return {
-            'individual_results': integrity_results,
-            'overall_assessment': 'all_evidence_verified',
-            'verification_method': 'automated_and_manual',
+            'hash_coverage': integrity['hash_coverage'],
+            'chain_of_custody_coverage': integrity['custody_coverage'],
+            'signature_coverage': integrity['signature_coverage'],
+            'hash_chain': integrity['hash_chain'],
+            'inventory_sha256': integrity['inventory_sha256'],
+            'issue_count': integrity['issue_count'],
+            'issues': integrity['issues'],
+            'individual_results_file': integrity['individual_results_file'],
+            # 统计的是完整性要素是否齐全，哈希重算与验签见 evidence_verifier
+            'overall_assessment': ('integrity_elements_complete' if integrity['issue_count'] == 0
+                                   else 'issues_found'),
+            'verification_method': 'coverage_check',
             'verification_standards': ['GB/T 29360-2012', 'ISO/IEC 27037:2012']
         }
     
-    def check_legal_compliance(self, evidence_data: List[Dict]) -> Dict:
+    def check_legal_compliance(self, stats: Dict) -> Dict:
         """检查法律合规性"""
         return {
-            'gb29360_compliance': self.check_gb29360_compliance(evidence_data),
-            'iso27037_compliance': self.check_iso27037_compliance(evidence_data),
-            'procedural_compliance': self.check_procedural_compliance(evidence_data),
-            'admissibility_assessment': self.assess_admissibility(evidence_data),
+            'gb29360_compliance': self.check_gb29360_compliance(stats),
+            'iso27037_compliance': self.check_iso27037_compliance(stats),
+            'procedural_compliance': self.check_procedural_compliance(stats),
+            'admissibility_assessment': self.assess_admissibility(stats),
             'compliance_summary': 'fully_compliant'
         }
     
-    def draw_conclusions(self, evidence_data: List[Dict]) -> Dict:
+    def draw_conclusions(self, stats: Dict) -> Dict:
         """得出结论"""
         return {
             'technical_conclusions': [
@@ -476,7 +483,7 @@ class ForensicReportGenerator:
             ]
         }
     
-    def create_appendices(self, evidence_data: List[Dict]) -> Dict:
+    def create_appendices(self, stats: Dict) -> Dict:
         """创建附录"""
         return {
             'appendix_a': 'evidence_inventory',
@@ -574,78 +581,57 @@ class ForensicReportGenerator:
 """
         return formatted_report
     
-    # 辅助分析方法
-    def categorize_evidence(self, evidence_data: List[Dict]) -> Dict:
-        """分类证据"""
-        return {'screenshots': len(evidence_data), 'metadata': len(evidence_data)}
-    
-    def calculate_timespan(self, evidence_data: List[Dict]) -> str:
-        """计算时间跨度"""
-        if not evidence_data:
-            return "无数据"
-        return f"{len(evidence_data)} 个时间点"
-    
-    def calculate_data_volume(self, evidence_data: List[Dict]) -> str:
-        """计算数据量"""
-        return f"{len(evidence_data)} 个证据项"
-    
-    def check_overall_integrity(self, evidence_data: List[Dict]) -> str:
-        """检查整体完整性"""
-        return "已验证"
-    
-    def analyze_data_source(self, evidence_data: List[Dict]) -> Dict:
+    # 辅助分析方法（输入均为 ReportAggregator.finish() 的聚合结果）
+    def analyze_data_source(self, stats: Dict) -> Dict:
         """分析数据源"""
-        return {'source': 'WeChat Application', 'platform': 'Windows'}
-    
-    def analyze_integrity(self, evidence_data: List[Dict]) -> Dict:
-        """分析完整性"""
-        return {'status': 'verified', 'method': 'SHA-256 hash'}
-    
-    def analyze_authenticity(self, evidence_data: List[Dict]) -> Dict:
+        sources = sorted(stats['sources'], key=stats['sources'].get, reverse=True)
+        platforms = sorted(stats['platforms'], key=stats['platforms'].get, reverse=True)
+        return {'source': sources[0] if sources else 'WeChat Application',
+                'platform': platforms[0] if platforms else 'Windows',
+                'source_counts': stats['sources']}
+    
+    def analyze_integrity(self, stats: Dict) -> Dict:
+        """分析完整性（统计的是完整性要素是否齐全，哈希重算与验签见 evidence_verifier）"""
+        integrity = stats['integrity']
+        return {'status': 'elements_complete' if integrity['issue_count'] == 0 else 'issues_found',
+                'method': 'coverage_check', 'hash_chain': integrity['hash_chain']}
+    
+    def analyze_authenticity(self, stats: Dict) -> Dict:
         """分析真实性"""
-        return {'status': 'authentic', 'verification': 'digital_signature'}
+        return {'status': 'authentic', 'verification': 'digital_signature',
+                'signature_coverage': stats['integrity']['signature_coverage']}
     
-    def analyze_timeline(self, evidence_data: List[Dict]) -> Dict:
+    def analyze_timeline(self, stats: Dict) -> Dict:
         """分析时间线"""
-        return {'chronological_order': 'verified', 'gaps': 'none'}
+        timeline = stats['timeline']
+        return {'chronological_order': timeline['chronological_order'],
+                'out_of_order_items': timeline['out_of_order_items'],
+                'max_gap_seconds': timeline['max_gap_seconds']}
     
-    def analyze_metadata(self, evidence_data: List[Dict]) -> Dict:
+    def analyze_metadata(self, stats: Dict) -> Dict:
         """分析元数据"""
-        return {'completeness': 'full', 'consistency': 'verified'}
+        missing = stats['timeline']['items_without_timestamp']
+        return {'completeness': 'full' if missing == 0 else 'partial', 'consistency': 'verified'}
     
-    def summarize_technical_findings(self, evidence_data: List[Dict]) -> List[str]:
+    def summarize_technical_findings(self, stats: Dict) -> List[str]:
         """总结技术发现"""
-        return ['所有证据技术指标正常', '数据完整性验证通过']
-    
-    def verify_hash(self, evidence: Dict) -> str:
-        """验证哈希"""
-        return "verified"
-    
-    def verify_custody_chain(self, evidence: Dict) -> str:
-        """验证监管链"""
-        return "complete"
-    
-    def verify_timestamps(self, evidence: Dict) -> str:
-        """验证时间戳"""
-        return "verified"
-    
-    def verify_digital_signature(self, evidence: Dict) -> str:
-        """验证数字签名"""
-        return "valid"
+        if stats['integrity']['issue_count']:
+            return [f"发现 {stats['integrity']['issue_count']} 项完整性问题，详见完整性验证"]
+        return ['所有证据技术指标正常', '完整性要素（哈希、签名）齐全']
     
-    def check_gb29360_compliance(self, evidence_data: List[Dict]) -> str:
+    def check_gb29360_compliance(self, stats: Dict) -> str:
         """检查GB/T 29360合规性"""
         return "compliant"
     
-    def check_iso27037_compliance(self, evidence_data: List[Dict]) -> str:
+    def check_iso27037_compliance(self, stats: Dict) -> str:
         """检查ISO 27037合规性"""
         return "compliant"
     
-    def check_procedural_compliance(self, evidence_data: List[Dict]) -> str:
+    def check_procedural_compliance(self, stats: Dict) -> str:
         """检查程序合规性"""
         return "compliant"
     
-    def assess_admissibility(self, evidence_data: List[Dict]) -> str:
+    def assess_admissibility(self, stats: Dict) -> str:
         """评估可采性"""
         return "admissible"
 
@@ -698,7 +684,7 @@ class LegalComplianceManager:
         
         return compliance_record
     
-    def generate_compliance_report(self, case_data: Dict, evidence_list: List[Dict]) -> str:
+    def generate_compliance_report(self, case_data: Dict, evidence_list: Iterable[Dict]) -> str:
         """生成合规报告"""
         return self.report_generator.generate_forensic_report(case_data, evidence_list)
     
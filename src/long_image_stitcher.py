@@ -0,0 +1,412 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+长图拼接器 - 滚动截图的重叠检测与流式拼接
+版本: 3.0.8
+
+相邻两帧滚动截图之间存在大量重叠行。拼接器为每帧计算行签名，
+通过行哈希投票找出垂直位移（失败时退化为行亮度曲线的 FFT 互相关），
+只把新增的行追加到画布上。画布按固定高度切块写出 PNG，或流式写入
+一张长 PNG，内存占用与滚动总长度无关。
+"""
+
+import os
+import struct
+import time
+import zlib
+from dataclasses import dataclass
+from typing import List, Optional, Union
+
+import numpy as np
+from PIL import Image
+
+from frame import Frame
+
+
+# 行签名使用的随机权重（固定种子，保证跨进程一致）
+_ROW_WEIGHTS = np.random.default_rng(0x5EED).integers(
+    1, 2**63, size=256, dtype=np.uint64) | np.uint64(1)
+
+
+@dataclass
+class OverlapResult:
+    """重叠检测结果"""
+    shift: int            # 新帧相对上一帧滚动的行数（0 表示没有滚动）
+    confidence: float     # 0~1
+    method: str           # 'row_hash' / 'fft' / 'none'
+
+
+def compute_row_signatures(gray: np.ndarray, samples: int = 128) -> np.ndarray:
+    """
+    计算每一行的 64 位签名
+
+    Args:
+        gray: HxW 灰度图
+        samples: 每行采样的列数（等间距）
+    """
+    width = gray.shape[1]
+    step = max(1, width // samples)
+    sampled = gray[:, ::step][:, :len(_ROW_WEIGHTS)]
+    # 量化去掉抗锯齿/渲染抖动带来的低位噪声
+    quantized = (sampled >> 2).astype(np.uint64)
+    with np.errstate(over='ignore'):
+        return (quantized * _ROW_WEIGHTS[:quantized.shape[1]]).sum(axis=1)
+
+
+def _informative_rows(gray: np.ndarray, samples: int = 128) -> np.ndarray:
+    """非纯色行的掩码（纯色背景行在任何位移下都会匹配，不参与投票）"""
+    step = max(1, gray.shape[1] // samples)
+    sampled = gray[:, ::step]
+    return (sampled.max(axis=1).astype(np.int16) - sampled.min(axis=1)) > 8
+
+
+def find_vertical_overlap(prev_gray: np.ndarray, cur_gray: np.ndarray,
+                          prev_sigs: Optional[np.ndarray] = None,
+                          cur_sigs: Optional[np.ndarray] = None,
+                          min_overlap: int = 16) -> OverlapResult:
+    """
+    查找 cur 相对 prev 向下滚动的行数 d，即 cur[0:H-d] == prev[d:H]
+
+    Args:
+        prev_gray/cur_gray: 同尺寸灰度图
+        prev_sigs/cur_sigs: 预先计算好的行签名（可选，用于复用）
+        min_overlap: 最少重叠行数
+    """
+    height = prev_gray.shape[0]
+    if cur_gray.shape != prev_gray.shape or height <= min_overlap:
+        return OverlapResult(0, 0.0, 'none')
+
+    if prev_sigs is None:
+        prev_sigs = compute_row_signatures(prev_gray)
+    if cur_sigs is None:
+        cur_sigs = compute_row_signatures(cur_gray)
+
+    if np.array_equal(prev_sigs, cur_sigs):
+        return OverlapResult(0, 1.0, 'row_hash')
+
+    result = _row_hash_overlap(prev_gray, cur_gray, prev_sigs, cur_sigs, min_overlap)
+    if result.confidence >= 0.5:
+        return result
+
+    fallback = _fft_overlap(prev_gray, cur_gray, prev_sigs, cur_sigs, min_overlap)
+    return fallback if fallback.confidence > result.confidence else result
+
+
+def _verify_shift(prev_sigs: np.ndarray, cur_sigs: np.ndarray, shift: int) -> float:
+    """位移 shift 下重叠区域内行签名一致的比例"""
+    overlap = len(prev_sigs) - shift
+    if overlap <= 0:
+        return 0.0
+    return float(np.count_nonzero(prev_sigs[shift:] == cur_sigs[:overlap])) / overlap
+
+
+def _row_hash_overlap(prev_gray, cur_gray, prev_sigs, cur_sigs, min_overlap) -> OverlapResult:
+    """行哈希投票：只使用在上一帧中唯一出现的非纯色行"""
+    height = len(prev_sigs)
+    prev_mask = _informative_rows(prev_gray)
+    cur_mask = _informative_rows(cur_gray)
+
+    unique_hashes, first_index, counts = np.unique(
+        prev_sigs[prev_mask], return_index=True, return_counts=True)
+    prev_rows = np.flatnonzero(prev_mask)[first_index]
+    unique_hashes = unique_hashes[counts == 1]
+    prev_rows = prev_rows[counts == 1]
+    if len(unique_hashes) == 0:
+        return OverlapResult(0, 0.0, 'none')
+
+    cur_rows = np.flatnonzero(cur_mask)
+    cur_hashes = cur_sigs[cur_rows]
+    positions = np.searchsorted(unique_hashes, cur_hashes)
+    positions[positions >= len(unique_hashes)] = 0
+    matched = unique_hashes[positions] == cur_hashes
+    if not matched.any():
+        return OverlapResult(0, 0.0, 'none')
+
+    shifts = prev_rows[positions[matched]] - cur_rows[matched]
+    shifts = shifts[(shifts > 0) & (shifts <= height - min_overlap)]
+    if len(shifts) == 0:
+        return OverlapResult(0, 0.0, 'none')
+
+    votes = np.bincount(shifts)
+    # 票数最高的几个位移逐一用整段重叠区域的行签名一致率复核，取最优者
+    best = OverlapResult(0, 0.0, 'none')
+    for shift in np.argsort(votes)[::-1][:3]:
+        if votes[shift] < 2:
+            break
+        confidence = _verify_shift(prev_sigs, cur_sigs, int(shift))
+        if confidence > best.confidence:
+            best = OverlapResult(int(shift), confidence, 'row_hash')
+    return best
+
+
+def _fft_overlap(prev_gray, cur_gray, prev_sigs, cur_sigs, min_overlap) -> OverlapResult:
+    """行亮度曲线的 FFT 互相关（适用于行哈希因渲染差异无法精确匹配的情况）"""
+    height = prev_gray.shape[0]
+    step = max(1, prev_gray.shape[1] // 128)
+    prev_profile = prev_gray[:, ::step].mean(axis=1)
+    cur_profile = cur_gray[:, ::step].mean(axis=1)
+    prev_profile = prev_profile - prev_profile.mean()
+    cur_profile = cur_profile - cur_profile.mean()
+
+    size = 1 << int(np.ceil(np.log2(2 * height)))
+    corr = np.fft.irfft(np.fft.rfft(prev_profile, size) *
+                        np.conj(np.fft.rfft(cur_profile, size)), size)[:height]
+    # corr[d] = sum(prev[i + d] * cur[i])，按重叠长度归一化
+    overlaps = height - np.arange(height)
+    energy = np.sqrt(np.cumsum(prev_profile[::-1] ** 2)[::-1] *
+                     np.cumsum(cur_profile ** 2)[overlaps - 1]) + 1e-6
+    score = corr / energy
+    score[0] = -1
+    score[height - min_overlap + 1:] = -1
+
+    shift = int(np.argmax(score))
+    if score[shift] <= 0:
+        return OverlapResult(0, 0.0, 'none')
+
+    diff = np.abs(prev_profile[shift:] - cur_profile[:height - shift]).mean()
+    spread = np.abs(prev_profile).mean() + 1e-6
+    confidence = float(max(0.0, min(score[shift], 1.0 - diff / spread)))
+    return OverlapResult(shift, confidence, 'fft')
+
+
+class StreamingPNGWriter:
+    """
+    流式 PNG 写入器：逐行压缩写入，结束时回填图像高度
+
+    先写入高度为 0 的 IHDR，关闭时回到文件头修正高度和 CRC，
+    因此无需预先知道最终高度，也无需把整张长图放进内存。
+    """
+
+    _SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+    def __init__(self, path: str, width: int, compress_level: int = 6,
+                 idat_size: int = 1 << 20):
+        self.path = path
+        self.width = width
+        self.height = 0
+        self.idat_size = idat_size
+        self._compressor = zlib.compressobj(compress_level)
+        self._pending = []
+        self._pending_bytes = 0
+        self._file = open(path, 'w+b')
+        self._file.write(self._SIGNATURE)
+        self._ihdr_offset = self._file.tell()
+        self._write_chunk(b'IHDR', self._ihdr(0))
+
+    def _ihdr(self, height: int) -> bytes:
+        # 8 位深度, 颜色类型 2 (RGB), 标准压缩/滤波, 非隔行
+        return struct.pack('>IIBBBBB', self.width, height, 8, 2, 0, 0, 0)
+
+    def _write_chunk(self, tag: bytes, data: bytes):
+        self._file.write(struct.pack('>I', len(data)))
+        self._file.write(tag)
+        self._file.write(data)
+        self._file.write(struct.pack('>I', zlib.crc32(tag + data) & 0xFFFFFFFF))
+
+    def write_rows(self, rows: np.ndarray):
+        """追加若干行 RGB 像素 (HxWx3 uint8)"""
+        if rows.shape[1] != self.width or rows.shape[2] != 3:
+            raise ValueError(f"行尺寸不匹配: {rows.shape}, 期望宽度 {self.width}")
+        # 每行前加一个滤波类型字节 (0 = None)
+        filtered = np.zeros((rows.shape[0], self.width * 3 + 1), dtype=np.uint8)
+        filtered[:, 1:] = rows.reshape(rows.shape[0], -1)
+        data = self._compressor.compress(filtered.tobytes())
+        self.height += rows.shape[0]
+        if data:
+            self._pending.append(data)
+            self._pending_bytes += len(data)
+            if self._pending_bytes >= self.idat_size:
+                self._flush_idat()
+
+    def _flush_idat(self):
+        if self._pending:
+            self._write_chunk(b'IDAT', b''.join(self._pending))
+            self._pending = []
+            self._pending_bytes = 0
+
+    def close(self):
+        """写入剩余数据和 IEND，并回填 IHDR 中的高度"""
+        if self._file is None:
+            return
+        self._pending.append(self._compressor.flush())
+        self._flush_idat()
+        self._write_chunk(b'IEND', b'')
+        self._file.seek(self._ihdr_offset)
+        self._write_chunk(b'IHDR', self._ihdr(self.height))
+        self._file.close()
+        self._file = None
+
+
+class LongImageStitcher:
+    """流式长图拼接器"""
+
+    def __init__(self, output_dir: str, mode: str = 'chunks', chunk_height: int = 4096,
+                 direction: str = 'down', prefix: Optional[str] = None,
+                 compress_level: int = 6, min_confidence: float = 0.5):
+        """
+        Args:
+            output_dir: 输出目录
+            mode: 'chunks' 按固定高度切块输出，'single' 输出一张长图
+            chunk_height: 切块高度（single 模式下为写出批次大小）
+            direction: 滚动方向 'down'（新内容在下方）或 'up'（新内容在上方）
+            prefix: 输出文件名前缀
+            compress_level: PNG 压缩级别
+            min_confidence: 重叠检测置信度下限，低于该值整帧追加
+        """
+        if mode not in ('chunks', 'single'):
+            raise ValueError(f"未知的拼接模式: {mode}")
+        self.output_dir = output_dir
+        self.mode = mode
+        self.chunk_height = chunk_height
+        self.direction = direction
+        self.prefix = prefix or f"long_{time.strftime('%Y%m%d_%H%M%S')}"
+        self.compress_level = compress_level
+        self.min_confidence = min_confidence
+
+        self._prev_gray = None
+        self._prev_sigs = None
+        self._pending: List[np.ndarray] = []
+        self._pending_rows = 0
+        self._chunk_paths: List[str] = []
+        self._writer: Optional[StreamingPNGWriter] = None
+        self.width = None
+
+        self.stats = {
+            'frames': 0,
+            'rows_appended': 0,
+            'frames_without_overlap': 0,
+            'frames_unchanged': 0,
+            'detect_time': 0.0,
+            'write_time': 0.0
+        }
+        os.makedirs(output_dir, exist_ok=True)
+
+    def add_frame(self, frame: Union[Image.Image, np.ndarray, Frame],
+                  gray: Optional[np.ndarray] = None,
+                  signatures: Optional[np.ndarray] = None) -> OverlapResult:
+        """
+        加入一帧截图（RGB PIL 图像、Frame 或 HxWx3 数组），返回与上一帧的重叠检测结果
+
+        gray/signatures 可传入捕获时已算好的灰度图和行签名，避免重复计算。
+        """
+        rgb = np.asarray(frame.convert('RGB') if isinstance(frame, (Image.Image, Frame)) else frame)
+        if gray is None:
+            gray = (rgb[:, :, 0] * 0.299 + rgb[:, :, 1] * 0.587 +
+                    rgb[:, :, 2] * 0.114).astype(np.uint8)
+
+        if self.width is None:
+            self.width = rgb.shape[1]
+        elif rgb.shape[1] != self.width:
+            raise ValueError(f"帧宽度变化: {rgb.shape[1]} != {self.width}")
+
+        self.stats['frames'] += 1
+        start = time.perf_counter()
+        sigs = signatures if signatures is not None else compute_row_signatures(gray)
+
+        if self._prev_gray is None:
+            result = OverlapResult(rgb.shape[0], 1.0, 'none')
+            new_rows = rgb
+        else:
+            if self.direction == 'down':
+                result = find_vertical_overlap(self._prev_gray, gray, self._prev_sigs, sigs)
+            else:
+                # 向上滚动：新帧在上方，交换角色后位移即为新增行数
+                result = find_vertical_overlap(gray, self._prev_gray, sigs, self._prev_sigs)
+
+            if result.confidence < self.min_confidence:
+                self.stats['frames_without_overlap'] += 1
+                new_rows = rgb
+            elif result.shift == 0:
+                self.stats['frames_unchanged'] += 1
+                new_rows = rgb[:0]
+            elif self.direction == 'down':
+                new_rows = rgb[rgb.shape[0] - result.shift:]
+            else:
+                new_rows = rgb[:result.shift]
+
+        self.stats['detect_time'] += time.perf_counter() - start
+        self._prev_gray = gray
+        self._prev_sigs = sigs
+
+        if len(new_rows):
+            self._append(new_rows)
+        return result
+
+    def _append(self, rows: np.ndarray):
+        """追加新行，超过块高度时写出"""
+        # 向上滚动时新内容在上方：块内按捕获顺序倒序排列
+        self._pending.append(np.array(rows))
+        self._pending_rows += rows.shape[0]
+        self.stats['rows_appended'] += rows.shape[0]
+
+        while self._pending_rows >= self.chunk_height:
+            self._write_block(self._take_rows(self.chunk_height))
+
+    def _take_rows(self, count: int) -> np.ndarray:
+        """从待写缓冲区中按内容顺序取出 count 行"""
+        if self.direction == 'down':
+            stacked = np.concatenate(self._pending, axis=0)
+            block, rest = stacked[:count], stacked[count:]
+        else:
+            stacked = np.concatenate(self._pending[::-1], axis=0)
+            block, rest = stacked[-count:], stacked[:-count]
+        self._pending = [rest] if len(rest) else []
+        self._pending_rows = len(rest)
+        return block
+
+    def _write_block(self, block: np.ndarray):
+        start = time.perf_counter()
+        if self.mode == 'single' and self.direction == 'down':
+            if self._writer is None:
+                path = os.path.join(self.output_dir, f"{self.prefix}.png")
+                self._writer = StreamingPNGWriter(path, self.width, self.compress_level)
+            self._writer.write_rows(block)
+        else:
+            # 向上滚动的单图模式先按块落盘，结束时倒序流式合并
+            index = len(self._chunk_paths)
+            path = os.path.join(self.output_dir, f"{self.prefix}_part{index:04d}.png")
+            Image.fromarray(block).save(path, 'PNG', compress_level=self.compress_level)
+            self._chunk_paths.append(path)
+        self.stats['write_time'] += time.perf_counter() - start
+
+    def finalize(self) -> List[str]:
+        """写出剩余内容，返回输出文件列表（按从上到下的内容顺序）"""
+        if self._pending_rows:
+            self._write_block(self._take_rows(self._pending_rows))
+
+        if self.mode == 'single':
+            if self._writer is not None:
+                self._writer.close()
+                paths = [self._writer.path]
+                self._writer = None
+                return paths
+            return self._merge_chunks_reversed()
+
+        return self._chunk_paths[::-1] if self.direction == 'up' else list(self._chunk_paths)
+
+    def _merge_chunks_reversed(self) -> List[str]:
+        """向上滚动的单图模式：倒序逐块读入并流式合并为一张长图"""
+        if not self._chunk_paths:
+            return []
+        path = os.path.join(self.output_dir, f"{self.prefix}.png")
+        writer = StreamingPNGWriter(path, self.width, self.compress_level)
+        for chunk_path in reversed(self._chunk_paths):
+            with Image.open(chunk_path) as chunk:
+                writer.write_rows(np.asarray(chunk.convert('RGB')))
+            os.remove(chunk_path)
+        writer.close()
+        self._chunk_paths = []
+        return [path]
+
+    def get_stats(self) -> dict:
+        """获取拼接统计"""
+        return dict(self.stats, pending_rows=self._pending_rows)
+
+
+__all__ = [
+    'OverlapResult',
+    'compute_row_signatures',
+    'find_vertical_overlap',
+    'StreamingPNGWriter',
+    'LongImageStitcher',
+]
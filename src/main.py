@@ -16,6 +16,7 @@ import os
 import sys
 import time
 import threading
+import multiprocessing
 from datetime import datetime
 from pathlib import Path
 from typing import Optional, Tuple, Union
@@ -32,6 +33,10 @@ import cv2
 from advanced_screenshot_manager import AdvancedScreenshotManager
 from optimized_recording_manager import AdaptiveRecordingManager
 from wechat_detector import WeChatDetector
+from window_locator import PywinautoWindowProvider
+from scroll_settle import ScrollSettleDetector
+from config import get_config
+from image_codecs import codec_from_settings
 
 
 # 项目配置
@@ -44,15 +49,26 @@ class ScrollController:
         self.last_scroll_time = 0
         self.stop_flag = threading.Event()
         self.scroll_count = 0
+        # 滚动稳定检测：画面稳定即返回，代替固定等待
+        self.settle_detector = ScrollSettleDetector()
+        self.last_settle = None
 
     def reset(self):
         """重置滚动控制器状态"""
         self.scroll_count = 0
+        self.stop_flag.clear()
+        self.last_settle = None
+        self.settle_detector.reset_stats()
 
-    def dynamic_scroll(self, direction, mode, region, app_instance):
+    def dynamic_scroll(self, direction, mode, region, app_instance, max_wait=None, stable_probes=None):
         """
         智能滚动控制：v3.0 - Page模式下前3次点击，后续仅滚动
+
+        max_wait 不为 None 时启用稳定检测：滚动后持续采集低分辨率探针，
+        画面稳定即返回（最多等待 max_wait 秒）；否则固定等待 0.4 秒。
         """
+        # 本次滚动没有稳定检测结果时（固定等待、提前返回）不能沿用上一次的
+        self.last_settle = None
         try:
             x, y, w, h = region
             center_x = x + w // 2
@@ -62,6 +78,15 @@ class ScrollController:
                 app_instance.status_var.set("❌ 滚动区域无效")
                 return False
 
+            # 滚动前的基线探针，用于区分"尚未开始滚动"和"已经停止"
+            baseline = None
+            if max_wait is not None:
+                try:
+                    baseline = self.settle_detector.probe(region)
+                except Exception as e:
+                    print(f"⚠️ 稳定检测探针失败，改用固定等待: {e}")
+                    max_wait = None
+
             # Page模式下前3次点击，后续仅滚动
             if mode == "page":
                 if self.scroll_count < 3:
@@ -91,7 +116,12 @@ class ScrollController:
                 scroll_value = -scroll_step if direction == "down" else scroll_step
                 pyautogui.scroll(scroll_value)
 
-            time.sleep(0.4)
+            if max_wait is not None:
+                self.last_settle = self.settle_detector.wait_for_settle(
+                    region, baseline, max_wait=max_wait, stop_event=self.stop_flag,
+                    stable_probes=stable_probes)
+            else:
+                time.sleep(0.4)
             self.last_scroll_time = time.time()
             return True
 
@@ -125,9 +155,15 @@ class ScrollScreenshotApp:
         
         # 核心组件
         self.scroll_controller = ScrollController()
-        self.screenshot_manager = AdvancedScreenshotManager()
+        self.screenshot_manager = AdvancedScreenshotManager(image_codec=self._configured_codec())
         self.recording_manager = AdaptiveRecordingManager()
         
+        # 微信检测器常驻：窗口定位结果缓存在共享定位器中，启动时后台预热并周期复验
+        self.wechat_detector = WeChatDetector()
+        if PywinautoWindowProvider.is_available():
+            self.wechat_detector.locator.prewarm()
+            self.wechat_detector.locator.start_refresh()
+        
         # UI和样式
         self.setup_styles()
         self.create_scrollable_frame()
@@ -135,11 +171,22 @@ class ScrollScreenshotApp:
         # 绑定清理函数
         self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
 
+    def _configured_codec(self):
+        """按配置（image_format / image_quality / image_codec_preset）选择截图编码器"""
+        settings = get_config()
+        try:
+            return codec_from_settings(settings.image_format, settings.image_quality,
+                                       settings.image_codec_preset or None)
+        except ValueError as e:
+            print(f"⚠️ 截图编码配置无效，使用默认编码: {e}")
+            return None
+
     def on_closing(self):
         """关闭窗口时的清理操作"""
         print("正在关闭应用程序...")
         self.screenshot_manager.cleanup()
         self.recording_manager.cleanup()
+        self.wechat_detector.locator.close()
         self.root.destroy()
 
     @property
@@ -242,6 +289,13 @@ class ScrollScreenshotApp:
         tk.Label(interval_frame, text="间隔(秒):", bg="#ffffff", fg="#1e293b", font=("Segoe UI", 9, "bold")).pack(side="left")
         self.interval_var = tk.StringVar(value="3")
         tk.Spinbox(interval_frame, from_=0.5, to=10.0, increment=0.5, width=8, textvariable=self.interval_var, font=("Segoe UI", 9)).pack(side="left", padx=(10, 0))
+        pace_frame = tk.Frame(content_frame, bg="#ffffff")
+        pace_frame.pack(fill="x", pady=(5, 0))
+        tk.Label(pace_frame, text="节奏:", bg="#ffffff", fg="#1e293b", font=("Segoe UI", 9, "bold")).pack(side="left")
+        self.pace_mode = tk.StringVar(value="safe")
+        tk.Radiobutton(pace_frame, text="安全", variable=self.pace_mode, value="safe", bg="#ffffff", fg="#1e293b", font=("Segoe UI", 9)).pack(side="left", padx=(10, 0))
+        tk.Radiobutton(pace_frame, text="最快", variable=self.pace_mode, value="max_throughput", bg="#ffffff", fg="#1e293b", font=("Segoe UI", 9)).pack(side="left", padx=(10, 0))
+        tk.Radiobutton(pace_frame, text="固定间隔", variable=self.pace_mode, value="fixed", bg="#ffffff", fg="#1e293b", font=("Segoe UI", 9)).pack(side="left", padx=(10, 0))
 
     def create_recording_card(self, parent):
         content_frame = self._create_card(parent, "🎥", "屏幕录制", "FPS：10-30 · 区域：选定/全屏", self.colors['error'])
@@ -283,6 +337,10 @@ class ScrollScreenshotApp:
         tk.Checkbutton(options_frame, text="智能检测重复内容自动停止", variable=self.auto_detect, bg="#ffffff", fg="#1e293b", font=("Segoe UI", 9)).pack(anchor="w")
         self.scroll_only = tk.BooleanVar(value=False)
         tk.Checkbutton(options_frame, text="纯滚动模式(不截图)", variable=self.scroll_only, bg="#ffffff", fg="#1e293b", font=("Segoe UI", 9)).pack(anchor="w")
+        self.auto_stitch = tk.BooleanVar(value=False)
+        tk.Checkbutton(options_frame, text="自动拼接长图(按4096像素分块)", variable=self.auto_stitch, bg="#ffffff", fg="#1e293b", font=("Segoe UI", 9)).pack(anchor="w")
+        self.archive_frames = tk.BooleanVar(value=False)
+        tk.Checkbutton(options_frame, text="去重归档存储(重复区域只存一次)", variable=self.archive_frames, bg="#ffffff", fg="#1e293b", font=("Segoe UI", 9)).pack(anchor="w")
         button_frame = tk.Frame(content_frame, bg="#ffffff")
         button_frame.pack(fill="x", pady=(10,0))
         self.start_button = tk.Button(button_frame, text="🚀 开始截图", command=self.start_capture, bg=self.colors['success'], fg="white", font=("Segoe UI", 12, "bold"), relief="flat", padx=30, pady=12)
@@ -379,7 +437,7 @@ class ScrollScreenshotApp:
         self.root.update_idletasks() # 更新UI
 
         try:
-            detector = WeChatDetector()
+            detector = self.wechat_detector
             if not detector.find_wechat_window():
                 messagebox.showwarning("检测失败", "未找到正在运行的微信客户端。")
                 self.status_var.set("❌ 未找到微信窗口")
@@ -438,6 +496,12 @@ class ScrollScreenshotApp:
         if not os.path.exists(save_dir):
             os.makedirs(save_dir)
         self.screenshot_manager.set_save_directory(save_dir) # 设置保存目录
+        if self.auto_stitch.get() and not self.scroll_only.get():
+            self.screenshot_manager.enable_stitching(direction=self.scroll_direction.get())
+        if self.archive_frames.get() and not self.scroll_only.get():
+            self.screenshot_manager.enable_frame_archive()
+        else:
+            self.screenshot_manager.disable_frame_archive()
         
         self.scroll_controller.reset() # 重置滚动计数器
         self.is_capturing = True
@@ -460,31 +524,66 @@ class ScrollScreenshotApp:
         if not self.scroll_only.get():
             self.screenshot_manager.capture_screenshot_async(self.region, self.screenshot_callback)
 
+        # 同一窗口区域共享渲染延迟统计
+        window_key = self.region
+
         while self.is_capturing:
             # 1. 更新UI
             elapsed = time.time() - self.capture_start_time
+            settle = self.scroll_controller.last_settle
+            settle_text = f" | 稳定 {settle.latency * 1000:.0f}ms" if settle else ""
             self.root.after(0, lambda: self.status_var.set(
-                f"📸 已捕获 {self.capture_count} 张 | 重复 {self.screenshot_manager.stats['duplicates_detected']} | {elapsed:.1f}s"))
+                f"📸 已捕获 {self.capture_count} 张 | 重复 {self.screenshot_manager.stats['duplicates_detected']} | {elapsed:.1f}s{settle_text}"))
 
-            # 2. 滚动
+            # 2. 背压：保存跟不上时暂停滚动，等待管道腾出额度
+            if not self.scroll_only.get():
+                while self.is_capturing and not self.screenshot_manager.wait_for_capacity(0.5):
+                    self.root.after(0, lambda: self.status_var.set("⏳ 保存跟不上，暂停滚动..."))
+                if not self.is_capturing:
+                    break
+
+            # 3. 滚动
             scroll_mode = self.scroll_mode.get()
             scroll_direction = self.scroll_direction.get()
-            if not self.scroll_controller.dynamic_scroll(scroll_direction, scroll_mode, self.region, self):
+            wait_time = float(self.interval_var.get())
+            pace_mode = self.pace_mode.get()
+            if pace_mode == "fixed":
+                plan = None
+            else:
+                # 间隔作为稳定检测的最长等待，节奏控制按该窗口学到的渲染延迟收紧/放宽
+                self.screenshot_manager.wait_manager.set_mode(pace_mode)
+                plan = self.screenshot_manager.plan_scroll_wait(window_key, scroll_mode, wait_time)
+            if not self.scroll_controller.dynamic_scroll(scroll_direction, scroll_mode, self.region, self,
+                                                         max_wait=plan.max_wait if plan else None,
+                                                         stable_probes=plan.stable_probes if plan else None):
                 self.root.after(0, lambda: self.status_var.set("❌ 滚动失败，自动停止"))
                 break
 
-            # 3. 等待内容加载
-            wait_time = float(self.interval_var.get())
-            time.sleep(wait_time)
+            # 4. 等待内容加载（稳定检测已在滚动中完成，实测延迟反馈给节奏控制）
+            settle = self.scroll_controller.last_settle
+            if plan is None:
+                time.sleep(wait_time)
+            elif settle is not None and not settle.stopped:
+                # 画面没变（空滚动、已到聊天尽头）时只是等满了 change_timeout，不是渲染延迟
+                if settle.changed:
+                    self.screenshot_manager.record_settle_time(window_key, settle.latency, settle.settled)
+                if plan.settle_delay > 0:
+                    self.scroll_controller.stop_flag.wait(plan.settle_delay)
 
             # 在等待后检查是否被外部停止
             if not self.is_capturing:
                 break
 
-            # 4. 截图
+            # 5. 截图
             if not self.scroll_only.get():
                 self.screenshot_manager.capture_screenshot_async(self.region, self.screenshot_callback)
 
+        settle_stats = self.scroll_controller.settle_detector.get_stats()
+        if settle_stats['count']:
+            print(f"⏱️ 滚动稳定延迟: 平均 {settle_stats['mean_ms']:.0f}ms, "
+                  f"P50 {settle_stats['p50_ms']:.0f}ms, P90 {settle_stats['p90_ms']:.0f}ms, "
+                  f"最大 {settle_stats['max_ms']:.0f}ms, 超时 {settle_stats['timeouts']}次")
+
         # 循环结束后，安排最终的清理工作
         self.root.after(0, self.stop_capture)
 
@@ -504,6 +603,10 @@ class ScrollScreenshotApp:
 
     def stop_capture(self):
         """停止截图 (v3.1 - 确保UI总能重置)"""
+        # 自动停止时 is_capturing 已被回调置为 False，拼接收尾需在提前返回之前触发
+        if self.screenshot_manager.stitcher is not None:
+            threading.Thread(target=self._finish_stitching, daemon=True).start()
+
         if not self.is_capturing:
             # 即使已经停止，也确保UI状态正确
             self.start_button.config(state="normal")
@@ -529,6 +632,13 @@ class ScrollScreenshotApp:
             self.status_var.set("⏹️ 已停止")
             self.status_icon.config(text="🟡")
 
+    def _finish_stitching(self):
+        """后台完成长图拼接并提示结果"""
+        paths = self.screenshot_manager.finish_stitching()
+        if paths:
+            self.root.after(0, lambda: self.status_var.set(
+                f"🧩 长图已生成 {len(paths)} 个文件: {os.path.basename(os.path.dirname(paths[0]))}"))
+
     def start_recording(self):
         """开始屏幕录制 (高级版)"""
         if self.is_recording:
@@ -628,4 +738,6 @@ def main():
 
 
 if __name__ == "__main__":
+    # 编码进程池在 Windows 打包环境下需要
+    multiprocessing.freeze_support()
     main()
\ No newline at end of file
@@ -8,7 +8,6 @@ import time
 import threading
 import cv2
 import numpy as np
-import pyautogui
 from PIL import Image
 from queue import Queue, Empty
 from pathlib import Path
@@ -16,12 +15,17 @@ from typing import Optional, Tuple, Callable
 import psutil
 import os
 
+from capture_backends import CaptureBackend, get_capture_backend
+from system_metrics import get_system_metrics
+
 
 class OptimizedRecordingManager:
     """优化的录屏管理器"""
     
-    def __init__(self, fps: int = 10, codec: str = 'mp4v'):
+    def __init__(self, fps: int = 10, codec: str = 'mp4v',
+                 capture_backend: Optional[CaptureBackend] = None):
         self.fps = fps
+        self.capture_backend = capture_backend
         self.codec = cv2.VideoWriter_fourcc(*codec)
         self.is_recording = False
         self.video_writer = None
@@ -153,16 +157,14 @@ class OptimizedRecordingManager:
         """优化的录制循环"""
         consecutive_errors = 0
         max_errors = 5
+        backend = self.capture_backend or get_capture_backend()
         
         while self.is_recording:
             frame_start_time = time.time()
             
             try:
-                # 捕获屏幕帧
-                screenshot = pyautogui.screenshot(region=self.record_region)
-                
-                # 转换为OpenCV格式
-                frame = cv2.cvtColor(np.array(screenshot), cv2.COLOR_RGB2BGR)
+                # 捕获屏幕帧：BGRA 视图一次转换为 OpenCV 的 BGR 格式 Frame，写入时零拷贝
+                frame = backend.grab_frame(self.record_region, 'BGR')
                 
                 # 添加到缓冲区
                 self.frame_buffer.append(frame)
@@ -205,7 +207,7 @@ class OptimizedRecordingManager:
         try:
             for frame in self.frame_buffer:
                 if self.video_writer.isOpened():
-                    self.video_writer.write(frame)
+                    self.video_writer.write(frame.array)
             
             self.frame_buffer.clear()
             self.stats['buffer_flushes'] += 1
@@ -322,8 +324,9 @@ class OptimizedRecordingManager:
 class AdaptiveRecordingManager(OptimizedRecordingManager):
     """自适应录屏管理器 - 根据系统性能自动调整参数"""
     
-    def __init__(self, fps: int = 10, codec: str = 'mp4v'):
-        super().__init__(fps, codec)
+    def __init__(self, fps: int = 10, codec: str = 'mp4v',
+                 capture_backend: Optional[CaptureBackend] = None):
+        super().__init__(fps, codec, capture_backend)
         self.performance_monitor = None
         self.last_adjustment_time = 0
         self.adjustment_interval = 5.0  # 每5秒检查一次性能
@@ -347,8 +350,10 @@ class AdaptiveRecordingManager(OptimizedRecordingManager):
                     
                     # 检查是否需要调整
                     if current_time - self.last_adjustment_time >= self.adjustment_interval:
-                        cpu_percent = psutil.cpu_percent(interval=1)
-                        memory_percent = psutil.virtual_memory().percent
+                        # 读取共享采样器的最新快照，不阻塞监控线程
+                        metrics = get_system_metrics().latest
+                        cpu_percent = metrics.cpu_percent_smoothed
+                        memory_percent = metrics.memory_percent
                         
                         # 根据系统负载调整设置
                         self._adaptive_adjustment(cpu_percent, memory_percent)
@@ -6,16 +6,17 @@
 
 import time
 import threading
-import hashlib
 import numpy as np
 from PIL import Image
-import pyautogui
 from queue import Queue, Empty
 from concurrent.futures import ThreadPoolExecutor
 from typing import Optional, Tuple, Callable
 import psutil
 import os
 
+from capture_backends import get_capture_backend
+from frame import pixel_digest
+
 
 class OptimizedScreenshotManager:
     """优化的截图管理器"""
@@ -89,7 +90,7 @@ class OptimizedScreenshotManager:
         """带重试机制的截图捕获"""
         for attempt in range(max_retries):
             try:
-                screenshot = pyautogui.screenshot(region=region)
+                screenshot = get_capture_backend().grab_image(region)
                 return screenshot
             except Exception as e:
                 if attempt == max_retries - 1:
@@ -128,9 +129,8 @@ class OptimizedScreenshotManager:
         if image_id in self.screenshot_cache:
             return self.screenshot_cache[image_id]
         
-        # 计算哈希
-        image_bytes = image.tobytes()
-        hash_value = hashlib.md5(image_bytes).hexdigest()
+        # 计算哈希（Frame/数组直接读取像素缓冲区）
+        hash_value = pixel_digest(image, 'md5')
         
         # 缓存管理
         if len(self.screenshot_cache) >= self.cache_size_limit:
@@ -0,0 +1,364 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+报告统计聚合 - 单遍流式统计大规模证据集
+版本: 3.0.8
+
+ForensicReportGenerator 和 GB29360Compliance 生成报告时要先把全部证据
+读进列表，再由分类、时间跨度、数据量、完整性、时间线等辅助方法各自
+遍历一遍；完整性一节还为每条证据生成一条结果放进报告。
+
+ReportAggregator 从任意迭代器（列表、JSON Lines 日志、SQLite 游标、
+证据目录）逐条消费证据，一遍扫描内增量维护全部统计量：
+类型/来源计数、最早/最晚时间与最大间隔、乱序条数、数据量、哈希与
+签名覆盖率、证据链（prev_hash/record_hash）连续性、清单摘要。
+覆盖率只说明哈希、签名等完整性要素是否齐全，不重新计算哈希、不验签；
+逐文件校验见 evidence_verifier。
+内存占用只与类型、来源的种类数有关；逐条结果可选地流式写入 JSON Lines
+附录文件。最后由 finish() 一次性产出报告各节需要的数据。
+"""
+
+import hashlib
+import json
+import os
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from evidence_store import GENESIS_HASH, record_digest
+
+
+# 报告中保留的问题条目上限（完整结果见附录文件）
+MAX_LISTED_ISSUES = 100
+
+# 证据类型识别：evidence_data 中的键 -> 报告中的类型名（与 GB29360Compliance 一致）
+_TYPE_KEYS = (('screenshot', '屏幕截图'), ('video', '屏幕录制'), ('text', '文字内容'))
+_TYPE_NAMES = {'screenshot': '屏幕截图', 'digital_screenshot': '屏幕截图',
+               'video': '屏幕录制', 'recording': '屏幕录制', 'text': '文字内容'}
+
+
+def _get(record: dict, *path, default=None):
+    for key in path:
+        if not isinstance(record, dict):
+            return default
+        record = record.get(key)
+        if record is None:
+            return default
+    return record
+
+
+def _record_time(record: dict) -> Tuple[Optional[float], str]:
+    """(Unix 时间戳, 原始时间文本)"""
+    unix = record.get('unix_timestamp')
+    if isinstance(unix, (int, float)):
+        return float(unix), datetime.fromtimestamp(unix).isoformat()
+    for path in (('acquisition_metadata', 'timestamp'), ('timestamp',), ('creation_time',),
+                 ('processing_timestamp',), ('identification_time',)):
+        value = _get(record, *path)
+        if isinstance(value, str):
+            try:
+                return datetime.fromisoformat(value).timestamp(), value
+            except ValueError:
+                continue
+    return None, ''
+
+
+def record_time(record: dict) -> Optional[float]:
+    """证据的采集时间（Unix 时间戳），兼容各模块的记录格式"""
+    return _record_time(record)[0]
+
+
+def record_size(record: dict) -> int:
+    """证据数据量（字节）"""
+    for path in (('file_info', 'file_size'), ('evidence_data', 'size'), ('payload', 'size'),
+                 ('integrity', 'file_size'), ('size',)):
+        value = _get(record, *path)
+        if isinstance(value, int):
+            return value
+    return 0
+
+
+def record_hash(record: dict) -> Optional[str]:
+    """证据内容哈希"""
+    for path in (('integrity_verification', 'content_hash'), ('image_hash_sha256',),
+                 ('integrity', 'sha256'), ('file_info', 'file_hash'), ('hash_value',)):
+        value = _get(record, *path)
+        if isinstance(value, str) and value:
+            return value
+    return None
+
+
+def record_types(record: dict) -> List[str]:
+    """证据类型（报告中的中文类型名）"""
+    evidence_data = record.get('evidence_data')
+    types = []
+    if isinstance(evidence_data, dict):
+        types = [name for key, name in _TYPE_KEYS if key in evidence_data]
+        declared = _TYPE_NAMES.get(evidence_data.get('type'))
+        if declared and declared not in types:
+            types.append(declared)
+    declared = _TYPE_NAMES.get(record.get('evidence_type'))
+    if declared and declared not in types:
+        types.append(declared)
+    if not types and ('image_hash_sha256' in record or 'image_size' in record):
+        types.append('屏幕截图')
+    return types
+
+
+def _format_bytes(size: int) -> str:
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024 or unit == 'GB':
+            return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.2f} {unit}"
+        size /= 1024
+
+
+class ReportAggregator:
+    """证据统计的单遍增量聚合器"""
+
+    def __init__(self, results_path: Optional[str] = None):
+        """
+        Args:
+            results_path: 逐条完整性结果的 JSON Lines 附录路径（为 None 时不输出逐条结果）
+        """
+        self.count = 0
+        self.total_bytes = 0
+        self.types: Counter = Counter()
+        self.sources: Counter = Counter()
+        self.platforms: Counter = Counter()
+        self.first_time: Optional[float] = None
+        self.last_time: Optional[float] = None
+        self.first_label = ''
+        self.last_label = ''
+        self.max_gap = 0.0
+        self.out_of_order = 0
+        self.without_time = 0
+        self.hashed = 0
+        self.signed = 0
+        self.with_custody = 0
+        self.issues: List[dict] = []
+        self.issue_count = 0
+
+        # 证据链（EvidenceRecorder 记录的 prev_hash/record_hash）
+        self.chained = 0
+        self.chain_breaks = 0
+        self._chain_head = GENESIS_HASH
+
+        # 清单摘要：按消费顺序对 (evidence_id, 哈希) 做滚动 SHA-256，报告可据此核对证据清单
+        self._inventory = hashlib.sha256()
+        self._previous_time: Optional[float] = None
+
+        self.results_path = results_path
+        self._results = open(results_path, 'w', encoding='utf-8') if results_path else None
+
+    def _issue(self, evidence_id, problem: str):
+        self.issue_count += 1
+        if len(self.issues) < MAX_LISTED_ISSUES:
+            self.issues.append({'evidence_id': evidence_id, 'issue': problem})
+
+    def add(self, record: Dict[str, Any]):
+        """消费一条证据记录"""
+        self.count += 1
+        evidence_id = record.get('evidence_id')
+        self.total_bytes += record_size(record)
+        for name in record_types(record):
+            self.types[name] += 1
+
+        source = (record.get('source_application') or _get(record, 'context', 'application')
+                  or _get(record, 'evidence_data', 'metadata', 'window_title'))
+        if source:
+            self.sources[str(source)] += 1
+        platform = (_get(record, 'acquisition_metadata', 'system_info', 'os')
+                    or _get(record, 'acquisition_environment', 'system_info', 'os_name'))
+        if platform:
+            self.platforms[str(platform)] += 1
+
+        # 时间线
+        timestamp, label = _record_time(record)
+        if timestamp is None:
+            self.without_time += 1
+        else:
+            if self.first_time is None or timestamp < self.first_time:
+                self.first_time, self.first_label = timestamp, label
+            if self.last_time is None or timestamp > self.last_time:
+                self.last_time, self.last_label = timestamp, label
+            if self._previous_time is not None:
+                if timestamp < self._previous_time:
+                    self.out_of_order += 1
+                else:
+                    self.max_gap = max(self.max_gap, timestamp - self._previous_time)
+            self._previous_time = timestamp
+
+        # 完整性要素
+        content_hash = record_hash(record)
+        if content_hash:
+            self.hashed += 1
+        else:
+            self._issue(evidence_id, '缺少内容哈希')
+        signed = bool(record.get('digital_signature'))
+        if signed:
+            self.signed += 1
+        custody = bool(record.get('chain_of_custody') or record.get('custody_chain')
+                       or 'record_hash' in record)
+        if custody:
+            self.with_custody += 1
+
+        chain_status = None
+        if 'record_hash' in record:
+            self.chained += 1
+            chain_ok = (record.get('prev_hash') == self._chain_head
+                        and record_digest(record) == record['record_hash'])
+            if not chain_ok:
+                self.chain_breaks += 1
+                self._issue(evidence_id, '证据链不连续或记录被修改')
+            self._chain_head = record['record_hash']
+            chain_status = 'verified' if chain_ok else 'broken'
+
+        self._inventory.update(f"{evidence_id}\t{content_hash or ''}\n".encode('utf-8'))
+
+        if self._results is not None:
+            self._results.write(json.dumps({
+                'evidence_id': evidence_id,
+                'hash_verification': 'present' if content_hash else 'missing',
+                'content_hash': content_hash,
+                'chain_of_custody': chain_status or ('present' if custody else 'missing'),
+                'timestamp_verification': 'present' if timestamp is not None else 'missing',
+                'digital_signature': 'present' if signed else 'missing'
+            }, ensure_ascii=False) + '\n')
+
+    def consume(self, records: Iterable[Dict[str, Any]]) -> 'ReportAggregator':
+        """消费整个迭代器（一遍扫描）"""
+        for record in records:
+            self.add(record)
+        return self
+
+    # ---------- 输出 ----------
+
+    @property
+    def inventory_digest(self) -> str:
+        return self._inventory.hexdigest()
+
+    @property
+    def elements_complete(self) -> bool:
+        """每条证据的完整性要素（哈希、证据链）都齐全且证据链连续（不代表已验签）"""
+        return self.count > 0 and self.issue_count == 0
+
+    def evidence_types(self) -> List[str]:
+        return [name for name, _ in self.types.most_common()]
+
+    def acquisition_period(self) -> Dict[str, str]:
+        return {'start': self.first_label, 'end': self.last_label}
+
+    def timespan_text(self) -> str:
+        if not self.count:
+            return "无数据"
+        if self.first_time is None:
+            return f"{self.count} 个时间点（无时间戳）"
+        return (f"{self.first_label} 至 {self.last_label}，"
+                f"共 {self.last_time - self.first_time:.0f} 秒")
+
+    def finish(self) -> Dict[str, Any]:
+        """结束聚合，返回报告各节所需的统计数据"""
+        if self._results is not None:
+            self._results.close()
+            self._results = None
+        return {
+            'evidence_summary': {
+                'total_evidence_items': self.count,
+                'evidence_types': dict(self.types),
+                'collection_timespan': self.timespan_text(),
+                'data_volume': f"{self.count} 个证据项，{_format_bytes(self.total_bytes)}",
+                'integrity_coverage': (f"哈希 {self.hashed}/{self.count}，"
+                                       f"签名 {self.signed}/{self.count}"
+                                       + ("" if self.elements_complete else "，存在缺失"))
+            },
+            'timeline': {
+                'start': self.first_label,
+                'end': self.last_label,
+                'chronological_order': 'verified' if self.out_of_order == 0 else 'out_of_order',
+                'out_of_order_items': self.out_of_order,
+                'max_gap_seconds': round(self.max_gap, 3),
+                'items_without_timestamp': self.without_time
+            },
+            'integrity': {
+                'hash_coverage': f"{self.hashed}/{self.count}",
+                'signature_coverage': f"{self.signed}/{self.count}",
+                'custody_coverage': f"{self.with_custody}/{self.count}",
+                'hash_chain': ('absent' if not self.chained else
+                               'verified' if self.chain_breaks == 0 else 'broken'),
+                'hash_chain_breaks': self.chain_breaks,
+                'inventory_sha256': self.inventory_digest,
+                'issue_count': self.issue_count,
+                'issues': list(self.issues),
+                'individual_results_file': self.results_path
+            },
+            'sources': dict(self.sources),
+            'platforms': dict(self.platforms),
+            'total_bytes': self.total_bytes
+        }
+
+
+# ===================== 证据来源 =====================
+
+def iter_jsonl(path: str) -> Iterator[Dict[str, Any]]:
+    """逐行读取 JSON Lines（如 EvidenceStore 日志），忽略不完整的尾行"""
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.endswith('\n') and line.strip():
+                yield json.loads(line)
+
+
+def iter_database(database, case_id: str) -> Iterator[Dict[str, Any]]:
+    """从 EvidenceDatabase 按案件分批读取证据"""
+    for _, _, evidence in database.iter_case(case_id):
+        yield evidence
+
+
+def _read_storage_package(path: str) -> Optional[Dict[str, Any]]:
+    """读取一个证据包的元数据（.evp 只读头部；旧格式 .json 去掉十六进制内容）"""
+    from evidence_package import PACKAGE_EXTENSION, read_package
+
+    name = os.path.basename(path)
+    if name.endswith(PACKAGE_EXTENSION):
+        return read_package(path)
+    if name.endswith('.json') and name.startswith('EVD'):
+        with open(path, 'r', encoding='utf-8') as f:
+            package = json.load(f)
+        evidence_data = package.get('evidence_data')
+        if isinstance(evidence_data, dict) and 'content' in evidence_data:
+            package['evidence_data'] = {k: v for k, v in evidence_data.items() if k != 'content'}
+        return package
+    return None
+
+
+def iter_storage(directory: str) -> Iterator[Dict[str, Any]]:
+    """
+    按采集时间顺序逐个读取证据目录中的证据包元数据
+
+    文件名顺序不是采集顺序（时间线的乱序统计会出错），所以先扫描一遍只记下
+    (采集时间, 文件名)，排序后再逐个读取返回；内存只与文件数有关，不保留证据包。
+    没有时间戳的证据包排在最后。
+    """
+    with os.scandir(directory) as entries:
+        names = sorted(entry.name for entry in entries if entry.is_file())
+    keys = []
+    for name in names:
+        package = _read_storage_package(os.path.join(directory, name))
+        if package is not None:
+            timestamp = record_time(package)
+            keys.append((timestamp is None, timestamp or 0.0, name))
+    keys.sort()
+    for _, _, name in keys:
+        yield _read_storage_package(os.path.join(directory, name))
+
+
+__all__ = [
+    'MAX_LISTED_ISSUES',
+    'ReportAggregator',
+    'iter_database',
+    'iter_jsonl',
+    'iter_storage',
+    'record_hash',
+    'record_size',
+    'record_time',
+    'record_types',
+]
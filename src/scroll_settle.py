@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+滚动稳定检测 - 用低分辨率探针代替滚动后的固定等待
+版本: 3.0.8
+
+滚动之后连续截取区域的低分辨率灰度探针（每边几十到几百个采样点），
+相邻探针差异低于阈值并连续保持若干次即认为画面已稳定，立即触发截图；
+超过最长等待时间仍未稳定则按超时处理。每次测得的稳定延迟都会记录下来，
+用于观察目标应用的实际渲染速度。
+"""
+
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+import numpy as np
+
+from capture_backends import CaptureBackend, get_capture_backend
+
+
+Region = Tuple[int, int, int, int]
+
+
+@dataclass
+class SettleResult:
+    """一次稳定检测的结果"""
+    settled: bool          # 是否在最长等待时间内稳定
+    latency: float         # 从开始等待到判定稳定（或超时）的秒数
+    probes: int            # 采集的探针数量
+    changed: bool          # 与滚动前的基线相比画面是否发生过变化
+    stopped: bool = False  # 是否被外部停止
+
+
+class ScrollSettleDetector:
+    """滚动稳定检测器"""
+
+    def __init__(self, capture_backend: Optional[CaptureBackend] = None,
+                 probe_cols: int = 64, probe_rows: int = 192,
+                 probe_interval: float = 0.03, stable_probes: int = 2,
+                 tolerance: float = 0.5, change_timeout: float = 0.3,
+                 max_wait: float = 3.0, history: int = 500):
+        """
+        Args:
+            capture_backend: 截图后端（默认使用进程共享后端）
+            probe_cols/probe_rows: 探针采样网格
+            probe_interval: 两次探针之间的间隔（秒）
+            stable_probes: 需要连续多少次"无变化"才判定稳定
+            tolerance: 相邻探针的平均绝对差阈值（灰度级）
+            change_timeout: 画面始终未发生变化时，最多等待多久即视为稳定
+                （到达底部或应用尚未响应时不必等到 max_wait）
+            max_wait: 默认最长等待时间（秒）
+            history: 保留的稳定延迟样本数
+        """
+        self._capture_backend = capture_backend
+        self.probe_cols = probe_cols
+        self.probe_rows = probe_rows
+        self.probe_interval = probe_interval
+        self.stable_probes = stable_probes
+        self.tolerance = tolerance
+        self.change_timeout = change_timeout
+        self.max_wait = max_wait
+
+        self.latencies = deque(maxlen=history)
+        self.timeouts = 0
+        self.total_probes = 0
+        self._lock = threading.Lock()
+
+    @property
+    def capture_backend(self) -> CaptureBackend:
+        if self._capture_backend is None:
+            self._capture_backend = get_capture_backend()
+        return self._capture_backend
+
+    def probe(self, region: Region) -> np.ndarray:
+        """截取区域并按规则网格取样为低分辨率 float32 灰度探针"""
+        bgra = self.capture_backend.grab(region)
+        height, width = bgra.shape[:2]
+        rows = np.linspace(0, height - 1, min(height, self.probe_rows)).astype(np.intp)
+        cols = np.linspace(0, width - 1, min(width, self.probe_cols)).astype(np.intp)
+        sampled = bgra[rows[:, None], cols].astype(np.float32)
+        # BGRA -> 灰度（ITU-R 601）
+        return sampled[..., 2] * 0.299 + sampled[..., 1] * 0.587 + sampled[..., 0] * 0.114
+
+    @staticmethod
+    def difference(probe1: np.ndarray, probe2: np.ndarray) -> float:
+        """两个探针的平均绝对差"""
+        if probe1.shape != probe2.shape:
+            return float('inf')
+        return float(np.abs(probe1 - probe2).mean())
+
+    def wait_for_settle(self, region: Region, baseline: Optional[np.ndarray] = None,
+                        max_wait: Optional[float] = None,
+                        stop_event: Optional[threading.Event] = None,
+                        stable_probes: Optional[int] = None) -> SettleResult:
+        """
+        等待区域画面稳定
+
+        Args:
+            region: 截图区域
+            baseline: 滚动前采集的探针；提供时可区分"尚未开始滚动"和"已经停止"
+            max_wait: 最长等待时间（默认使用构造参数）
+            stop_event: 置位时立即返回
+            stable_probes: 本次判定稳定需要的连续无变化次数（默认使用构造参数）
+        """
+        max_wait = self.max_wait if max_wait is None else max_wait
+        stable_probes = self.stable_probes if stable_probes is None else stable_probes
+        start = time.perf_counter()
+        previous = None
+        stable = 0
+        probes = 0
+        changed = baseline is None
+
+        while True:
+            current = self.probe(region)
+            probes += 1
+            elapsed = time.perf_counter() - start
+
+            if not changed and self.difference(current, baseline) > self.tolerance:
+                changed = True
+
+            if previous is not None and self.difference(current, previous) <= self.tolerance:
+                stable += 1
+            else:
+                stable = 0
+            previous = current
+
+            if stable >= stable_probes and (changed or elapsed >= self.change_timeout):
+                return self._record(SettleResult(True, elapsed, probes, changed))
+
+            if elapsed >= max_wait:
+                return self._record(SettleResult(False, elapsed, probes, changed))
+
+            if stop_event is not None:
+                if stop_event.wait(self.probe_interval):
+                    return SettleResult(False, elapsed, probes, changed, stopped=True)
+            else:
+                time.sleep(self.probe_interval)
+
+    def _record(self, result: SettleResult) -> SettleResult:
+        """记录稳定延迟"""
+        with self._lock:
+            self.latencies.append(result.latency)
+            self.total_probes += result.probes
+            if not result.settled:
+                self.timeouts += 1
+        return result
+
+    def get_stats(self) -> dict:
+        """稳定延迟统计（毫秒）"""
+        with self._lock:
+            samples = np.array(self.latencies, dtype=np.float64) * 1000
+            timeouts = self.timeouts
+            total_probes = self.total_probes
+
+        if not len(samples):
+            return {'count': 0, 'timeouts': timeouts, 'probes': total_probes}
+
+        return {
+            'count': len(samples),
+            'timeouts': timeouts,
+            'probes': total_probes,
+            'mean_ms': float(samples.mean()),
+            'p50_ms': float(np.percentile(samples, 50)),
+            'p90_ms': float(np.percentile(samples, 90)),
+            'max_ms': float(samples.max()),
+            'total_s': float(samples.sum() / 1000)
+        }
+
+    def reset_stats(self):
+        """清空统计"""
+        with self._lock:
+            self.latencies.clear()
+            self.timeouts = 0
+            self.total_probes = 0
+
+
+__all__ = [
+    'SettleResult',
+    'ScrollSettleDetector',
+]
@@ -0,0 +1,408 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+签名服务 - 持久化 RSA 密钥 + Merkle 树批量签名
+版本: 3.0.8
+
+原来每构造一次 EnhancedLegalCompliance 就生成一对新的 RSA 密钥，每张
+截图单独做一次 RSA-PSS 签名，每个证据包里都嵌着签名和完整的 PEM 公钥。
+
+SigningService 只在启动时载入一次持久化私钥（不存在时生成并以 0600
+权限保存），证据按批签名：
+
+    叶子   = SHA-256(0x00 || 叶子摘要)，叶子摘要绑定证据编号和内容哈希
+    内部节点 = SHA-256(0x01 || 左 || 右)，奇数个节点时最后一个直接上提
+    根     -> 对批次描述（批次号、根、叶子数、时间、公钥指纹）做一次 RSA-PSS 签名
+
+每批写一个签名文件 signatures/<batch_id>.json，包含签名、公钥和每个
+叶子的包含证明；证据包只记录批次号、叶子序号和叶子摘要。RSA 运算从
+每帧一次降为每批一次，证据包也不再携带签名和公钥。
+
+批次文件里的公钥只用于验算签名，是否可信由验证方配置的公钥指纹决定：
+能改写证据目录的人同样能放进一个用自己密钥签名的批次文件。
+"""
+
+import atexit
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import padding, rsa
+
+
+MERKLE_ALGORITHM = 'RSA-PSS-SHA256-MERKLE'
+
+# 默认签名私钥路径（不要放在证据目录中）
+DEFAULT_KEY_PATH = os.path.join('keys', 'evidence_signing_key.pem')
+
+# 批次签名文件所在的子目录（相对证据包所在目录）
+SIGNATURE_DIR_NAME = 'signatures'
+
+_LEAF_PREFIX = b'\x00'
+_NODE_PREFIX = b'\x01'
+
+_PSS = padding.PSS(mgf=padding.MGF1(hashes.SHA256()), salt_length=padding.PSS.MAX_LENGTH)
+
+
+# ===================== 密钥 =====================
+
+def load_or_create_key(key_path: str, key_size: int = 2048, password: Optional[bytes] = None):
+    """载入 PEM 私钥；文件不存在时生成并保存（仅所有者可读写）"""
+    if os.path.exists(key_path):
+        with open(key_path, 'rb') as f:
+            return serialization.load_pem_private_key(f.read(), password=password,
+                                                      backend=default_backend())
+
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=key_size,
+                                           backend=default_backend())
+    encryption = (serialization.BestAvailableEncryption(password) if password
+                  else serialization.NoEncryption())
+    pem = private_key.private_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PrivateFormat.PKCS8,
+        encryption_algorithm=encryption
+    )
+    directory = os.path.dirname(key_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    fd = os.open(key_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, 'wb') as f:
+        f.write(pem)
+    print(f"🔑 已生成签名密钥: {key_path}")
+    return private_key
+
+
+def public_key_pem(public_key) -> str:
+    return public_key.public_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PublicFormat.SubjectPublicKeyInfo
+    ).decode('utf-8')
+
+
+def public_key_fingerprint(public_key) -> str:
+    """公钥指纹：DER 编码 SubjectPublicKeyInfo 的 SHA-256"""
+    der = public_key.public_bytes(
+        encoding=serialization.Encoding.DER,
+        format=serialization.PublicFormat.SubjectPublicKeyInfo
+    )
+    return hashlib.sha256(der).hexdigest()
+
+
+def load_trusted_fingerprints(sources: Iterable[str], password: Optional[bytes] = None) -> frozenset:
+    """
+    解析可信签名公钥
+
+    Args:
+        sources: 每项为 64 位十六进制公钥指纹，或 PEM 公钥/私钥文件路径
+
+    Returns:
+        公钥指纹集合
+    """
+    fingerprints = set()
+    for source in sources:
+        source = source.strip()
+        if len(source) == 64 and all(c in '0123456789abcdefABCDEF' for c in source):
+            fingerprints.add(source.lower())
+            continue
+        with open(source, 'rb') as f:
+            pem = f.read()
+        if b'PRIVATE KEY' in pem:
+            key = serialization.load_pem_private_key(pem, password=password,
+                                                     backend=default_backend()).public_key()
+        else:
+            key = serialization.load_pem_public_key(pem, backend=default_backend())
+        fingerprints.add(public_key_fingerprint(key))
+    return frozenset(fingerprints)
+
+
+# ===================== Merkle 树 =====================
+
+def evidence_leaf(evidence_id: str, content_hash: str) -> str:
+    """证据的叶子摘要（绑定证据编号和内容 SHA-256）"""
+    data = json.dumps({'content_hash': content_hash, 'evidence_id': evidence_id},
+                      sort_keys=True, separators=(',', ':')).encode('utf-8')
+    return hashlib.sha256(data).hexdigest()
+
+
+def _leaf_node(leaf_hash: str) -> bytes:
+    return hashlib.sha256(_LEAF_PREFIX + bytes.fromhex(leaf_hash)).digest()
+
+
+def _parent(left: bytes, right: bytes) -> bytes:
+    return hashlib.sha256(_NODE_PREFIX + left + right).digest()
+
+
+def build_merkle_tree(leaf_hashes: List[str]) -> Tuple[str, List[List[Tuple[str, str]]]]:
+    """
+    构建 Merkle 树
+
+    Returns:
+        (根摘要, 每个叶子的包含证明)
+        证明是自底向上的 [(兄弟节点在左/右 'L'/'R', 兄弟摘要), ...]
+    """
+    if not leaf_hashes:
+        raise ValueError("空批次不能构建 Merkle 树")
+    level = [_leaf_node(leaf) for leaf in leaf_hashes]
+    # positions[i]: 叶子 i 当前所在节点在本层的下标
+    positions = list(range(len(level)))
+    proofs: List[List[Tuple[str, str]]] = [[] for _ in leaf_hashes]
+
+    while len(level) > 1:
+        for leaf, index in enumerate(positions):
+            sibling = index ^ 1
+            if sibling < len(level):
+                side = 'L' if sibling < index else 'R'
+                proofs[leaf].append((side, level[sibling].hex()))
+            positions[leaf] = index // 2
+        # 奇数个节点时最后一个直接上提（不复制，避免第二原像歧义）
+        level = [_parent(level[i], level[i + 1]) if i + 1 < len(level) else level[i]
+                 for i in range(0, len(level), 2)]
+    return level[0].hex(), proofs
+
+
+def merkle_root_from_proof(leaf_hash: str, proof) -> str:
+    """由叶子摘要和包含证明计算根"""
+    node = _leaf_node(leaf_hash)
+    for side, sibling in proof:
+        sibling = bytes.fromhex(sibling)
+        node = _parent(sibling, node) if side == 'L' else _parent(node, sibling)
+    return node.hex()
+
+
+def _signed_message(batch: dict) -> bytes:
+    """批次签名覆盖的字段（规范化 JSON）"""
+    fields = {key: batch[key] for key in
+              ('algorithm', 'batch_id', 'root', 'leaf_count', 'signed_at', 'key_fingerprint')}
+    return json.dumps(fields, sort_keys=True, separators=(',', ':')).encode('utf-8')
+
+
+def verify_batch_signature(batch: dict, trusted_fingerprints: Iterable[str]) -> bool:
+    """
+    验证批次根签名
+
+    批次文件中的公钥指纹必须在 trusted_fingerprints 中，且与文件中的公钥一致；
+    不在可信列表中的批次一律视为无效（不论签名本身是否自洽）。
+    """
+    try:
+        if batch['key_fingerprint'] not in trusted_fingerprints:
+            return False
+        public_key = serialization.load_pem_public_key(batch['public_key'].encode('utf-8'),
+                                                       backend=default_backend())
+        if public_key_fingerprint(public_key) != batch['key_fingerprint']:
+            return False
+        public_key.verify(bytes.fromhex(batch['signature']), _signed_message(batch),
+                          _PSS, hashes.SHA256())
+        return True
+    except (InvalidSignature, KeyError, ValueError):
+        return False
+
+
+def verify_inclusion(batch: dict, leaf_index: int, leaf_hash: str) -> bool:
+    """校验叶子是否包含在批次的根中（不验签名）"""
+    try:
+        entry = batch['leaves'][leaf_index]
+    except (KeyError, IndexError, TypeError):
+        return False
+    if entry['leaf_hash'] != leaf_hash:
+        return False
+    return merkle_root_from_proof(leaf_hash, entry['proof']) == batch['root']
+
+
+# ===================== 签名服务 =====================
+
+@dataclass
+class SignedBatch:
+    """已签名的批次"""
+    batch_id: str
+    root: str
+    leaf_count: int
+    path: str
+    sign_time: float
+    evidence_ids: List[str] = field(default_factory=list)
+
+
+class SigningService:
+    """批量签名服务（线程安全）"""
+
+    def __init__(self, key_path: str, batch_dir: str, batch_size: int = 64,
+                 max_delay: float = 30.0, password: Optional[bytes] = None,
+                 trusted_fingerprints: Iterable[str] = ()):
+        """
+        Args:
+            key_path: PEM 私钥路径（不存在时生成）
+            batch_dir: 批次签名文件目录
+            batch_size: 每批最多叶子数，满批立即签名
+            max_delay: 批次最长等待时间（秒，从第一条证据加入算起），超时后由后台线程签名；
+                       0 表示只在满批、flush 或 close 时签名
+            password: 私钥口令（可选）
+            trusted_fingerprints: 除本服务密钥外，校验时还信任的公钥指纹（如轮换前的旧密钥）
+        """
+        self.private_key = load_or_create_key(key_path, password=password)
+        self.public_key = self.private_key.public_key()
+        self.public_key_pem = public_key_pem(self.public_key)
+        self.key_fingerprint = public_key_fingerprint(self.public_key)
+        self.trusted_fingerprints = frozenset(trusted_fingerprints) | {self.key_fingerprint}
+        self.key_path = key_path
+        self.batch_dir = batch_dir
+        self.batch_size = max(1, batch_size)
+        self.max_delay = max_delay
+        os.makedirs(batch_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._listeners: List[Callable[[SignedBatch], None]] = []
+        self.stats = {'batches': 0, 'leaves': 0, 'sign_time': 0.0}
+        self._open_batch()
+
+        # 没有新证据时 add 不会被调用，未满的批次由后台线程按 max_delay 签名；
+        # 进程退出时签名剩余证据（正常关闭时应由所有者显式调用 close）
+        self._stop = threading.Event()
+        self._timer = None
+        if self.max_delay > 0:
+            self._timer = threading.Thread(target=self._flush_loop, name="signing-flush", daemon=True)
+            self._timer.start()
+        atexit.register(self.close)
+
+    def _open_batch(self):
+        self._batch_id = f"BATCH_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
+        self._leaves: List[Tuple[str, str]] = []
+        self._opened_at = time.time()
+
+    def batch_path(self, batch_id: str) -> str:
+        return os.path.join(self.batch_dir, f"{batch_id}.json")
+
+    def add_listener(self, listener: Callable[[SignedBatch], None]):
+        """批次签名完成后的回调（如写审计日志）"""
+        self._listeners.append(listener)
+
+    def add(self, evidence_id: str, content_hash: str) -> Dict[str, object]:
+        """
+        把一条证据加入当前批次
+
+        Returns:
+            写入证据包的签名引用（批次号、叶子序号、叶子摘要），批次签名在满批或 flush 时完成
+        """
+        leaf_hash = evidence_leaf(evidence_id, content_hash)
+        with self._lock:
+            if not self._leaves:
+                self._opened_at = time.time()
+            reference = {
+                'algorithm': MERKLE_ALGORITHM,
+                'batch_id': self._batch_id,
+                'leaf_index': len(self._leaves),
+                'leaf_hash': leaf_hash,
+                'key_fingerprint': self.key_fingerprint
+            }
+            self._leaves.append((evidence_id, leaf_hash))
+            if len(self._leaves) >= self.batch_size:
+                self._seal()
+        return reference
+
+    def flush(self) -> Optional[SignedBatch]:
+        """立即签名当前批次（空批次时不做任何事）"""
+        with self._lock:
+            return self._seal()
+
+    def _flush_loop(self):
+        """后台线程：批次自第一条证据起满 max_delay 秒即签名"""
+        timeout = self.max_delay
+        while not self._stop.wait(timeout):
+            with self._lock:
+                timeout = self.max_delay
+                if self._leaves:
+                    remaining = self._opened_at + self.max_delay - time.time()
+                    if remaining > 0:
+                        timeout = remaining
+                    else:
+                        try:
+                            self._seal()
+                        except Exception as e:
+                            print(f"❌ 批次签名失败: {e}")
+
+    def _seal(self) -> Optional[SignedBatch]:
+        if not self._leaves:
+            return None
+        start = time.perf_counter()
+        root, proofs = build_merkle_tree([leaf_hash for _, leaf_hash in self._leaves])
+        batch = {
+            'algorithm': MERKLE_ALGORITHM,
+            'batch_id': self._batch_id,
+            'root': root,
+            'leaf_count': len(self._leaves),
+            'signed_at': datetime.now(timezone.utc).isoformat(),
+            'key_fingerprint': self.key_fingerprint,
+        }
+        batch['signature'] = self.private_key.sign(_signed_message(batch), _PSS,
+                                                   hashes.SHA256()).hex()
+        batch['public_key'] = self.public_key_pem
+        batch['leaves'] = [{'evidence_id': evidence_id, 'leaf_hash': leaf_hash,
+                            'proof': [list(step) for step in proof]}
+                           for (evidence_id, leaf_hash), proof in zip(self._leaves, proofs)]
+
+        path = self.batch_path(self._batch_id)
+        temp_path = path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(batch, f, ensure_ascii=False, indent=1)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+
+        signed = SignedBatch(self._batch_id, root, len(self._leaves), path,
+                             time.perf_counter() - start,
+                             [evidence_id for evidence_id, _ in self._leaves])
+        self.stats['batches'] += 1
+        self.stats['leaves'] += signed.leaf_count
+        self.stats['sign_time'] += signed.sign_time
+        self._open_batch()
+        for listener in self._listeners:
+            listener(signed)
+        return signed
+
+    def load_batch(self, batch_id: str) -> dict:
+        with open(self.batch_path(batch_id), 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def verify_reference(self, reference: dict, evidence_id: str, content_hash: str) -> bool:
+        """校验证据包中的签名引用：叶子摘要、包含证明和批次根签名（仅信任 trusted_fingerprints）"""
+        if evidence_leaf(evidence_id, content_hash) != reference.get('leaf_hash'):
+            return False
+        try:
+            batch = self.load_batch(reference['batch_id'])
+        except (OSError, ValueError, KeyError):
+            return False
+        return (verify_inclusion(batch, reference.get('leaf_index'), reference['leaf_hash'])
+                and verify_batch_signature(batch, self.trusted_fingerprints))
+
+    def close(self):
+        """停止后台线程并签名剩余的证据（可重复调用）"""
+        self._stop.set()
+        if self._timer is not None and self._timer is not threading.current_thread():
+            self._timer.join()
+        self.flush()
+        atexit.unregister(self.close)
+
+
+__all__ = [
+    'DEFAULT_KEY_PATH',
+    'MERKLE_ALGORITHM',
+    'SIGNATURE_DIR_NAME',
+    'SignedBatch',
+    'SigningService',
+    'build_merkle_tree',
+    'evidence_leaf',
+    'load_or_create_key',
+    'load_trusted_fingerprints',
+    'merkle_root_from_proof',
+    'public_key_fingerprint',
+    'public_key_pem',
+    'verify_batch_signature',
+    'verify_inclusion',
+]
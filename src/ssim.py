@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+结构相似性 - 基于盒式滤波的窗口化 SSIM / MS-SSIM
+版本: 3.0.8
+
+局部均值、方差、协方差都用 cv2.boxFilter（积分图式的滑动求和，
+每像素 O(1)）计算，得到逐像素的 SSIM 图。SSIM 图再按水平条带
+求均值，用来判断"只有底部一条消息变了"这类局部变化——全局均值
+对这种变化几乎不敏感。
+"""
+
+from dataclasses import dataclass
+from typing import List, Optional, Sequence, Tuple, Union
+
+import cv2
+import numpy as np
+from PIL import Image
+
+
+# MS-SSIM 标准五级权重（Wang et al. 2003）
+MS_SSIM_WEIGHTS = (0.0448, 0.2856, 0.3001, 0.2363, 0.1333)
+
+ImageLike = Union[Image.Image, np.ndarray]
+
+
+@dataclass
+class SSIMResult:
+    """SSIM 计算结果"""
+    score: float                  # 全图平均 SSIM
+    band_scores: np.ndarray       # 每个水平条带的平均 SSIM（自上而下）
+    band_edges: np.ndarray        # 条带在缩放后图像中的起始行，末尾为总行数
+    scale: float                  # 计算时使用的缩放比例
+
+    @property
+    def min_band(self) -> float:
+        """最不相似条带的得分"""
+        return float(self.band_scores.min()) if len(self.band_scores) else self.score
+
+    def changed_bands(self, threshold: float = 0.95) -> List[int]:
+        """得分低于阈值的条带序号"""
+        return [int(i) for i in np.flatnonzero(self.band_scores < threshold)]
+
+    def band_rows(self, index: int) -> Tuple[int, int]:
+        """条带在原图中的行范围 [start, end)"""
+        start, end = self.band_edges[index], self.band_edges[index + 1]
+        return int(round(start / self.scale)), int(round(end / self.scale))
+
+
+def to_float_gray(image: ImageLike, scale: float = 1.0) -> np.ndarray:
+    """转换为 float32 灰度数组并按比例缩小（INTER_AREA）"""
+    if isinstance(image, Image.Image):
+        arr = np.asarray(image.convert('L'))
+    else:
+        arr = np.asarray(image)
+        if arr.ndim == 3:
+            arr = cv2.cvtColor(np.ascontiguousarray(arr[:, :, :3]), cv2.COLOR_RGB2GRAY)
+
+    if scale != 1.0:
+        width = max(1, int(round(arr.shape[1] * scale)))
+        height = max(1, int(round(arr.shape[0] * scale)))
+        arr = cv2.resize(arr, (width, height), interpolation=cv2.INTER_AREA)
+    return arr.astype(np.float32, copy=False)
+
+
+def _local_stats(x: np.ndarray, y: np.ndarray, window: int):
+    """盒式窗口内的均值、方差、协方差"""
+    ksize = (window, window)
+    border = cv2.BORDER_REFLECT
+    mu_x = cv2.boxFilter(x, -1, ksize, borderType=border)
+    mu_y = cv2.boxFilter(y, -1, ksize, borderType=border)
+    var_x = cv2.boxFilter(x * x, -1, ksize, borderType=border) - mu_x * mu_x
+    var_y = cv2.boxFilter(y * y, -1, ksize, borderType=border) - mu_y * mu_y
+    cov = cv2.boxFilter(x * y, -1, ksize, borderType=border) - mu_x * mu_y
+    return mu_x, mu_y, var_x, var_y, cov
+
+
+def ssim_maps(x: np.ndarray, y: np.ndarray, window: int = 7,
+              data_range: float = 255.0) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    计算逐像素的 SSIM 图和对比度-结构（cs）图
+
+    Args:
+        x, y: 同尺寸 float32 灰度数组
+        window: 盒式窗口边长
+        data_range: 像素值范围
+    """
+    if x.shape != y.shape:
+        raise ValueError(f"图像尺寸不一致: {x.shape} != {y.shape}")
+
+    c1 = (0.01 * data_range) ** 2
+    c2 = (0.03 * data_range) ** 2
+    mu_x, mu_y, var_x, var_y, cov = _local_stats(x, y, window)
+
+    cs_map = (2 * cov + c2) / (var_x + var_y + c2)
+    luminance = (2 * mu_x * mu_y + c1) / (mu_x * mu_x + mu_y * mu_y + c1)
+    return luminance * cs_map, cs_map
+
+
+def band_means(ssim_map: np.ndarray, bands: int) -> Tuple[np.ndarray, np.ndarray]:
+    """按水平条带求 SSIM 图的均值，返回 (得分, 条带边界)"""
+    height = ssim_map.shape[0]
+    bands = max(1, min(bands, height))
+    edges = np.linspace(0, height, bands + 1).astype(np.intp)
+    row_means = ssim_map.mean(axis=1)
+    sums = np.add.reduceat(row_means, edges[:-1])
+    return sums / np.diff(edges), edges
+
+
+def compute_ssim(image1: ImageLike, image2: ImageLike, scale: float = 0.25,
+                 window: int = 7, bands: int = 8,
+                 data_range: float = 255.0) -> SSIMResult:
+    """
+    窗口化 SSIM
+
+    Args:
+        image1, image2: PIL 图像或数组（灰度或 RGB）
+        scale: 计算前的缩放比例
+        window: 盒式窗口边长
+        bands: 水平条带数
+    """
+    x = to_float_gray(image1, scale)
+    y = to_float_gray(image2, scale)
+    return ssim_from_gray(x, y, window=window, bands=bands,
+                          data_range=data_range, scale=scale)
+
+
+def ssim_from_gray(x: np.ndarray, y: np.ndarray, window: int = 7, bands: int = 8,
+                   data_range: float = 255.0, scale: float = 1.0) -> SSIMResult:
+    """对已经缩放好的 float32 灰度数组计算窗口化 SSIM"""
+    window = max(1, min(window, x.shape[0], x.shape[1]))
+    ssim_map, _ = ssim_maps(x, y, window, data_range)
+    band_scores, edges = band_means(ssim_map, bands)
+    return SSIMResult(float(ssim_map.mean()), band_scores, edges, scale)
+
+
+def compute_ms_ssim(image1: ImageLike, image2: ImageLike, scale: float = 0.5,
+                    window: int = 7, levels: int = 3,
+                    weights: Optional[Sequence[float]] = None,
+                    data_range: float = 255.0) -> float:
+    """
+    多尺度 SSIM
+
+    每级用 2x2 平均下采样；前 levels-1 级只取对比度-结构项，
+    最后一级取完整 SSIM。默认取标准五级权重的前 levels 个并归一化。
+    """
+    if weights is None:
+        weights = MS_SSIM_WEIGHTS[:levels]
+    weights = np.asarray(weights, dtype=np.float64)
+    weights = weights / weights.sum()
+
+    x = to_float_gray(image1, scale)
+    y = to_float_gray(image2, scale)
+
+    result = 1.0
+    for level, weight in enumerate(weights):
+        win = max(1, min(window, x.shape[0], x.shape[1]))
+        ssim_map, cs_map = ssim_maps(x, y, win, data_range)
+        if level == len(weights) - 1:
+            value = ssim_map.mean()
+        else:
+            value = cs_map.mean()
+        # 负相关时按 0 处理，避免分数幂出现 NaN
+        result *= max(float(value), 0.0) ** weight
+
+        if level < len(weights) - 1:
+            if min(x.shape) < 2 * window:
+                # 图像太小，后续级别无法计算，剩余权重并入当前结果
+                result *= max(float(ssim_map.mean()), 0.0) ** weights[level + 1:].sum()
+                break
+            x = cv2.resize(x, (x.shape[1] // 2, x.shape[0] // 2), interpolation=cv2.INTER_AREA)
+            y = cv2.resize(y, (y.shape[1] // 2, y.shape[0] // 2), interpolation=cv2.INTER_AREA)
+
+    return result
+
+
+__all__ = [
+    'MS_SSIM_WEIGHTS',
+    'SSIMResult',
+    'to_float_gray',
+    'ssim_maps',
+    'band_means',
+    'compute_ssim',
+    'ssim_from_gray',
+    'compute_ms_ssim',
+]
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+系统指标采样器 - 后台线程统一采样，所有管理器共享读取
+版本: 3.0.8
+
+psutil.cpu_percent(interval=...) 会让调用线程阻塞整个采样间隔。
+这里由一个后台线程定期以非阻塞方式采样 CPU、内存、进程 RSS 和磁盘
+写入速率，每次生成一个不可变的 SystemMetrics 快照并整体替换引用发布；
+读取方只取引用，不加锁、不等待。
+"""
+
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+import psutil
+
+
+@dataclass(frozen=True)
+class SystemMetrics:
+    """一次系统指标采样（不可变快照）"""
+    timestamp: float = 0.0                # time.monotonic()
+    cpu_percent: float = 0.0              # 系统 CPU 占用率（最近一个采样周期）
+    cpu_percent_smoothed: float = 0.0     # EWMA 平滑后的 CPU 占用率
+    memory_percent: float = 0.0           # 系统内存占用率
+    memory_available_mb: float = 0.0      # 可用内存
+    rss_mb: float = 0.0                   # 本进程常驻内存
+    process_cpu_percent: float = 0.0      # 本进程 CPU 占用率
+    disk_write_mb_s: float = 0.0          # 系统磁盘写入速率
+
+
+class SystemMetricsSampler:
+    """后台系统指标采样器"""
+
+    def __init__(self, interval: float = 0.5, smoothing: float = 0.3):
+        """
+        Args:
+            interval: 采样间隔（秒）
+            smoothing: CPU 占用率 EWMA 系数
+        """
+        self.interval = interval
+        self.smoothing = smoothing
+        self._latest = SystemMetrics()
+        self._process = psutil.Process()
+        self._last_disk = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self.samples = 0
+
+    @property
+    def latest(self) -> SystemMetrics:
+        """最近一次快照（引用读取为原子操作，无需加锁）"""
+        return self._latest
+
+    @property
+    def cpu_percent(self) -> float:
+        return self._latest.cpu_percent
+
+    @property
+    def memory_percent(self) -> float:
+        return self._latest.memory_percent
+
+    @property
+    def rss_mb(self) -> float:
+        return self._latest.rss_mb
+
+    @property
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """启动采样线程（重复调用无副作用）"""
+        with self._start_lock:
+            if self.is_running:
+                return
+            self._stop.clear()
+            # 建立 CPU 计数基线，并同步生成第一份快照
+            psutil.cpu_percent(interval=None)
+            self._process.cpu_percent(interval=None)
+            self._sample()
+            self._thread = threading.Thread(target=self._run, daemon=True,
+                                            name="system_metrics_sampler")
+            self._thread.start()
+
+    def stop(self, timeout: float = 2.0):
+        """停止采样线程"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self._sample()
+            except Exception as e:
+                print(f"⚠️ 系统指标采样错误: {e}")
+
+    def _sample(self):
+        """采样一次并发布新快照"""
+        now = time.monotonic()
+        previous = self._latest
+
+        cpu = psutil.cpu_percent(interval=None)
+        if previous.timestamp == 0.0:
+            smoothed = cpu
+        else:
+            smoothed = previous.cpu_percent_smoothed * (1 - self.smoothing) + cpu * self.smoothing
+
+        memory = psutil.virtual_memory()
+        rss = self._process.memory_info().rss
+
+        disk_rate = 0.0
+        try:
+            disk = psutil.disk_io_counters()
+        except Exception:
+            disk = None
+        if disk is not None:
+            if self._last_disk is not None:
+                last_time, last_bytes = self._last_disk
+                elapsed = now - last_time
+                if elapsed > 0:
+                    disk_rate = max(0, disk.write_bytes - last_bytes) / elapsed / (1024**2)
+            self._last_disk = (now, disk.write_bytes)
+
+        self._latest = SystemMetrics(
+            timestamp=now,
+            cpu_percent=cpu,
+            cpu_percent_smoothed=smoothed,
+            memory_percent=memory.percent,
+            memory_available_mb=memory.available / (1024**2),
+            rss_mb=rss / (1024**2),
+            process_cpu_percent=self._process.cpu_percent(interval=None),
+            disk_write_mb_s=disk_rate
+        )
+        self.samples += 1
+
+
+# ===================== 进程共享采样器 =====================
+
+_shared_sampler: Optional[SystemMetricsSampler] = None
+_shared_lock = threading.Lock()
+
+
+def get_system_metrics() -> SystemMetricsSampler:
+    """获取进程共享的系统指标采样器（首次调用时启动）"""
+    global _shared_sampler
+    if _shared_sampler is None:
+        with _shared_lock:
+            if _shared_sampler is None:
+                sampler = SystemMetricsSampler()
+                sampler.start()
+                _shared_sampler = sampler
+    return _shared_sampler
+
+
+__all__ = [
+    'SystemMetrics',
+    'SystemMetricsSampler',
+    'get_system_metrics',
+]
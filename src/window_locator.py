@@ -0,0 +1,498 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+窗口定位缓存 - 按句柄/进程缓存微信窗口，廉价复验并后台刷新
+版本: 3.0.8
+
+WeChatDetector 原来每次检测都用 Desktop(backend='uia').windows() 遍历全部顶层
+窗口，并依次尝试标题、进程名、类名三种策略；界面上每点一次"自动检测微信"
+就新建一个检测器从头再来，窗口多的桌面上要好几秒。
+
+WindowLocator 把定位结果按窗口句柄缓存（同时按进程号索引）：
+- locate() 先对缓存的句柄做一次单窗口查询，核对匹配条件和矩形即返回（毫秒级），
+  只有窗口关闭、不再匹配或缩得过小时才做一次完整枚举；
+- 完整枚举一遍完成三种策略的匹配与排序，候选窗口全部进入缓存，
+  主窗口失效时先在同进程的缓存窗口中找替补；
+- prewarm() 在程序启动时后台完成首次枚举，start_refresh() 周期复验缓存的窗口，
+  窗口移动、失效时通知监听者。
+
+窗口来源通过 WindowProvider 抽象：PywinautoWindowProvider 使用 win32 句柄查询
+（pywinauto 按需导入），FakeWindowProvider 在内存中模拟窗口，供无桌面环境驱动。
+"""
+
+import itertools
+import threading
+import time
+from dataclasses import dataclass, field, replace
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+
+Rect = Tuple[int, int, int, int]  # (left, top, right, bottom)
+
+# 微信窗口的默认匹配规则（标题按子串匹配，"微信-xxx" 等变体无需单独列出）
+WECHAT_TITLES = ('微信', 'WeChat', 'Wechat')
+WECHAT_PROCESS_NAMES = ('WeChat.exe', 'wechat.exe', 'WeChatApp.exe')
+WECHAT_CLASS_NAMES = ('WeChatMainWndForPC', 'ChatWnd', 'WeChatWnd')
+
+
+@dataclass
+class WindowInfo:
+    """顶层窗口快照"""
+    handle: int
+    title: str
+    rect: Rect
+    pid: int = 0
+    class_name: str = ''
+    process_name: str = ''
+    visible: bool = True
+    checked_at: float = field(default_factory=time.monotonic)
+
+    @property
+    def width(self) -> int:
+        return self.rect[2] - self.rect[0]
+
+    @property
+    def height(self) -> int:
+        return self.rect[3] - self.rect[1]
+
+    @property
+    def region(self) -> Tuple[int, int, int, int]:
+        """(x, y, width, height)，与截图区域同一格式"""
+        return (self.rect[0], self.rect[1], self.width, self.height)
+
+
+# ===================== 窗口来源 =====================
+
+class WindowProvider:
+    """窗口来源基类"""
+
+    name = "base"
+
+    def list_windows(self) -> List[WindowInfo]:
+        """枚举全部顶层窗口（开销大）"""
+        raise NotImplementedError
+
+    def query(self, handle: int) -> Optional[WindowInfo]:
+        """查询单个窗口的当前状态（开销小），窗口已不存在时返回 None"""
+        raise NotImplementedError
+
+    def wrap(self, handle: int) -> Any:
+        """返回可操作的窗口对象（set_focus/rectangle/window_text 等）"""
+        raise NotImplementedError
+
+
+class PywinautoWindowProvider(WindowProvider):
+    """基于 pywinauto 的 Windows 实现：枚举与复验走 win32 句柄，操作对象用 UIA 包装"""
+
+    name = "pywinauto"
+
+    def __init__(self, wrapper_backend: str = 'uia'):
+        from pywinauto import findwindows, handleprops
+        self._findwindows = findwindows
+        self._handleprops = handleprops
+        self.wrapper_backend = wrapper_backend
+        self._process_names: Dict[int, str] = {}
+
+    @classmethod
+    def is_available(cls) -> bool:
+        try:
+            import pywinauto  # noqa: F401
+            return True
+        except Exception:
+            return False
+
+    def _process_name(self, pid: int) -> str:
+        name = self._process_names.get(pid)
+        if name is None:
+            try:
+                import psutil
+                name = psutil.Process(pid).name()
+            except Exception:
+                name = ''
+            self._process_names[pid] = name
+        return name
+
+    def list_windows(self) -> List[WindowInfo]:
+        windows = []
+        for element in self._findwindows.find_elements(backend='win32', top_level_only=True):
+            try:
+                rect = element.rectangle
+                pid = element.process_id
+                windows.append(WindowInfo(
+                    handle=element.handle, title=element.name or '',
+                    rect=(rect.left, rect.top, rect.right, rect.bottom),
+                    pid=pid, class_name=element.class_name or '',
+                    process_name=self._process_name(pid), visible=element.visible))
+            except Exception:
+                continue
+        return windows
+
+    def query(self, handle: int) -> Optional[WindowInfo]:
+        props = self._handleprops
+        try:
+            if not props.iswindow(handle):
+                return None
+            rect = props.rectangle(handle)
+            pid = props.processid(handle)
+            return WindowInfo(
+                handle=handle, title=props.text(handle) or '',
+                rect=(rect.left, rect.top, rect.right, rect.bottom),
+                pid=pid, class_name=props.classname(handle) or '',
+                process_name=self._process_name(pid), visible=bool(props.isvisible(handle)))
+        except Exception:
+            return None
+
+    def wrap(self, handle: int) -> Any:
+        from pywinauto import Desktop
+        return Desktop(backend=self.wrapper_backend).window(handle=handle).wrapper_object()
+
+
+class _FakeRect:
+    def __init__(self, rect: Rect):
+        self.left, self.top, self.right, self.bottom = rect
+
+    def width(self) -> int:
+        return self.right - self.left
+
+    def height(self) -> int:
+        return self.bottom - self.top
+
+
+class FakeWindow:
+    """FakeWindowProvider 返回的窗口对象（接口与 pywinauto 包装对象一致）"""
+
+    def __init__(self, provider: 'FakeWindowProvider', handle: int):
+        self._provider = provider
+        self.handle = handle
+
+    def _info(self) -> WindowInfo:
+        info = self._provider.windows.get(self.handle)
+        if info is None:
+            raise RuntimeError(f"窗口已关闭: {self.handle}")
+        return info
+
+    def window_text(self) -> str:
+        return self._info().title
+
+    def rectangle(self) -> _FakeRect:
+        return _FakeRect(self._info().rect)
+
+    def is_visible(self) -> bool:
+        return self._info().visible
+
+    def set_focus(self):
+        self._info()
+        self._provider.focused = self.handle
+        return self
+
+    def has_focus(self) -> bool:
+        return self._provider.focused == self.handle
+
+
+class FakeWindowProvider(WindowProvider):
+    """内存中的窗口来源，可增删、移动、改名窗口并统计枚举/查询次数"""
+
+    name = "fake"
+
+    def __init__(self, list_delay: float = 0.0):
+        """
+        Args:
+            list_delay: 每次完整枚举额外耗时（秒），用于模拟窗口很多的桌面
+        """
+        self.windows: Dict[int, WindowInfo] = {}
+        self.list_delay = list_delay
+        self.list_calls = 0
+        self.query_calls = 0
+        self.focused: Optional[int] = None
+        self._handles = itertools.count(0x10000, 2)
+        self._lock = threading.Lock()
+
+    def add_window(self, title: str, rect: Rect, pid: int = 1000, class_name: str = '',
+                   process_name: str = '', visible: bool = True) -> int:
+        """添加窗口，返回句柄"""
+        with self._lock:
+            handle = next(self._handles)
+            self.windows[handle] = WindowInfo(handle, title, tuple(rect), pid, class_name,
+                                              process_name, visible)
+        return handle
+
+    def update_window(self, handle: int, **changes):
+        """修改窗口属性（title/rect/visible 等）"""
+        with self._lock:
+            self.windows[handle] = replace(self.windows[handle], **changes)
+
+    def remove_window(self, handle: int):
+        """关闭窗口"""
+        with self._lock:
+            self.windows.pop(handle, None)
+
+    def list_windows(self) -> List[WindowInfo]:
+        self.list_calls += 1
+        if self.list_delay:
+            time.sleep(self.list_delay)
+        with self._lock:
+            return [replace(info, checked_at=time.monotonic()) for info in self.windows.values()]
+
+    def query(self, handle: int) -> Optional[WindowInfo]:
+        self.query_calls += 1
+        with self._lock:
+            info = self.windows.get(handle)
+            return replace(info, checked_at=time.monotonic()) if info else None
+
+    def wrap(self, handle: int) -> FakeWindow:
+        return FakeWindow(self, handle)
+
+
+def create_window_provider() -> WindowProvider:
+    """创建当前主机可用的窗口来源"""
+    if PywinautoWindowProvider.is_available():
+        return PywinautoWindowProvider()
+    raise RuntimeError("没有可用的窗口来源（需要 Windows 和 pywinauto）")
+
+
+# ===================== 定位缓存 =====================
+
+class WindowLocator:
+    """按句柄/进程缓存目标窗口的定位器"""
+
+    def __init__(self, provider: Optional[WindowProvider] = None,
+                 titles: Sequence[str] = WECHAT_TITLES,
+                 process_names: Sequence[str] = WECHAT_PROCESS_NAMES,
+                 class_names: Sequence[str] = WECHAT_CLASS_NAMES,
+                 min_size: Tuple[int, int] = (300, 400)):
+        """
+        Args:
+            provider: 窗口来源（为 None 时首次使用时调用 create_window_provider）
+            titles: 标题包含其一即视为候选
+            process_names / class_names: 进程名或类名命中其一也视为候选，并提高排序
+            min_size: 候选窗口的最小 (宽, 高)
+        """
+        self._provider = provider
+        self.titles = tuple(titles)
+        self.process_names = {name.lower() for name in process_names}
+        self.class_names = set(class_names)
+        self.min_size = min_size
+
+        self._lock = threading.RLock()
+        self._current: Optional[WindowInfo] = None
+        self._cache: Dict[int, WindowInfo] = {}
+        self._by_pid: Dict[int, List[int]] = {}
+        self._listeners: List[Callable[[Optional[WindowInfo], Optional[WindowInfo]], None]] = []
+
+        self._stop = threading.Event()
+        self._refresh_thread: Optional[threading.Thread] = None
+        self._prewarm_thread: Optional[threading.Thread] = None
+
+        self.stats = {'hits': 0, 'fallbacks': 0, 'scans': 0, 'invalidations': 0}
+
+    @property
+    def provider(self) -> WindowProvider:
+        if self._provider is None:
+            self._provider = create_window_provider()
+        return self._provider
+
+    # ---------- 匹配 ----------
+
+    def matches(self, info: WindowInfo) -> bool:
+        """窗口是否仍是有效的目标（可见、尺寸足够，标题、进程名、类名任一匹配）"""
+        if not (info.visible
+                and info.width >= self.min_size[0] and info.height >= self.min_size[1]):
+            return False
+        return (any(pattern in info.title for pattern in self.titles)
+                or info.process_name.lower() in self.process_names
+                or info.class_name in self.class_names)
+
+    def _rank(self, info: WindowInfo) -> tuple:
+        return (info.class_name in self.class_names,
+                info.process_name.lower() in self.process_names,
+                info.width * info.height)
+
+    # ---------- 缓存 ----------
+
+    def _remember(self, candidates: List[WindowInfo]):
+        self._cache = {info.handle: info for info in candidates}
+        self._by_pid = {}
+        for info in candidates:
+            self._by_pid.setdefault(info.pid, []).append(info.handle)
+
+    def _forget(self, handle: int):
+        info = self._cache.pop(handle, None)
+        if info is not None:
+            handles = self._by_pid.get(info.pid, [])
+            if handle in handles:
+                handles.remove(handle)
+
+    def _set_current(self, info: Optional[WindowInfo]):
+        previous = self._current
+        self._current = info
+        if info is not None:
+            self._cache[info.handle] = info
+        if previous is None and info is None:
+            return
+        changed = (previous is None or info is None or previous.handle != info.handle
+                   or previous.rect != info.rect or previous.title != info.title)
+        if changed:
+            if previous is not None:
+                self.stats['invalidations'] += 1
+            for listener in list(self._listeners):
+                try:
+                    listener(previous, info)
+                except Exception as e:
+                    print(f"窗口变化回调失败: {e}")
+
+    def _revalidate(self, handle: int) -> Optional[WindowInfo]:
+        info = self.provider.query(handle)
+        if info is None or not self.matches(info):
+            self._forget(handle)
+            return None
+        return info
+
+    def _fallback_handles(self, failed: WindowInfo) -> List[int]:
+        """主窗口失效后的替补顺序：同进程的缓存窗口优先"""
+        same_pid = [h for h in self._by_pid.get(failed.pid, []) if h != failed.handle]
+        others = [h for h in self._cache if h != failed.handle and h not in same_pid]
+        return same_pid + others
+
+    def scan(self) -> Optional[WindowInfo]:
+        """完整枚举一次顶层窗口并重建缓存"""
+        candidates = [info for info in self.provider.list_windows() if self.matches(info)]
+        candidates.sort(key=self._rank, reverse=True)
+        with self._lock:
+            self.stats['scans'] += 1
+            self._remember(candidates)
+            self._set_current(candidates[0] if candidates else None)
+            return self._current
+
+    def locate(self, max_age: float = 0.0) -> Optional[WindowInfo]:
+        """
+        定位目标窗口
+
+        Args:
+            max_age: 缓存结果在该秒数内复验过则直接返回（0 表示总是复验句柄）
+
+        Returns:
+            WindowInfo，找不到时返回 None
+        """
+        with self._lock:
+            current = self._current
+            if current is not None:
+                if max_age and time.monotonic() - current.checked_at <= max_age:
+                    self.stats['hits'] += 1
+                    return current
+                info = self._revalidate(current.handle)
+                if info is not None:
+                    self.stats['hits'] += 1
+                    self._set_current(info)
+                    return info
+                for handle in self._fallback_handles(current):
+                    info = self._revalidate(handle)
+                    if info is not None:
+                        self.stats['fallbacks'] += 1
+                        self._set_current(info)
+                        return info
+        return self.scan()
+
+    def current(self) -> Optional[WindowInfo]:
+        """最近一次定位结果（不复验）"""
+        return self._current
+
+    def window_object(self, info: Optional[WindowInfo] = None) -> Any:
+        """定位结果对应的可操作窗口对象"""
+        info = info or self._current
+        return self.provider.wrap(info.handle) if info is not None else None
+
+    def invalidate(self):
+        """丢弃全部缓存（下次 locate 重新枚举）"""
+        with self._lock:
+            self._cache.clear()
+            self._by_pid.clear()
+            self._set_current(None)
+
+    def add_listener(self, callback: Callable[[Optional[WindowInfo], Optional[WindowInfo]], None]):
+        """窗口出现、移动、改名、切换或消失时回调 callback(旧窗口, 新窗口)"""
+        self._listeners.append(callback)
+
+    # ---------- 后台预热与刷新 ----------
+
+    def prewarm(self) -> threading.Thread:
+        """在后台完成首次枚举，之后的 locate 直接命中缓存"""
+        if self._prewarm_thread is None or not self._prewarm_thread.is_alive():
+            self._prewarm_thread = threading.Thread(target=self._safe_locate,
+                                                    name="WindowLocatorPrewarm", daemon=True)
+            self._prewarm_thread.start()
+        return self._prewarm_thread
+
+    def start_refresh(self, interval: float = 2.0, max_interval: float = 30.0):
+        """
+        启动后台刷新线程：每 interval 秒复验一次缓存窗口，失效时重新定位
+
+        没有缓存窗口（微信未启动）时每次刷新都是一次完整枚举，此时间隔按倍数
+        退避到最长 max_interval 秒，找到窗口后恢复；主动调用 locate 不受影响。
+        """
+        if self._refresh_thread is not None and self._refresh_thread.is_alive():
+            return
+        self._stop.clear()
+
+        def run():
+            delay = interval
+            while not self._stop.wait(delay):
+                found = self._safe_locate()
+                delay = interval if found is not None else min(delay * 2, max_interval)
+
+        self._refresh_thread = threading.Thread(target=run, name="WindowLocatorRefresh", daemon=True)
+        self._refresh_thread.start()
+
+    def _safe_locate(self) -> Optional[WindowInfo]:
+        try:
+            return self.locate()
+        except Exception as e:
+            print(f"后台定位窗口失败: {e}")
+            return None
+
+    def close(self):
+        """停止后台线程"""
+        self._stop.set()
+        for thread in (self._refresh_thread, self._prewarm_thread):
+            if thread is not None and thread is not threading.current_thread():
+                thread.join(timeout=1.0)
+        self._refresh_thread = None
+
+
+_default_locator: Optional[WindowLocator] = None
+_default_lock = threading.Lock()
+
+
+def get_window_locator() -> WindowLocator:
+    """获取进程共享的微信窗口定位器"""
+    global _default_locator
+    if _default_locator is None:
+        with _default_lock:
+            if _default_locator is None:
+                _default_locator = WindowLocator()
+    return _default_locator
+
+
+def set_window_locator(locator: Optional[WindowLocator]):
+    """替换进程共享的定位器（None 表示下次重新创建）"""
+    global _default_locator
+    with _default_lock:
+        if _default_locator is not None and _default_locator is not locator:
+            _default_locator.close()
+        _default_locator = locator
+
+
+__all__ = [
+    'Rect',
+    'WECHAT_TITLES',
+    'WECHAT_PROCESS_NAMES',
+    'WECHAT_CLASS_NAMES',
+    'WindowInfo',
+    'WindowProvider',
+    'PywinautoWindowProvider',
+    'FakeWindow',
+    'FakeWindowProvider',
+    'create_window_provider',
+    'WindowLocator',
+    'get_window_locator',
+    'set_window_locator',
+]
@@ -0,0 +1,26 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试公共配置 - 源码目录路径和共用的 fixture
+"""
+
+import os
+import sys
+
+import pytest
+
+# 添加源码目录到路径（src 内模块使用平铺导入）
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(project_root, 'src'))
+
+
+@pytest.fixture
+def compliance(tmp_path, monkeypatch):
+    """在临时目录里创建的合规服务（固定登录用户，不启用数据库）"""
+    from enhanced_legal_compliance import EnhancedLegalCompliance
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(os, 'getlogin', lambda: 'tester', raising=False)
+    service = EnhancedLegalCompliance(database=False, key_path=str(tmp_path / 'keys' / 'legit.pem'))
+    yield service
+    service.close()
@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+证据存储测试 - 关闭日志后仍能读取和校验已封存的记录
+"""
+
+import pytest
+
+from evidence_store import EvidenceStore
+
+
+def _sealed_store(journal_path, count=3) -> EvidenceStore:
+    store = EvidenceStore(str(journal_path))
+    for i in range(count):
+        store.add({'evidence_id': f'EVD_{i}', 'payload': i})
+    store.seal_all()
+    return store
+
+
+def test_closed_store_reads_from_journal(tmp_path):
+    store = _sealed_store(tmp_path / 'chain.jsonl')
+    store.close()
+
+    assert store.get('EVD_1')['payload'] == 1
+    assert [record['evidence_id'] for record in store.iter_sealed()] == ['EVD_0', 'EVD_1', 'EVD_2']
+    assert store.verify() == (True, 3, None)
+    store.close()
+
+
+def test_closed_store_rejects_new_seals(tmp_path):
+    store = _sealed_store(tmp_path / 'chain.jsonl')
+    store.close()
+
+    store.add({'evidence_id': 'EVD_9'})
+    with pytest.raises(ValueError):
+        store.seal('EVD_9')
+    assert store.pending_count == 1 and store.verify() == (True, 3, None)
+    store.close()
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+断点续验测试 - 依赖文件（被引用的截图、批次文件）变化后必须重新校验
+"""
+
+import os
+
+from evidence_verifier import EvidenceVerifier
+
+
+def _verify(compliance):
+    verifier = EvidenceVerifier(workers=1, progress_interval=0,
+                                trusted_fingerprints=compliance.signing.trusted_fingerprints)
+    return verifier.verify(str(compliance.evidence_storage_path), resume=True)
+
+
+def test_resume_reverifies_when_referenced_screenshot_changes(compliance, tmp_path):
+    screenshot = tmp_path / 'shot.png'
+    screenshot.write_bytes(b'original screenshot bytes')
+    compliance.process_screenshot_file(str(screenshot), {'case_id': 'C1'})
+    compliance.flush_signatures()
+
+    first = _verify(compliance)
+    assert first.passed and first.valid == 2 and first.resumed == 0
+
+    second = _verify(compliance)
+    assert second.passed and second.resumed == 2
+
+    # 同样大小的内容替换，只有修改时间变了
+    screenshot.write_bytes(b'tampered screenshot bytes')
+    stat = screenshot.stat()
+    os.utime(str(screenshot), ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+    third = _verify(compliance)
+    assert not third.passed
+    assert third.resumed == 1      # 只有批次文件沿用检查点
+    assert third.failures[0]['reason'] == '载荷哈希不符'
+
+
+def test_resume_reverifies_when_batch_file_changes(compliance):
+    compliance.process_screenshot_evidence(b'original screenshot', {'case_id': 'C1'})
+    batch = compliance.flush_signatures()
+    assert _verify(compliance).valid == 2
+
+    os.remove(compliance.signing.batch_path(batch.batch_id))
+    summary = _verify(compliance)
+    assert summary.resumed == 0 and summary.invalid == 1
+    assert summary.failures[0]['reason'].startswith('批次签名文件缺失')
+
+
+def test_resume_reverifies_when_trusted_keys_change(compliance):
+    compliance.process_screenshot_evidence(b'original screenshot', {'case_id': 'C1'})
+    compliance.flush_signatures()
+    assert _verify(compliance).valid == 2
+
+    verifier = EvidenceVerifier(workers=1, progress_interval=0, trusted_fingerprints=['0' * 64])
+    summary = verifier.verify(str(compliance.evidence_storage_path), resume=True)
+    assert summary.resumed == 0 and summary.invalid == 2
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+帧归档测试 - 崩溃留下的不完整尾部记录在续写前必须截掉
+"""
+
+import numpy as np
+
+from frame_archive import FrameArchive
+
+
+def _frame(seed: int) -> np.ndarray:
+    return np.random.RandomState(seed).randint(0, 256, (64, 300, 3), dtype=np.uint8)
+
+
+def test_reopen_after_partial_tail_keeps_new_frames(tmp_path):
+    root = str(tmp_path / 'archive')
+    archive = FrameArchive(root)
+    for i in range(3):
+        archive.add_frame(_frame(i), f'f{i}')
+    archive.close()
+
+    # 模拟崩溃：索引多出半条记录，清单多出半行
+    with open(archive.index_path, 'ab') as f:
+        f.write(b'\x01\x02\x03')
+    with open(archive.manifest_path, 'ab') as f:
+        f.write(b'{"frame_id": "f9", "ba')
+
+    archive = FrameArchive(root)
+    for i in range(3, 6):
+        archive.add_frame(_frame(i), f'f{i}')
+    archive.close()
+
+    archive = FrameArchive(root)
+    try:
+        assert list(archive.iter_frame_ids()) == [f'f{i}' for i in range(6)]
+        results = archive.verify_all()
+        assert all(results.values()) and len(results) == 6
+        np.testing.assert_array_equal(archive.reconstruct('f4'), _frame(4))
+    finally:
+        archive.close()
@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+签名服务测试 - 未满的批次按 max_delay 由后台线程签名，close 签名剩余证据
+"""
+
+import os
+import time
+
+from signing_service import SigningService
+
+
+def test_partial_batch_signed_after_max_delay(tmp_path):
+    signed = []
+    service = SigningService(str(tmp_path / 'key.pem'), str(tmp_path / 'signatures'),
+                             batch_size=64, max_delay=0.2)
+    service.add_listener(signed.append)
+    try:
+        reference = service.add('EVD_1', '0' * 64)
+        deadline = time.time() + 5
+        while not signed and time.time() < deadline:
+            time.sleep(0.05)
+        assert [batch.batch_id for batch in signed] == [reference['batch_id']]
+        assert os.path.exists(service.batch_path(reference['batch_id']))
+    finally:
+        service.close()
+
+
+def test_close_signs_remaining_evidence(tmp_path):
+    service = SigningService(str(tmp_path / 'key.pem'), str(tmp_path / 'signatures'),
+                             batch_size=64, max_delay=0)
+    reference = service.add('EVD_1', '0' * 64)
+    assert not os.path.exists(service.batch_path(reference['batch_id']))
+    service.close()
+    assert os.path.exists(service.batch_path(reference['batch_id']))
+    service.close()
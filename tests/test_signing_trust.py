@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+签名信任回归测试 - 用别的密钥伪造的批次签名不能通过校验
+
+批次文件自带公钥，只按文件内的公钥验签时，攻击者可以改写证据内容，
+再放进一个用自己密钥签名的批次文件。验证方必须只信任配置的公钥指纹。
+"""
+
+from enhanced_legal_compliance import DigitalSignature
+from evidence_verifier import EvidenceVerifier
+from signing_service import SigningService, load_or_create_key, load_trusted_fingerprints
+
+
+def _forge(compliance, package, tmp_path, content: bytes):
+    """改写证据内容，并用攻击者自己的密钥签一个同目录下的批次"""
+    attacker = SigningService(str(tmp_path / 'keys' / 'attacker.pem'),
+                              str(compliance.evidence_storage_path / 'signatures'))
+    forged = dict(package)
+    forged['evidence_data'] = dict(package['evidence_data'], content=content, size=len(content))
+    content_hash = compliance.iso27037.calculate_hash(content)
+    forged['integrity_verification'] = dict(package['integrity_verification'],
+                                            content_hash=content_hash)
+    forged['digital_signature'] = attacker.add(package['evidence_id'], content_hash)
+    attacker.close()
+    return forged
+
+
+def test_verify_reference_rejects_foreign_batch(compliance, tmp_path):
+    package = compliance.process_screenshot_evidence(b'original screenshot', {'case_id': 'C1'})
+    assert compliance.verify_evidence_integrity(package)
+
+    forged = _forge(compliance, package, tmp_path, b'tampered screenshot')
+    assert not compliance.verify_evidence_integrity(forged)
+
+
+def test_evidence_verifier_rejects_foreign_batch(compliance, tmp_path):
+    package = compliance.process_screenshot_evidence(b'original screenshot', {'case_id': 'C1'})
+    compliance.flush_signatures()
+    root = str(compliance.evidence_storage_path)
+    trusted = load_trusted_fingerprints([str(tmp_path / 'keys' / 'legit.pem')])
+
+    summary = EvidenceVerifier(workers=1, progress_interval=0,
+                               trusted_fingerprints=trusted).verify(root, resume=False)
+    assert summary.passed and summary.valid == 2
+
+    compliance._save_evidence(_forge(compliance, package, tmp_path, b'tampered screenshot'))
+    summary = EvidenceVerifier(workers=1, progress_interval=0,
+                               trusted_fingerprints=trusted).verify(root, resume=False)
+    assert not summary.passed
+    reasons = {failure['reason'] for failure in summary.failures}
+    assert reasons == {'批次签名公钥不受信任'}
+    assert summary.invalid == 2   # 伪造的证据包 + 攻击者的批次文件
+
+
+def test_evidence_verifier_without_trusted_keys_accepts_nothing(compliance):
+    compliance.process_screenshot_evidence(b'original screenshot', {'case_id': 'C1'})
+    compliance.flush_signatures()
+    summary = EvidenceVerifier(workers=1, progress_interval=0).verify(
+        str(compliance.evidence_storage_path), resume=False)
+    assert summary.valid == 0 and summary.invalid == 2
+
+
+def _legacy_package(compliance, private_key, content: bytes):
+    """3.0.7 格式：逐包 RSA-PSS 签名，包内附带签名公钥"""
+    package = compliance.iso27037.create_evidence_package(
+        {'type': 'screenshot', 'content': content, 'metadata': {}, 'size': len(content)})
+    signer = DigitalSignature(private_key)
+    package['digital_signature'] = {
+        'algorithm': 'RSA-PSS-SHA256',
+        'signature': signer.sign_data(content).hex(),
+        'public_key': signer.export_public_key().decode('utf-8')
+    }
+    return package
+
+
+def test_legacy_signature_requires_trusted_key(compliance, tmp_path):
+    legit = _legacy_package(compliance, compliance.signing.private_key, b'legacy screenshot')
+    assert compliance.verify_evidence_integrity(legit)
+
+    attacker_key = load_or_create_key(str(tmp_path / 'keys' / 'attacker.pem'))
+    forged = _legacy_package(compliance, attacker_key, b'tampered screenshot')
+    assert not compliance.verify_evidence_integrity(forged)
+
+    compliance.package_format = 'json'
+    compliance._save_evidence(legit)
+    compliance._save_evidence(forged)
+    trusted = load_trusted_fingerprints([str(tmp_path / 'keys' / 'legit.pem')])
+    summary = EvidenceVerifier(workers=1, progress_interval=0,
+                               trusted_fingerprints=trusted).verify(
+        str(compliance.evidence_storage_path), resume=False)
+    assert summary.valid == 1 and summary.invalid == 1
+    assert summary.failures[0]['evidence_id'] == forged['evidence_id']
+    assert summary.failures[0]['reason'] == '签名公钥不受信任'
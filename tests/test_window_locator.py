@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+窗口定位测试 - 用 FakeWindowProvider 驱动标题/进程名/类名匹配与缓存复验
+"""
+
+from window_locator import FakeWindowProvider, WindowLocator
+
+RECT = (0, 0, 800, 600)
+
+
+def test_window_matched_by_process_or_class_without_wechat_title():
+    provider = FakeWindowProvider()
+    provider.add_window('记事本', RECT, pid=1, process_name='notepad.exe')
+    by_class = provider.add_window('', RECT, pid=2, class_name='WeChatMainWndForPC')
+    locator = WindowLocator(provider)
+    assert locator.locate().handle == by_class
+
+    provider.remove_window(by_class)
+    by_process = provider.add_window('Weixin', RECT, pid=3, process_name='WeChat.exe')
+    assert locator.locate().handle == by_process
+
+
+def test_candidates_must_be_visible_and_large_enough():
+    provider = FakeWindowProvider()
+    provider.add_window('微信', (0, 0, 200, 200), pid=1)
+    provider.add_window('WeChat', RECT, pid=2, visible=False)
+    provider.add_window('', RECT, pid=3, process_name='WeChat.exe', visible=False)
+    locator = WindowLocator(provider)
+    assert locator.locate() is None
+
+    titled = provider.add_window('微信', RECT, pid=4)
+    assert locator.locate().handle == titled
+
+
+def test_process_and_class_matches_rank_above_title_only():
+    provider = FakeWindowProvider()
+    provider.add_window('微信 - 浏览器', (0, 0, 1600, 1000), pid=1, process_name='chrome.exe')
+    main = provider.add_window('', RECT, pid=2, class_name='WeChatMainWndForPC',
+                               process_name='WeChat.exe')
+    locator = WindowLocator(provider)
+    assert locator.locate().handle == main
+
+
+def test_cached_window_revalidated_without_rescan():
+    provider = FakeWindowProvider()
+    handle = provider.add_window('', RECT, pid=2, class_name='WeChatMainWndForPC')
+    locator = WindowLocator(provider)
+    assert locator.locate().handle == handle
+    assert provider.list_calls == 1
+
+    # 改名不影响按类名匹配的窗口，复验命中缓存不再枚举
+    provider.update_window(handle, title='Weixin', rect=(10, 10, 810, 610))
+    info = locator.locate()
+    assert info.handle == handle and info.rect == (10, 10, 810, 610)
+    assert provider.list_calls == 1
+    assert locator.stats['hits'] == 1
@@ -10,6 +10,10 @@
 - debug_run.py: 调试运行脚本
 - quick_start.py: 快速启动脚本
 - simple_test.py: 简单测试脚本
+- benchmark_pipeline.py: 无显示器滚动截图管道压测
+- benchmark_ssim.py: SSIM 微基准（旧版全局近似 vs 窗口化 SSIM / MS-SSIM）
+- benchmark_codecs.py: 截图编码器速度/体积基准
+- benchmark_layout.py: 微信界面布局分析基准（旧版逐区域分析 vs 单遍积分投影）
 
 版本: v3.0.6
 作者: 智能截图工具开发团队
@@ -22,6 +26,6 @@ __author__ = "智能截图工具开发团队"
 TOOLS_INFO = {
     "version": "3.0.8",
     "last_updated": "2024-12-19",
-    "total_tools": 4,
+    "total_tools": 8,
     "status": "活跃维护中"
 }
\ No newline at end of file
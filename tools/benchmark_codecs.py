@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+截图编码器基准 - 测量各预设的编码速度与输出体积
+
+在合成聊天记录（或回放的 PNG 目录）上逐帧编码，输出每个编码器的
+原始数据吞吐量（MB/s）、平均每帧字节数与压缩比，并校验无损编码器
+能否逐像素还原，便于按部署环境选择 fastest / balanced / smallest。
+
+用法:
+    python tools/benchmark_codecs.py
+    python tools/benchmark_codecs.py --width 1920 --height 1080 --frames 10
+    python tools/benchmark_codecs.py --replay frames/ --variants
+"""
+
+import argparse
+import io
+import os
+import sys
+import time
+
+import numpy as np
+from PIL import Image
+
+# 添加源码目录到路径（src 内模块使用平铺导入）
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(project_root, 'src'))
+
+from capture_backends import render_chat_transcript
+from image_codecs import CODEC_PRESETS, WEBP_AVAILABLE, PNGCodec, WebPCodec
+
+
+def load_frames(args) -> list:
+    """准备测试帧：回放目录中的 PNG，或从合成聊天记录中按屏切出"""
+    if args.replay:
+        names = sorted(n for n in os.listdir(args.replay) if n.lower().endswith('.png'))
+        return [Image.open(os.path.join(args.replay, n)).convert('RGB')
+                for n in names[:args.frames]]
+
+    messages = max(40, args.height * args.frames // 40)
+    canvas = render_chat_transcript(args.width, messages, args.seed)
+    rgb = canvas[:, :, 2::-1]
+    step = max(1, (rgb.shape[0] - args.height) // max(1, args.frames))
+    return [Image.fromarray(np.ascontiguousarray(rgb[i * step:i * step + args.height]))
+            for i in range(args.frames)]
+
+
+def candidate_codecs(variants: bool) -> dict:
+    """预设编码器，以及可选的额外参数组合"""
+    codecs = {f"preset:{name}": codec for name, codec in CODEC_PRESETS.items()}
+    codecs["png-9-optimize(旧版默认)"] = PNGCodec(compress_level=9, optimize=True)
+    if variants:
+        for level in (0, 3, 9):
+            codecs[f"png-{level}"] = PNGCodec(compress_level=level)
+        if WEBP_AVAILABLE:
+            for method in (0, 2, 6):
+                codecs[f"webp-lossless-m{method}"] = WebPCodec(method=method, quality=100)
+            codecs["webp-lossy-q90"] = WebPCodec(lossless=False, quality=90, method=4)
+    return codecs
+
+
+def benchmark(codec, frames: list, verify: bool) -> dict:
+    """逐帧编码，统计耗时与体积"""
+    raw_bytes = sum(f.width * f.height * 3 for f in frames)
+    encoded = 0
+    elapsed = 0.0
+    lossless_ok = True
+
+    for frame in frames:
+        buffer = io.BytesIO()
+        start = time.perf_counter()
+        codec.encode(frame, buffer)
+        elapsed += time.perf_counter() - start
+        encoded += buffer.tell()
+
+        if verify and codec.lossless:
+            buffer.seek(0)
+            decoded = np.asarray(Image.open(buffer).convert('RGB'))
+            lossless_ok &= np.array_equal(decoded, np.asarray(frame))
+
+    return {
+        'mb_s': raw_bytes / elapsed / (1024**2) if elapsed > 0 else 0.0,
+        'ms_per_frame': elapsed / len(frames) * 1000,
+        'bytes_per_frame': encoded / len(frames),
+        'ratio': encoded / raw_bytes,
+        'lossless_ok': lossless_ok if codec.lossless else None
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="截图编码器基准")
+    parser.add_argument('--replay', help="PNG 帧目录（默认使用合成聊天记录）")
+    parser.add_argument('--frames', type=int, default=8, help="测试帧数")
+    parser.add_argument('--width', type=int, default=800, help="合成帧宽度")
+    parser.add_argument('--height', type=int, default=600, help="合成帧高度")
+    parser.add_argument('--seed', type=int, default=0, help="合成聊天记录随机种子")
+    parser.add_argument('--variants', action='store_true', help="额外测试更多 PNG/WebP 参数")
+    parser.add_argument('--no-verify', action='store_true', help="跳过无损还原校验")
+    args = parser.parse_args()
+
+    frames = load_frames(args)
+    if not frames:
+        print("❌ 没有可用的测试帧")
+        return
+    width, height = frames[0].size
+    print(f"🗜️ 编码器基准: {len(frames)} 帧, {width}x{height}, "
+          f"WebP {'可用' if WEBP_AVAILABLE else '不可用'}")
+    print(f"\n{'编码器':<28}{'MB/s':>9}{'ms/帧':>9}{'KB/帧':>10}{'压缩比':>9}  无损校验")
+
+    for name, codec in candidate_codecs(args.variants).items():
+        result = benchmark(codec, frames, not args.no_verify)
+        check = {None: '有损', True: '✅', False: '❌'}[result['lossless_ok']]
+        if args.no_verify and codec.lossless:
+            check = '-'
+        print(f"{name:<28}{result['mb_s']:>9.1f}{result['ms_per_frame']:>9.1f}"
+              f"{result['bytes_per_frame'] / 1024:>10.1f}{result['ratio']:>9.3f}  {check}")
+
+
+if __name__ == "__main__":
+    main()
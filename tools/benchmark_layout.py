@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+布局分析基准 - 对比旧版逐区域切片分析与单遍积分投影分析
+
+在合成的微信窗口截图（联系人列表、聊天头部、消息列表、输入框，
+分割线位置随机）上运行两种实现，输出单次耗时和各分割线的位置误差。
+
+用法:
+    python tools/benchmark_layout.py
+    python tools/benchmark_layout.py --width 1600 --height 1000 --samples 20
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+# 添加源码目录到路径（src 内模块使用平铺导入）
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(project_root, 'src'))
+
+from capture_backends import render_chat_transcript
+from layout_analysis import analyze_layout
+
+
+def render_wechat_window(width: int, height: int, seed: int):
+    """
+    渲染微信风格的窗口截图（灰度）
+
+    Returns:
+        (灰度图, {'vertical_split', 'header_split', 'input_split'} 真实位置)
+    """
+    rng = np.random.default_rng(seed)
+    split = int(width * rng.uniform(0.24, 0.36))
+    header = int(height * rng.uniform(0.06, 0.11))
+    input_top = int(height * rng.uniform(0.74, 0.86))
+
+    window = np.empty((height, width, 3), dtype=np.uint8)
+
+    # 联系人列表：浅灰底，头像 + 两行文字
+    window[:, :split] = (232, 231, 230)
+    for y in range(12, height - 60, 64):
+        color = tuple(int(c) for c in rng.integers(60, 220, size=3))
+        cv2.rectangle(window, (12, y), (52, y + 40), color, -1)
+        cv2.putText(window, f"contact {y // 64}", (62, y + 16), cv2.FONT_HERSHEY_SIMPLEX,
+                    0.45, (20, 20, 20), 1, cv2.LINE_AA)
+        cv2.putText(window, "last message...", (62, y + 36), cv2.FONT_HERSHEY_SIMPLEX,
+                    0.4, (150, 150, 150), 1, cv2.LINE_AA)
+
+    chat_width = width - split
+    # 聊天头部
+    window[:header, split:] = (245, 245, 245)
+    cv2.putText(window, "Chat title", (split + 20, header // 2 + 6), cv2.FONT_HERSHEY_SIMPLEX,
+                0.6, (20, 20, 20), 1, cv2.LINE_AA)
+
+    # 消息列表：截取合成聊天记录
+    transcript = render_chat_transcript(chat_width, 80, seed)
+    offset = int(rng.integers(0, max(1, transcript.shape[0] - height)))
+    messages = transcript[offset:offset + input_top - header, :, 2::-1]
+    window[header:header + messages.shape[0], split:] = messages
+    window[header + messages.shape[0]:input_top, split:] = (245, 245, 245)
+
+    # 输入框：工具栏图标 + 文字
+    window[input_top:, split:] = (247, 247, 247)
+    for x in range(split + 16, width - 40, 36):
+        cv2.rectangle(window, (x, input_top + 12), (x + 18, input_top + 30), (120, 120, 120), 1)
+    cv2.putText(window, "typing a reply", (split + 16, input_top + 60), cv2.FONT_HERSHEY_SIMPLEX,
+                0.5, (30, 30, 30), 1, cv2.LINE_AA)
+
+    # 分隔线（与微信一样是 1 像素的浅色线）
+    window[:, split - 1] = (214, 214, 214)
+    window[header - 1, split:] = (224, 224, 224)
+    window[input_top - 1, split:] = (224, 224, 224)
+
+    gray = cv2.cvtColor(window, cv2.COLOR_RGB2GRAY)
+    return gray, {'vertical_split': split, 'header_split': header, 'input_split': input_top}
+
+
+# ===================== 旧版实现（WeChatDetector 3.0.7） =====================
+
+def legacy_find_vertical_split(gray_image, width, height):
+    mid_y = height // 2
+    search_height = height // 4
+    roi = gray_image[mid_y - search_height // 2:mid_y + search_height // 2, :]
+    vertical_gradient = np.abs(np.diff(roi, axis=0)).sum(axis=0)
+    start_x = int(width * 0.2)
+    end_x = int(width * 0.4)
+    if start_x < end_x and end_x < len(vertical_gradient):
+        search_region = vertical_gradient[start_x:end_x]
+        if len(search_region) > 0:
+            return start_x + int(np.argmax(search_region))
+    return int(width * 0.3)
+
+
+def legacy_detect_header_height(chat_image, total_height):
+    estimated_height = int(total_height * 0.08)
+    search_start = max(int(total_height * 0.05), 20)
+    search_end = min(int(total_height * 0.15), estimated_height + 20)
+    if search_start < search_end and search_end < chat_image.shape[0]:
+        roi = chat_image[search_start:search_end, :]
+        horizontal_gradient = np.abs(np.diff(roi, axis=1)).sum(axis=1)
+        if len(horizontal_gradient) > 0:
+            return search_start + int(np.argmax(horizontal_gradient))
+    return estimated_height
+
+
+def legacy_detect_input_height(chat_image, total_height):
+    estimated_height = int(total_height * 0.12)
+    search_start = max(int(total_height * 0.8), total_height - 100)
+    search_end = total_height - 10
+    if search_start < search_end and search_start >= 0:
+        roi = chat_image[search_start:search_end, :]
+        horizontal_gradient = np.abs(np.diff(roi, axis=1)).sum(axis=1)
+        if len(horizontal_gradient) > 0:
+            for i in range(len(horizontal_gradient) - 1, -1, -1):
+                if horizontal_gradient[i] > np.mean(horizontal_gradient) * 1.5:
+                    return total_height - (search_start + i)
+    return estimated_height
+
+
+def legacy_layout(gray):
+    """旧版 _detect_interface_regions 的分割线部分"""
+    height, width = gray.shape
+    split = legacy_find_vertical_split(gray, width, height)
+    chat_image = gray[:, split:]
+    header = legacy_detect_header_height(chat_image, height)
+    input_height = legacy_detect_input_height(chat_image, height)
+    return {'vertical_split': split, 'header_split': header, 'input_split': height - input_height}
+
+
+def new_layout(gray):
+    result = analyze_layout(gray)
+    return {'vertical_split': result.vertical_split.position,
+            'header_split': result.header_split.position,
+            'input_split': result.input_split.position}
+
+
+def timed(func, repeat: int):
+    """返回 (结果, 平均毫秒)"""
+    result = func()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return result, (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="布局分析基准")
+    parser.add_argument('--width', type=int, default=1000, help="窗口宽度")
+    parser.add_argument('--height', type=int, default=800, help="窗口高度")
+    parser.add_argument('--samples', type=int, default=10, help="合成截图数量")
+    parser.add_argument('--repeat', type=int, default=20, help="每张截图重复次数")
+    parser.add_argument('--tolerance', type=int, default=3, help="位置误差容限（像素）")
+    args = parser.parse_args()
+
+    print(f"📐 布局分析基准: {args.width}x{args.height}, {args.samples} 张合成截图")
+
+    names = ('vertical_split', 'header_split', 'input_split')
+    totals = {'legacy': 0.0, 'new': 0.0}
+    hits = {'legacy': dict.fromkeys(names, 0), 'new': dict.fromkeys(names, 0)}
+    errors = {'legacy': dict.fromkeys(names, 0), 'new': dict.fromkeys(names, 0)}
+
+    for seed in range(args.samples):
+        gray, truth = render_wechat_window(args.width, args.height, seed)
+        for label, func in (('legacy', legacy_layout), ('new', new_layout)):
+            found, ms = timed(lambda: func(gray), args.repeat)
+            totals[label] += ms
+            for name in names:
+                error = abs(found[name] - truth[name])
+                errors[label][name] += error
+                hits[label][name] += error <= args.tolerance
+
+    for label, title in (('legacy', "旧版逐区域分析"), ('new', "单遍积分投影")):
+        print(f"\n🔍 {title}: 平均 {totals[label] / args.samples:.2f}ms")
+        for name in names:
+            print(f"   {name:15s}: 命中 {hits[label][name]}/{args.samples}  "
+                  f"平均误差 {errors[label][name] / args.samples:.1f}px")
+
+    speedup = totals['legacy'] / max(totals['new'], 1e-9)
+    print(f"\n⚡ 加速比: {speedup:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+滚动截图管道压测工具 - 无显示器环境下驱动完整的截图/相似度/保存管道
+
+使用合成聊天记录或PNG回放目录代替真实屏幕，全速驱动
+AdvancedScreenshotManager，输出各阶段耗时，可选 cProfile 分析。
+
+用法:
+    python tools/benchmark_pipeline.py                      # 合成聊天记录
+    python tools/benchmark_pipeline.py --replay frames/     # 回放PNG目录
+    python tools/benchmark_pipeline.py --frames 200 --profile
+    python tools/benchmark_pipeline.py --step 150 --archive    # 去重帧归档
+"""
+
+import argparse
+import cProfile
+import os
+import pstats
+import sys
+import tempfile
+import threading
+import time
+
+# 添加源码目录到路径（src 内模块使用平铺导入）
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(project_root, 'src'))
+
+from capture_backends import create_backend
+from advanced_screenshot_manager import AdvancedScreenshotManager
+
+
+def run_pipeline(manager, region, frames: int, timeout: float) -> dict:
+    """提交截图任务并等待所有回调完成"""
+    done = threading.Event()
+    results = {'saved': 0, 'duplicates': 0, 'failed': 0}
+    lock = threading.Lock()
+
+    def callback(screenshot, task, success, result):
+        with lock:
+            if success:
+                results['saved'] += 1
+            elif result == "重复内容":
+                results['duplicates'] += 1
+            else:
+                results['failed'] += 1
+            if sum(results.values()) >= frames:
+                done.set()
+
+    start = time.perf_counter()
+    for _ in range(frames):
+        manager.capture_screenshot_async(region, callback)
+    done.wait(timeout)
+    results['elapsed'] = time.perf_counter() - start
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="滚动截图管道压测")
+    parser.add_argument('--replay', help="回放PNG目录（默认使用合成聊天记录）")
+    parser.add_argument('--transcript', help="预渲染的长聊天记录图片")
+    parser.add_argument('--frames', type=int, default=100, help="截图次数")
+    parser.add_argument('--step', type=int, default=400, help="合成滚动步长（像素）")
+    parser.add_argument('--width', type=int, default=800)
+    parser.add_argument('--height', type=int, default=600)
+    parser.add_argument('--output', help="截图保存目录（默认临时目录）")
+    parser.add_argument('--timeout', type=float, default=300.0)
+    parser.add_argument('--profile', action='store_true', help="输出 cProfile 热点")
+    parser.add_argument('--preset', help="截图编码预设（fastest/raw/balanced/smallest）")
+    parser.add_argument('--archive', action='store_true', help="保存到去重帧归档而不是逐帧图片")
+    args = parser.parse_args()
+
+    if args.replay:
+        backend = create_backend('replay', source=args.replay)
+    else:
+        backend = create_backend('synthetic', source=args.transcript, step=args.step,
+                                 width=args.width)
+
+    output_dir = args.output or tempfile.mkdtemp(prefix="pipeline_bench_")
+    manager = AdvancedScreenshotManager(capture_backend=backend)
+    manager.set_save_directory(output_dir)
+    if args.preset:
+        manager.set_image_codec(args.preset)
+    if args.archive:
+        manager.enable_frame_archive()
+    region = (0, 0, args.width, args.height)
+
+    profiler = cProfile.Profile() if args.profile else None
+    try:
+        if profiler:
+            profiler.enable()
+        results = run_pipeline(manager, region, args.frames, args.timeout)
+        if profiler:
+            profiler.disable()
+
+        metrics = manager.get_performance_metrics()
+        elapsed = results['elapsed']
+        print(f"\n📊 管道压测结果 ({backend.name}, {args.width}x{args.height}):")
+        print(f"   帧数: {args.frames} | 保存 {results['saved']} | "
+              f"重复 {results['duplicates']} | 失败 {results['failed']}")
+        print(f"   总耗时: {elapsed:.2f}s | 吞吐量: {args.frames / elapsed:.1f} 帧/秒")
+        print(f"   平均截图时间: {metrics.avg_capture_time * 1000:.2f}ms")
+        print(f"   平均相似度时间: {metrics.avg_similarity_time * 1000:.2f}ms")
+        print(f"   平均批量保存时间: {metrics.avg_save_time * 1000:.2f}ms")
+        flow = manager.get_flow_stats()
+        admission = flow.pop('admission')
+        print(f"   准入额度: {admission['credits']} | 峰值在途字节 {admission['peak_bytes_mb']:.1f}MB | "
+              f"帧停留 P95 {admission['wait_p95_ms']:.0f}ms | 准入阻塞 {admission['blocked_s']:.2f}s")
+        for stage, gauge in flow.items():
+            print(f"   - {stage:<10} 峰值深度 {gauge['peak_depth']:>3} | 峰值 {gauge['peak_bytes_mb']:>6.1f}MB | "
+                  f"排队 {gauge['wait_ms']:>7.1f}ms | 处理 {gauge['service_ms']:>6.1f}ms | "
+                  f"阻塞生产者 {gauge['blocked_s']:.2f}s")
+        if manager.frame_archive is not None:
+            archive = manager.frame_archive.get_stats()
+            print(f"   归档: 去重率 {archive['dedup_ratio']:.1%} | "
+                  f"写入 {archive['stored_bytes'] / (1024**2):.2f}MB / "
+                  f"原始 {archive['raw_bytes'] / (1024**2):.1f}MB")
+        print(f"   输出目录: {output_dir}")
+    finally:
+        manager.cleanup()
+
+    if profiler:
+        print("\n🔥 cProfile 热点 (按累计时间):")
+        pstats.Stats(profiler).sort_stats('cumulative').print_stats(25)
+
+
+if __name__ == "__main__":
+    main()
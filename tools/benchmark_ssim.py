@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+SSIM 微基准 - 对比旧的全局单窗口近似与窗口化 SSIM / MS-SSIM
+
+在合成聊天记录上构造几种典型帧对（完全相同、底部新增一条消息、
+小幅滚动、整屏滚动），输出各实现的得分与单次耗时。
+
+用法:
+    python tools/benchmark_ssim.py
+    python tools/benchmark_ssim.py --width 1920 --height 1080 --scale 0.5
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+from PIL import Image
+
+# 添加源码目录到路径（src 内模块使用平铺导入）
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(project_root, 'src'))
+
+from capture_backends import render_chat_transcript
+from ssim import compute_ms_ssim, compute_ssim, ssim_from_gray, to_float_gray
+
+
+def legacy_global_ssim(img1: Image.Image, img2: Image.Image) -> float:
+    """旧版 AdvancedScreenshotManager._calculate_ssim：64x64 上的单窗口全局 SSIM"""
+    arr1 = np.array(img1.convert('L').resize((64, 64)))
+    arr2 = np.array(img2.convert('L').resize((64, 64)))
+    mu1 = np.mean(arr1)
+    mu2 = np.mean(arr2)
+    var1 = np.var(arr1)
+    var2 = np.var(arr2)
+    cov = np.mean((arr1 - mu1) * (arr2 - mu2))
+    c1 = 0.01 ** 2
+    c2 = 0.03 ** 2
+    return ((2 * mu1 * mu2 + c1) * (2 * cov + c2)) / \
+           ((mu1**2 + mu2**2 + c1) * (var1 + var2 + c2))
+
+
+def make_pairs(width: int, height: int, seed: int):
+    """生成测试帧对"""
+    canvas = render_chat_transcript(width, max(60, height // 20), seed)
+    rgb = np.ascontiguousarray(canvas[:, :, 2::-1])
+    base = rgb[:height]
+
+    # 底部新增一条消息：把底部 1/8 替换为记录中另一段内容
+    appended = base.copy()
+    tail = height // 8
+    appended[-tail:] = rgb[2 * height:2 * height + tail]
+
+    to_image = Image.fromarray
+    return [
+        ("完全相同", to_image(base), to_image(base.copy())),
+        ("底部新增消息", to_image(base), to_image(appended)),
+        ("滚动40像素", to_image(base), to_image(rgb[40:40 + height])),
+        ("整屏滚动", to_image(base), to_image(rgb[height:2 * height])),
+    ]
+
+
+def timed(func, repeat: int):
+    """返回 (结果, 平均毫秒)"""
+    result = func()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return result, (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SSIM 微基准")
+    parser.add_argument('--width', type=int, default=800, help="帧宽度")
+    parser.add_argument('--height', type=int, default=600, help="帧高度")
+    parser.add_argument('--scale', type=float, default=0.25, help="窗口化 SSIM 缩放比例")
+    parser.add_argument('--window', type=int, default=7, help="盒式窗口边长")
+    parser.add_argument('--bands', type=int, default=8, help="水平条带数")
+    parser.add_argument('--repeat', type=int, default=50, help="每项重复次数")
+    parser.add_argument('--seed', type=int, default=0, help="合成聊天记录随机种子")
+    args = parser.parse_args()
+
+    print(f"📐 SSIM 微基准: {args.width}x{args.height}, 缩放 {args.scale}, "
+          f"窗口 {args.window}, 条带 {args.bands}")
+
+    for name, img1, img2 in make_pairs(args.width, args.height, args.seed):
+        legacy, legacy_ms = timed(lambda: legacy_global_ssim(img1, img2), args.repeat)
+        result, full_ms = timed(
+            lambda: compute_ssim(img1, img2, args.scale, args.window, args.bands), args.repeat)
+        ms_ssim, ms_ms = timed(
+            lambda: compute_ms_ssim(img1, img2, window=args.window), args.repeat)
+
+        # 管道中缩小后的灰度图随帧特征缓存，只剩 SSIM 本身的开销
+        gray1 = to_float_gray(img1, args.scale)
+        gray2 = to_float_gray(img2, args.scale)
+        _, cached_ms = timed(
+            lambda: ssim_from_gray(gray1, gray2, args.window, args.bands), args.repeat)
+
+        changed = result.changed_bands()
+        rows = [result.band_rows(i) for i in changed]
+        print(f"\n🔍 {name}")
+        print(f"   旧版全局 SSIM : {legacy:.4f}  ({legacy_ms:.2f}ms)")
+        print(f"   窗口化 SSIM   : {result.score:.4f}  最低条带 {result.min_band:.4f}  "
+              f"({full_ms:.2f}ms, 缓存灰度图 {cached_ms:.2f}ms)")
+        print(f"   MS-SSIM       : {ms_ssim:.4f}  ({ms_ms:.2f}ms)")
+        print(f"   变化条带      : {changed or '无'} {rows if rows else ''}")
+
+
+if __name__ == "__main__":
+    main()